@@ -1,8 +1,47 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, stream_with_context, g
+import gzip
+import hashlib
+import hmac
+import heapq
+import itertools
 import json
+import math
 import os
+import queue
+import re
+import secrets
+import sqlite3
 import time
+import atexit
+import shutil
+import tempfile
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager, ExitStack
 from datetime import datetime, timedelta
+from functools import wraps
+from urllib.parse import quote, unquote
+
+import click
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows - 프로세스 간 잠금 없이 스레드 잠금만 사용
+    fcntl = None
+
+try:
+    import sqlalchemy as sa
+    from flask_sqlalchemy import SQLAlchemy
+except ImportError:  # JSON 파일 저장소만 사용하는 경우 설치하지 않아도 됨
+    sa = None
+    SQLAlchemy = None
+
+try:
+    import redis
+except ImportError:  # 이벤트를 다른 워커와 공유하지 않는 경우 설치하지 않아도 됨
+    redis = None
 
 app = Flask(__name__)
 app.secret_key = 'change-me'
@@ -12,325 +51,3610 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)  # 30일 동안 
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False  # HTTPS 사용 시 True로 변경
 
+# 저장소 설정 - 'json'(기본, JSON 파일) 또는 'sql'(SQLAlchemy, 예: PostgreSQL)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///khub.db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
 # 데이터 저장 파일 경로
 DATA_FILE = 'registered_users.json'
 ANON_PROFILES_FILE = 'anon_profiles.json'
 BOARD_POSTS_FILE = 'board_posts.json'
 BOARD_COMMENTS_FILE = 'board_comments.json'
+BOARD_LIKES_FILE = 'board_likes.json'
 CHAT_MESSAGES_FILE = 'chat_messages.json'
 USER_READ_STATUS_FILE = 'user_read_status.json'
 GROUP_MATCHING_FILE = 'group_matching.json'
 GROUP_ROOMS_FILE = 'group_rooms.json'
+MATCHING_QUEUE_FILE = 'matching_queue.json'
+CHAT_ROOMS_FILE = 'chat_rooms.json'
 
-def load_users():
-    """등록된 사용자 정보 불러오기"""
-    if os.path.exists(DATA_FILE):
+# 게시글 목록 조회 설정
+BOARD_PAGE_DEFAULT_LIMIT = 20
+BOARD_PAGE_MAX_LIMIT = 100
+BOARD_POST_QUERY_PARAMS = ('boardId', 'departmentId', 'type', 'tag', 'sort', 'cursor', 'limit')
+BOARD_POST_SORT_FIELDS = {'recent': 'createdAt', 'likes': 'likes', 'views': 'views', 'comments': 'comments'}  # 정렬 기준 -> 게시글 필드
+BOARD_POST_SORT_COLUMNS = {'likes': 'likes', 'views': 'views', 'comments': 'comment_count'}  # 정렬 기준 -> posts 테이블 컬럼
+BOARD_POST_SORT_ALIASES = {'latest': 'recent', 'popular': 'likes'}  # 게시판 화면의 정렬 선택값
+POST_TAG_KEY_LENGTH = 100  # post_tags 테이블에 넣는 태그 길이 (더 긴 태그는 앞부분으로 찾음)
+COMMENT_PAGE_DEFAULT_LIMIT = 50
+COMMENT_PAGE_MAX_LIMIT = 200
+
+# 마이페이지 내 활동 조회 설정
+ACTIVITY_KINDS = ('posts', 'comments', 'likes', 'commentLikes')  # 작성한 글/댓글, 좋아요한 글/댓글
+ACTIVITY_PAGE_DEFAULT_LIMIT = 20
+ACTIVITY_PAGE_MAX_LIMIT = 100
+
+# 메모리 저장소 설정
+# 변경된 데이터는 STORE_FLUSH_INTERVAL초 동안 모았다가 한 번에 파일로 기록 (0이면 즉시 기록)
+STORE_FLUSH_INTERVAL = float(os.environ.get('STORE_FLUSH_INTERVAL', '0.5'))
+# gunicorn 워커를 여러 개 띄울 때는 1로 설정 - data_transaction이 끝날 때마다 바로 파일에 기록
+STORE_MULTI_WORKER = os.environ.get('STORE_MULTI_WORKER', '0') == '1'
+
+# ID 생성 설정 (Snowflake 방식: 밀리초 41비트 + 워커 번호 10비트 + 순번 12비트)
+ID_EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+ID_WORKER_BITS = 10
+ID_SEQUENCE_BITS = 12
+# 워커 번호를 직접 지정할 때 사용 (서버가 여러 대일 때 서버마다 다르게) - 없으면 워커마다 잠금 파일로 번호를 잡음
+ID_WORKER_ID = os.environ.get('ID_WORKER_ID')
+
+_store_lock = threading.RLock()
+_store_cache = {}  # 파일 경로 -> {'data': 데이터, 'stamp': 파일 상태, 'dirty': 미기록 여부, 'version': 변경 번호, 'snapshot': 저장 시점의 JSON 문자열}
+_store_versions = itertools.count(1)
+_store_indexes = {}  # 인덱스 이름 -> (원본 데이터 변경 번호, 인덱스)
+_store_flush_event = threading.Event()
+_background_threads = {}  # 이름 -> (스레드, 프로세스 ID)
+
+_file_locks = {}  # 파일 경로 -> [프로세스 내부 스레드 잠금, 잠금을 쓰는 스레드 수] (아무도 쓰지 않으면 지움)
+_file_lock_state = threading.local()
+
+def _file_stamp(path):
+    """파일 상태 (수정 시각, 크기, inode) - 파일이 없으면 None
+
+    저장은 항상 새 파일로 교체하므로 mtime 해상도가 낮은 파일시스템에서도 inode로 변경을 알 수 있다.
+    """
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    except OSError:
+        return None
+
+def _dump_json(data):
+    """데이터 파일 형식의 JSON 문자열"""
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+def _write_json_file(path, text):
+    """JSON 문자열을 파일에 원자적으로 기록 (임시 파일에 쓴 뒤 이름 바꾸기)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
         try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"[사용자 데이터 로드 실패] 오류: {e}")
-            return []
-    return []
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
-def save_users(users):
-    """등록된 사용자 정보 저장하기"""
+def _backup_corrupt_file(path):
+    """읽을 수 없는 데이터 파일을 백업 (빈 데이터로 덮어써서 내용이 사라지는 것을 방지)"""
+    backup_path = f"{path}.corrupt.{int(time.time())}"
     try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users, f, ensure_ascii=False, indent=2)
-        print(f"[데이터 저장 성공] {len(users)}명의 사용자 정보 저장됨")
+        shutil.copy2(path, backup_path)
+        print(f"[저장소] 손상된 파일 백업: {backup_path}")
+    except OSError as e:
+        print(f"[저장소] 손상된 파일 백업 실패: {e}")
+
+@contextmanager
+def file_lock(path):
+    """데이터 파일 잠금 (같은 프로세스의 다른 스레드와 다른 워커 프로세스 모두 대기)
+
+    같은 스레드 안에서는 다시 잠가도 막히지 않는다.
+    """
+    held = getattr(_file_lock_state, 'held', None)
+    if held is None:
+        held = _file_lock_state.held = set()
+    
+    if path in held:
+        yield
+        return
+    
+    with _store_lock:
+        lock_entry = _file_locks.setdefault(path, [threading.Lock(), 0])
+        lock_entry[1] += 1
+    
+    try:
+        with lock_entry[0]:
+            with open(path + '.lock', 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                held.add(path)
+                try:
+                    yield
+                finally:
+                    held.discard(path)
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    finally:
+        with _store_lock:
+            lock_entry[1] -= 1
+            if lock_entry[1] == 0:
+                del _file_locks[path]
+
+@contextmanager
+def data_transaction(*paths):
+    """여러 데이터 파일에 대한 읽기-수정-저장 구간 잠금 (컨텍스트 매니저 또는 데코레이터로 사용)
+
+    교착 상태를 피하기 위해 항상 경로 순서대로 잠근다.
+    구간 안에서 예외가 나면 저장하지 않은 수정은 버리고 마지막으로 저장한 데이터로 되돌린다.
+    STORE_MULTI_WORKER 모드에서는 잠금을 풀기 전에 변경 내용을 파일에 기록한다.
+    """
+    paths = sorted(set(paths))
+    with ExitStack() as stack:
+        for path in paths:
+            stack.enter_context(file_lock(path))
+        try:
+            yield
+        except BaseException:
+            store_discard(*paths)
+            raise
+        if STORE_MULTI_WORKER:
+            store_flush(*paths)
+
+def store_load(path, default_factory):
+    """메모리 저장소에서 데이터 불러오기
+
+    파일은 처음 한 번만 읽고 이후에는 메모리의 데이터를 그대로 돌려준다.
+    외부 도구나 다른 워커가 파일을 바꾸면 다시 읽는다.
+    돌려받은 데이터는 여러 요청이 함께 쓰므로 반드시 data_transaction 안에서만 수정하고 store_save로 저장해야 한다.
+    """
+    if STORAGE_BACKEND == 'sql':
+        return sql_load(path, default_factory)
+    
+    with _store_lock:
+        entry = _store_cache.get(path)
+        # 아직 기록되지 않았거나 기록 중인 변경이 있으면 메모리 데이터가 최신
+        if entry is not None and (entry['dirty'] or entry.get('writing')):
+            return entry['data']
+        
+        stamp = _file_stamp(path)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry['data']
+        
+        data = default_factory()
+        if stamp is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"[저장소] {path} 로드 실패: {e}")
+                if entry is not None:
+                    return entry['data']
+                _backup_corrupt_file(path)
+        
+        _store_cache[path] = {'data': data, 'stamp': stamp, 'dirty': False, 'version': next(_store_versions)}
+        return data
+
+def store_save(path, data):
+    """메모리 저장소에 데이터 저장 (파일 기록은 백그라운드에서 모아서 처리)
+
+    저장하는 시점의 내용을 JSON 문자열로 떠 두고 파일에는 그 문자열을 기록하므로,
+    저장 이후 기록 전까지 데이터가 다시 수정되어도 기록되는 내용은 저장한 그대로다.
+    """
+    if STORAGE_BACKEND == 'sql':
+        return sql_save(path, data)
+    
+    # 호출한 쪽이 data_transaction으로 이 파일을 잠그고 있으므로 직렬화하는 동안 다른 요청이 데이터를 바꾸지 않음
+    snapshot = _dump_json(data)
+    with _store_lock:
+        entry = _store_cache.get(path)
+        if entry is None:
+            entry = _store_cache[path] = {'data': data, 'stamp': None, 'dirty': True, 'version': 0}
+        else:
+            entry['data'] = data
+            entry['dirty'] = True
+        entry['snapshot'] = snapshot
+        entry['version'] = next(_store_versions)
+    
+    if STORE_FLUSH_INTERVAL <= 0:
+        return store_flush(path)
+    
+    start_background_thread('store-writer', _store_writer_loop)
+    _store_flush_event.set()
+    return True
+
+def store_index(name, sources, build):
+    """메모리 저장소 데이터로 만든 조회용 인덱스
+
+    sources는 (파일 경로, 불러오기 함수) 목록이고 build는 불러온 데이터를 받아 인덱스를 만든다.
+    원본 데이터가 저장되거나 파일에서 다시 읽혔을 때만 새로 만들고, 그 외에는 만들어 둔 인덱스를 돌려준다.
+    """
+    for _, load in sources:
+        load()
+    with _store_lock:
+        entries = [_store_cache[path] for path, _ in sources]
+        version = tuple(entry['version'] for entry in entries)
+        cached = _store_indexes.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        datasets = [entry['data'] for entry in entries]
+    
+    index = build(*datasets)
+    with _store_lock:
+        _store_indexes[name] = (version, index)
+    return index
+
+def store_index_update(name, path, before_version, update):
+    """원본 데이터 저장 후 만들어 둔 인덱스에서 바뀐 항목만 고치기
+
+    인덱스가 저장 직전 데이터(before_version)로 만든 것일 때만 update(인덱스)를 호출한다.
+    update가 False를 돌려주거나 그사이 다른 변경이 있었으면 다음 조회 때 새로 만든다.
+    """
+    if STORAGE_BACKEND == 'sql':
+        return
+    with _store_lock:
+        cached = _store_indexes.get(name)
+        if cached is None:
+            return
+        if cached[0] != (before_version,) or update(cached[1]) is False:
+            del _store_indexes[name]
+            return
+        _store_indexes[name] = ((store_version(path),), cached[1])
+
+def store_discard(*paths):
+    """저장하지 않은 메모리 데이터 수정을 버리기 (마지막으로 저장한 내용으로 되돌림)"""
+    if STORAGE_BACKEND == 'sql':
+        return
+    with _store_lock:
+        for path in paths:
+            entry = _store_cache.get(path)
+            if entry is None:
+                continue
+            if entry.get('snapshot') is None:
+                # 파일에 기록된 내용이 마지막 저장 내용 - 다음 조회 때 다시 읽음
+                del _store_cache[path]
+                continue
+            entry['data'] = json.loads(entry['snapshot'])
+            entry['version'] = next(_store_versions)
+
+def store_version(path):
+    """데이터의 변경 번호 (저장되거나 파일에서 다시 읽힐 때마다 바뀜, SQL 저장소는 모든 워커가 함께 쓰는 번호)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_version(path)
+    with _store_lock:
+        entry = _store_cache.get(path)
+        return entry['version'] if entry is not None else None
+
+def store_flush(*paths):
+    """미기록 데이터를 파일에 기록 (경로를 주지 않으면 전체)"""
+    ok = True
+    with _store_lock:
+        targets = list(paths) if paths else list(_store_cache.keys())
+    
+    for path in targets:
+        # 잠금 순서: 파일 잠금 -> 저장소 잠금
+        with file_lock(path):
+            with _store_lock:
+                entry = _store_cache.get(path)
+                if entry is None or not entry['dirty']:
+                    continue
+                entry['dirty'] = False
+                # 파일을 바꾼 뒤 stamp를 갱신하기 전에 store_load가 자기 변경을 다시 읽지 않도록 표시
+                entry['writing'] = True
+                snapshot = entry['snapshot']
+            
+            try:
+                _write_json_file(path, snapshot)
+            except Exception as e:
+                # 디스크 오류 등 - 다음 주기에 다시 시도
+                with _store_lock:
+                    entry['dirty'] = True
+                    entry['writing'] = False
+                ok = False
+                print(f"[저장소] {path} 저장 실패: {e}")
+                continue
+            
+            with _store_lock:
+                entry['stamp'] = _file_stamp(path)
+                entry['writing'] = False
+                if not entry['dirty']:
+                    # 파일에 기록된 내용이 마지막 저장 내용이므로 문자열은 더 들고 있지 않음
+                    entry['snapshot'] = None
+    return ok
+
+def _store_writer_loop():
+    """백그라운드 기록 스레드"""
+    while True:
+        _store_flush_event.wait()
+        # 짧은 시간 동안 들어온 변경을 모아서 한 번에 기록
+        time.sleep(STORE_FLUSH_INTERVAL)
+        _store_flush_event.clear()
+        if not store_flush():
+            _store_flush_event.set()
+
+def start_background_thread(name, target):
+    """백그라운드 스레드 시작 (이미 실행 중이면 무시, gunicorn 워커 fork 이후에는 워커마다 새로 시작)"""
+    with _store_lock:
+        thread, pid = _background_threads.get(name, (None, None))
+        if thread is not None and thread.is_alive() and pid == os.getpid():
+            return
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        _background_threads[name] = (thread, os.getpid())
+        thread.start()
+
+# 프로세스 종료 시 남은 변경 기록
+atexit.register(store_flush)
+
+# ID 생성
+# 게시글/댓글/메시지/채팅방 ID는 new_id()로 만든다. 숫자 부분은 19자리로 맞춰
+# 문자열 순서가 곧 생성 순서이므로, 목록의 커서로 그대로 쓸 수 있다.
+_id_lock = threading.Lock()
+_id_state = {'pid': None, 'worker': None, 'lock_file': None, 'last_ms': 0, 'sequence': 0}
+
+def _claim_id_worker():
+    """이 프로세스의 워커 번호 - id_worker_<번호>.lock 파일 잠금을 잡아 다른 워커와 겹치지 않게 함"""
+    worker_count = 1 << ID_WORKER_BITS
+    if ID_WORKER_ID is not None:
+        return int(ID_WORKER_ID) % worker_count
+    if fcntl is None:
+        return os.getpid() % worker_count
+    for worker in range(worker_count):
+        lock_file = open(f'id_worker_{worker}.lock', 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        # 프로세스가 끝날 때까지 잠금을 유지 (끝나면 운영체제가 풀어 줌)
+        _id_state['lock_file'] = lock_file
+        return worker
+    raise RuntimeError('사용할 수 있는 ID 워커 번호가 없습니다.')
+
+def new_id(prefix=''):
+    """정렬 가능한 고유 ID (prefix + 19자리 숫자)
+
+    같은 밀리초 안에서는 순번을 올리고, 시계가 뒤로 가도 마지막 시각에서 이어서 만들어
+    한 워커 안에서는 항상 증가한다. gunicorn이 fork한 워커는 처음 호출할 때 자기 번호를 새로 잡는다.
+    """
+    with _id_lock:
+        if _id_state['pid'] != os.getpid():
+            _id_state.update(pid=os.getpid(), worker=_claim_id_worker(), last_ms=0, sequence=0)
+        now = int(time.time() * 1000)
+        if now > _id_state['last_ms']:
+            _id_state['sequence'] = 0
+        else:
+            now = _id_state['last_ms']
+            _id_state['sequence'] = (_id_state['sequence'] + 1) & ((1 << ID_SEQUENCE_BITS) - 1)
+            if _id_state['sequence'] == 0:
+                # 한 밀리초에 만들 수 있는 개수를 넘으면 다음 밀리초 번호를 씀
+                now += 1
+        _id_state['last_ms'] = now
+        value = (((now - ID_EPOCH_MS) << (ID_WORKER_BITS + ID_SEQUENCE_BITS))
+                 | (_id_state['worker'] << ID_SEQUENCE_BITS)
+                 | _id_state['sequence'])
+    return f"{prefix}{value:019d}"
+
+# SQL 저장소 (STORAGE_BACKEND=sql)
+# 각 테이블은 조회에 쓰는 컬럼(인덱스)과 원본 데이터(JSON 문자열)를 함께 저장하고,
+# load_*/save_*는 JSON 파일과 같은 모양의 데이터를 주고받는다.
+db = None
+sql_tables = {}
+_sql_state = {'engine': None}
+
+if STORAGE_BACKEND == 'sql':
+    if SQLAlchemy is None:
+        raise RuntimeError('STORAGE_BACKEND=sql 을 사용하려면 Flask-SQLAlchemy를 설치해야 합니다.')
+    db = SQLAlchemy(app)
+    
+    sql_tables['users'] = db.Table(
+        'users',
+        sa.Column('student_id', sa.String(20), primary_key=True),
+        sa.Column('email', sa.String(120), index=True),
+        sa.Column('position', sa.Integer, nullable=False),
+        sa.Column('data', sa.Text, nullable=False),
+    )
+    sql_tables['anon_profiles'] = db.Table(
+        'anon_profiles',
+        sa.Column('student_id', sa.String(20), primary_key=True),
+        sa.Column('nickname', sa.String(50), index=True),
+        sa.Column('position', sa.Integer, nullable=False),
+        sa.Column('data', sa.Text, nullable=False),
+    )
+    sql_tables['posts'] = db.Table(
+        'posts',
+        sa.Column('id', sa.String(64), primary_key=True),
+        sa.Column('board_id', sa.String(50)),
+        sa.Column('department_id', sa.String(50), index=True),
+        sa.Column('post_type', sa.String(20)),
+        sa.Column('author_student_id', sa.String(20), index=True),
+        sa.Column('created_at', sa.String(40)),
+        sa.Column('likes', sa.Integer),
+        sa.Column('views', sa.Integer),
+        sa.Column('comment_count', sa.Integer),
+        sa.Column('position', sa.Integer, nullable=False),
+        sa.Column('data', sa.Text, nullable=False),
+        sa.Index('ix_posts_board_created', 'board_id', 'created_at'),
+        sa.Index('ix_posts_board_likes', 'board_id', 'likes'),
+        sa.Index('ix_posts_board_views', 'board_id', 'views'),
+        sa.Index('ix_posts_board_comments', 'board_id', 'comment_count'),
+    )
+    sql_tables['comments'] = db.Table(
+        'comments',
+        sa.Column('id', sa.String(64), primary_key=True),
+        sa.Column('post_id', sa.String(64), index=True),
+        sa.Column('author_student_id', sa.String(20), index=True),
+        sa.Column('position', sa.Integer, nullable=False),
+        sa.Column('data', sa.Text, nullable=False),
+    )
+    sql_tables['messages'] = db.Table(
+        'messages',
+        sa.Column('room_id', sa.String(100), primary_key=True),
+        sa.Column('position', sa.Integer, primary_key=True),
+        sa.Column('message_id', sa.String(100), index=True),
+        sa.Column('data', sa.Text, nullable=False),
+    )
+    sql_tables['rooms'] = db.Table(
+        'rooms',
+        sa.Column('room_id', sa.String(100), primary_key=True),
+        sa.Column('room_type', sa.String(10), nullable=False, index=True),
+        sa.Column('active', sa.Boolean, index=True),
+        sa.Column('position', sa.Integer, nullable=False),
+        sa.Column('data', sa.Text, nullable=False),
+    )
+    sql_tables['room_members'] = db.Table(
+        'room_members',
+        sa.Column('room_id', sa.String(100), primary_key=True),
+        sa.Column('student_id', sa.String(20), primary_key=True, index=True),
+    )
+    sql_tables['post_tags'] = db.Table(
+        'post_tags',
+        sa.Column('post_id', sa.String(64), primary_key=True),
+        sa.Column('tag', sa.String(POST_TAG_KEY_LENGTH), primary_key=True, index=True),
+    )
+    sql_tables['board_likes'] = db.Table(
+        'board_likes',
+        sa.Column('student_id', sa.String(20), primary_key=True),
+        sa.Column('kind', sa.String(10), primary_key=True),
+        sa.Column('position', sa.Integer, nullable=False),
+        sa.Column('data', sa.Text, nullable=False),
+    )
+    sql_tables['read_status'] = db.Table(
+        'read_status',
+        sa.Column('student_id', sa.String(20), primary_key=True),
+        sa.Column('room_id', sa.String(100), primary_key=True),
+        sa.Column('position', sa.Integer, nullable=False),
+        sa.Column('data', sa.Text, nullable=False),
+    )
+    sql_tables['matching_queues'] = db.Table(
+        'matching_queues',
+        sa.Column('queue', sa.String(50), primary_key=True),
+        sa.Column('position', sa.Integer, primary_key=True),
+        sa.Column('student_id', sa.String(20), index=True),
+        sa.Column('data', sa.Text, nullable=False),
+    )
+    sql_tables['message_archives'] = db.Table(
+        'message_archives',
+        sa.Column('room_id', sa.String(100), primary_key=True),
+        sa.Column('first_seq', sa.Integer, primary_key=True),
+        sa.Column('last_seq', sa.Integer, nullable=False),
+        sa.Column('data', sa.LargeBinary, nullable=False),  # gzip으로 압축한 메시지 JSON 줄
+    )
+    sql_tables['room_archives'] = db.Table(
+        'room_archives',
+        sa.Column('room_id', sa.String(100), primary_key=True),
+        sa.Column('room_type', sa.String(10), nullable=False),
+        sa.Column('archived_at', sa.Float, nullable=False),
+        sa.Column('data', sa.LargeBinary, nullable=False),  # gzip으로 압축한 보관 기록 JSON
+    )
+    # 데이터셋별 변경 번호 (저장할 때마다 1씩 늘려 다른 워커가 메모리 색인을 새로 만들 때를 알 수 있게 함)
+    sql_tables['dataset_versions'] = db.Table(
+        'dataset_versions',
+        sa.Column('path', sa.String(100), primary_key=True),
+        sa.Column('version', sa.Integer, nullable=False),
+    )
+
+def _post_count(post, field):
+    """게시글의 좋아요/조회/댓글 수 (숫자가 아니면 0)"""
+    try:
+        return int(post.get(field) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _comment_post_key(comment):
+    """댓글이 속한 게시글 ID (댓글 저장 시 묶는 기준)"""
+    return str(comment.get('postId') or '')
+
+def _group_comments_by_post(comments):
+    """예전 형식(댓글 목록)을 게시글 ID -> 댓글 목록으로 변환"""
+    if isinstance(comments, dict):
+        return comments
+    grouped = {}
+    for comment in comments:
+        grouped.setdefault(_comment_post_key(comment), []).append(comment)
+    return grouped
+
+def _post_tag_keys(post):
+    """게시글 태그 테이블에 넣을 값 (문자열 태그만, 긴 태그는 앞부분만)"""
+    tags = post.get('tags')
+    if not isinstance(tags, list):
+        return []
+    return [tag[:POST_TAG_KEY_LENGTH] for tag in tags if isinstance(tag, str)]
+
+def _room_member_ids(room):
+    """채팅방 참여자 학번 목록 (1:1 방과 그룹 방 모두)"""
+    if 'members' in room:
+        return [m.get('student_id') for m in room.get('members', []) if m.get('student_id')]
+    return [sid for sid in (room.get('user1_id'), room.get('user2_id')) if sid]
+
+# 데이터 파일 -> 테이블 매핑
+# shape: list(항목 목록) / dict(키 -> 항목) / nested(키 -> 키 -> 값) / grouped(키 -> 항목 목록)
+#        by_group(group 컬럼 값 -> 항목 목록, 각 항목은 key 컬럼으로 식별)
+# links: 항목 하나에 여러 값이 붙는 연결 테이블 (채팅방 참여자, 게시글 태그), 저장할 때 바뀐 항목만 갱신
+SQL_DATASETS = {
+    DATA_FILE: {
+        'table': 'users', 'shape': 'list', 'key': 'student_id',
+        'columns': lambda u: {'email': u.get('email')},
+    },
+    ANON_PROFILES_FILE: {
+        'table': 'anon_profiles', 'shape': 'list', 'key': 'student_id',
+        'columns': lambda p: {'nickname': p.get('nickname')},
+    },
+    BOARD_POSTS_FILE: {
+        'table': 'posts', 'shape': 'list', 'key': 'id',
+        'columns': lambda p: {
+            'board_id': p.get('boardId'),
+            'department_id': p.get('departmentId'),
+            'post_type': p.get('type'),
+            'author_student_id': p.get('authorStudentId'),
+            'created_at': p.get('createdAt') or '',
+            'likes': _post_count(p, 'likes'),
+            'views': _post_count(p, 'views'),
+            'comment_count': _post_count(p, 'comments'),
+        },
+        # 좋아요/조회/댓글 수는 컬럼에만 두고 증감분을 더해 갱신 (data에는 넣지 않음, 읽을 때 컬럼 값을 붙임)
+        'counters': BOARD_POST_SORT_COLUMNS,
+        'links': {'table': 'post_tags', 'key': 'post_id', 'column': 'tag', 'values': _post_tag_keys},
+    },
+    BOARD_COMMENTS_FILE: {
+        'table': 'comments', 'shape': 'by_group', 'key': 'id', 'group': 'post_id',
+        'columns': lambda c: {'post_id': _comment_post_key(c), 'author_student_id': c.get('authorStudentId')},
+        'normalize': _group_comments_by_post,
+    },
+    CHAT_MESSAGES_FILE: {
+        'table': 'messages', 'shape': 'grouped', 'key': 'room_id',
+        'columns': lambda m: {'message_id': m.get('id')},
+        # 메시지 순번(seq) = position + 1
+        'position': lambda m, index: m.get('seq', index + 1) - 1,
+    },
+    CHAT_ROOMS_FILE: {
+        'table': 'rooms', 'shape': 'dict', 'key': 'room_id', 'scope': ('room_type', 'dm'),
+        'columns': lambda r: {'active': r.get('active', True)},
+        'links': {'table': 'room_members', 'key': 'room_id', 'column': 'student_id', 'values': _room_member_ids},
+    },
+    GROUP_ROOMS_FILE: {
+        'table': 'rooms', 'shape': 'dict', 'key': 'room_id', 'scope': ('room_type', 'group'),
+        'columns': lambda r: {'active': r.get('active', True)},
+        'links': {'table': 'room_members', 'key': 'room_id', 'column': 'student_id', 'values': _room_member_ids},
+    },
+    BOARD_LIKES_FILE: {
+        'table': 'board_likes', 'shape': 'nested', 'key': ('student_id', 'kind'),
+        'columns': lambda v: {},
+    },
+    USER_READ_STATUS_FILE: {
+        'table': 'read_status', 'shape': 'nested', 'key': ('student_id', 'room_id'),
+        'columns': lambda v: {},
+    },
+    MATCHING_QUEUE_FILE: {
+        'table': 'matching_queues', 'shape': 'grouped', 'key': 'queue', 'prefix': 'dm:',
+        'columns': lambda w: {'student_id': w.get('student_id')},
+    },
+    GROUP_MATCHING_FILE: {
+        'table': 'matching_queues', 'shape': 'grouped', 'key': 'queue', 'prefix': 'group:',
+        'columns': lambda w: {'student_id': w.get('student_id')},
+    },
+}
+
+def _sql_engine():
+    """SQL 엔진 (처음 사용할 때 테이블과 변경 번호 행 생성)"""
+    if _sql_state['engine'] is None:
+        with app.app_context():
+            db.create_all()
+            engine = db.engine
+        table = sql_tables['dataset_versions']
+        for path in SQL_DATASETS:
+            try:
+                with engine.begin() as conn:
+                    if conn.execute(sa.select(table.c.path).where(table.c.path == path)).first() is None:
+                        conn.execute(table.insert().values(path=path, version=0))
+            except sa.exc.IntegrityError:
+                pass  # 다른 워커가 먼저 만듦
+        _sql_fill_links(engine)
+        _sql_state['engine'] = engine
+    return _sql_state['engine']
+
+def _sql_fill_links(engine):
+    """연결 테이블에 아직 아무 행도 없는 데이터셋은 저장된 항목으로 채움 (연결 테이블을 나중에 추가한 경우)"""
+    for spec in SQL_DATASETS.values():
+        if 'links' not in spec:
+            continue
+        link = spec['links']
+        link_table = sql_tables[link['table']]
+        table = sql_tables[spec['table']]
+        item_keys = sa.select(table.c[spec['key']]).where(_sql_scope(spec, table))
+        try:
+            with engine.begin() as conn:
+                filled = conn.execute(
+                    sa.select(link_table.c[link['key']]).where(link_table.c[link['key']].in_(item_keys)).limit(1)
+                ).first()
+                if filled is not None:
+                    continue
+                link_rows = [
+                    {link['key']: row[0], link['column']: value}
+                    for row in conn.execute(sa.select(table.c[spec['key']], table.c.data).where(_sql_scope(spec, table)))
+                    for value in dict.fromkeys(link['values'](json.loads(row.data)))
+                ]
+                if link_rows:
+                    conn.execute(link_table.insert(), link_rows)
+        except sa.exc.IntegrityError:
+            pass  # 다른 워커가 먼저 채움
+
+def _sql_bump_version(conn, path):
+    """데이터셋 변경 번호 1 늘리기 (데이터를 바꾼 트랜잭션 안에서 호출)"""
+    table = sql_tables['dataset_versions']
+    result = conn.execute(table.update().where(table.c.path == path).values(version=table.c.version + 1))
+    if result.rowcount == 0:
+        conn.execute(table.insert().values(path=path, version=1))
+
+def sql_version(path):
+    """SQL 저장소 데이터셋의 변경 번호 (sql_save/sql_delete로 바뀔 때마다 늘어남)"""
+    table = sql_tables['dataset_versions']
+    with _sql_engine().connect() as conn:
+        return conn.execute(sa.select(table.c.version).where(table.c.path == path)).scalar() or 0
+
+def _sql_key_columns(spec):
+    """데이터셋의 행 식별 컬럼"""
+    if spec['shape'] == 'grouped':
+        return (spec['key'], 'position')
+    if spec['shape'] == 'nested':
+        return spec['key']
+    return (spec['key'],)
+
+def _sql_scope(spec, table):
+    """데이터셋이 차지하는 행 범위 조건 (같은 테이블을 나눠 쓰는 경우)"""
+    if 'scope' in spec:
+        column, value = spec['scope']
+        return table.c[column] == value
+    if 'prefix' in spec:
+        return table.c[spec['key']].like(spec['prefix'] + '%')
+    return sa.true()
+
+def _sql_rows_from_data(spec, data):
+    """데이터 -> 테이블 행 목록"""
+    rows = []
+    shape = spec['shape']
+    
+    counters = spec.get('counters', {})
+    
+    def make_row(keys, position, item, columns_source):
+        row = dict(keys)
+        row['position'] = position
+        if counters:
+            item = {k: v for k, v in item.items() if k not in counters}
+        row['data'] = json.dumps(item, ensure_ascii=False)
+        row.update(spec['columns'](columns_source))
+        if 'scope' in spec:
+            row[spec['scope'][0]] = spec['scope'][1]
+        rows.append(row)
+    
+    if shape == 'list':
+        for position, item in enumerate(data):
+            make_row({spec['key']: str(item.get(spec['key']))}, position, item, item)
+    elif shape == 'dict':
+        for position, (key, item) in enumerate(data.items()):
+            make_row({spec['key']: key}, position, item, item)
+    elif shape == 'nested':
+        outer_key, inner_key = spec['key']
+        position = 0
+        for outer, inner_items in data.items():
+            for inner, value in inner_items.items():
+                make_row({outer_key: outer, inner_key: inner}, position, value, value)
+                position += 1
+    elif shape == 'by_group':
+        for items in data.values():
+            for position, item in enumerate(items):
+                make_row({spec['key']: str(item.get(spec['key']))}, position, item, item)
+    elif shape == 'grouped':
+        position_of = spec.get('position', lambda item, index: index)
+        for group, items in data.items():
+            group_key = spec.get('prefix', '') + group
+            for index, item in enumerate(items):
+                make_row({spec['key']: group_key}, position_of(item, index), item, item)
+    return rows
+
+def _sql_data_columns(spec, table):
+    """항목을 만드는 데 필요한 컬럼 (data와 카운터 컬럼)"""
+    return [table.c.data] + [table.c[column] for column in spec.get('counters', {}).values()]
+
+def _sql_item_from_row(spec, row):
+    """테이블 행(컬럼 이름 -> 값) -> 항목 (카운터는 컬럼 값이 최신)"""
+    item = json.loads(row['data'])
+    for field, column in spec.get('counters', {}).items():
+        item[field] = row[column] or 0
+    return item
+
+def _sql_data_from_rows(spec, rows, default):
+    """테이블 행 목록 -> 데이터"""
+    shape = spec['shape']
+    data = default
+    for row in rows:
+        item = _sql_item_from_row(spec, row)
+        if shape == 'list':
+            data.append(item)
+        elif shape == 'dict':
+            data[row[spec['key']]] = item
+        elif shape == 'nested':
+            outer_key, inner_key = spec['key']
+            data.setdefault(row[outer_key], {})[row[inner_key]] = item
+        elif shape == 'grouped':
+            group = row[spec['key']][len(spec.get('prefix', '')):]
+            data.setdefault(group, []).append(item)
+        elif shape == 'by_group':
+            data.setdefault(row[spec['group']] or '', []).append(item)
+    return data
+
+def sql_load(path, default_factory):
+    """SQL 저장소에서 데이터 불러오기"""
+    spec = SQL_DATASETS[path]
+    table = sql_tables[spec['table']]
+    if spec['shape'] == 'grouped':
+        order = [table.c[spec['key']], table.c.position]
+    elif spec['shape'] == 'by_group':
+        order = [table.c[spec['group']], table.c.position]
+    else:
+        order = [table.c.position]
+    with _sql_engine().connect() as conn:
+        result = conn.execute(sa.select(table).where(_sql_scope(spec, table)).order_by(*order))
+        rows = [dict(row._mapping) for row in result]
+    return _sql_data_from_rows(spec, rows, default_factory())
+
+def sql_save(path, data):
+    """SQL 저장소에 데이터 저장 (바뀐 행만 추가/수정/삭제)"""
+    spec = SQL_DATASETS[path]
+    table = sql_tables[spec['table']]
+    key_columns = _sql_key_columns(spec)
+    
+    def key_of(row):
+        return tuple(row[c] for c in key_columns)
+    
+    def key_condition(key):
+        return sa.and_(*[table.c[c] == v for c, v in zip(key_columns, key)])
+    
+    new_rows = {key_of(row): row for row in _sql_rows_from_data(spec, data)}
+    # 이미 있는 행의 카운터 컬럼은 sql_apply_counters의 증감분으로만 바꿈 (불러온 뒤 더해진 값을 덮어쓰지 않도록)
+    counter_columns = set(spec.get('counters', {}).values())
+    
+    try:
+        with _sql_engine().begin() as conn:
+            existing = {
+                key_of(row._mapping): (row.position, row.data)
+                for row in conn.execute(
+                    sa.select(*[table.c[c] for c in key_columns], table.c.position, table.c.data)
+                    .where(_sql_scope(spec, table))
+                )
+            }
+            
+            changed_keys = []
+            for key in existing.keys() - new_rows.keys():
+                conn.execute(table.delete().where(key_condition(key)))
+                changed_keys.append(key)
+            
+            inserts = []
+            for key, row in new_rows.items():
+                if key not in existing:
+                    inserts.append(row)
+                    changed_keys.append(key)
+                elif existing[key] != (row['position'], row['data']):
+                    values = {c: v for c, v in row.items() if c not in counter_columns}
+                    conn.execute(table.update().where(key_condition(key)).values(**values))
+                    changed_keys.append(key)
+            if inserts:
+                conn.execute(table.insert(), inserts)
+            
+            # 연결 테이블(채팅방 참여자, 게시글 태그) 갱신
+            if 'links' in spec and changed_keys:
+                link = spec['links']
+                link_table = sql_tables[link['table']]
+                items = data if spec['shape'] == 'dict' else {str(item.get(spec['key'])): item for item in data}
+                link_rows = []
+                for (item_key,) in changed_keys:
+                    conn.execute(link_table.delete().where(link_table.c[link['key']] == item_key))
+                    if item_key in items:
+                        link_rows.extend(
+                            {link['key']: item_key, link['column']: value}
+                            for value in dict.fromkeys(link['values'](items[item_key]))
+                        )
+                if link_rows:
+                    conn.execute(link_table.insert(), link_rows)
+            if changed_keys:
+                _sql_bump_version(conn, path)
+        return True
+    except Exception as e:
+        print(f"[SQL 저장소] {path} 저장 실패: {e}")
+        return False
+
+def sql_find(path, **conditions):
+    """SQL 저장소에서 인덱스 컬럼으로 항목 하나 조회"""
+    spec = SQL_DATASETS[path]
+    table = sql_tables[spec['table']]
+    query = sa.select(*_sql_data_columns(spec, table)).where(
+        _sql_scope(spec, table), *[table.c[c] == v for c, v in conditions.items()]
+    ).limit(1)
+    with _sql_engine().connect() as conn:
+        row = conn.execute(query).first()
+    return _sql_item_from_row(spec, row._mapping) if row else None
+
+def sql_delete(path, **conditions):
+    """SQL 저장소에서 인덱스 컬럼 조건에 맞는 항목 삭제 (삭제한 개수)"""
+    spec = SQL_DATASETS[path]
+    table = sql_tables[spec['table']]
+    try:
+        with _sql_engine().begin() as conn:
+            result = conn.execute(
+                table.delete().where(_sql_scope(spec, table), *[table.c[c] == v for c, v in conditions.items()])
+            )
+            if result.rowcount:
+                _sql_bump_version(conn, path)
+        return result.rowcount
+    except Exception as e:
+        print(f"[SQL 저장소] {path} 삭제 실패: {e}")
+        return None
+
+def sql_apply_counters(pending):
+    """SQL 저장소에 카운터 증감분 반영 (바뀐 게시글/댓글 행만 한 트랜잭션으로)
+
+    게시글은 카운터 컬럼에 증감분을 더하는 UPDATE 한 번씩, 댓글은 해당 댓글 행만 읽어 고친다.
+    pending: (데이터 파일 경로, 게시글/댓글 ID) -> {필드: 증감분}
+    """
+    posts = sql_tables['posts']
+    comments = sql_tables['comments']
+    post_columns = SQL_DATASETS[BOARD_POSTS_FILE]['counters']
+    comment_deltas = {
+        str(item_id): fields for (path, item_id), fields in pending.items() if path == BOARD_COMMENTS_FILE
+    }
+    try:
+        with _sql_engine().begin() as conn:
+            for (path, item_id), fields in pending.items():
+                if path != BOARD_POSTS_FILE:
+                    continue
+                values = {}
+                for field, delta in fields.items():
+                    total = sa.func.coalesce(posts.c[post_columns[field]], 0) + delta
+                    values[post_columns[field]] = sa.case((total < 0, 0), else_=total)
+                conn.execute(posts.update().where(posts.c.id == str(item_id)).values(**values))
+            
+            if comment_deltas:
+                rows = conn.execute(
+                    sa.select(comments.c.id, comments.c.data).where(comments.c.id.in_(list(comment_deltas)))
+                ).fetchall()
+                for row in rows:
+                    comment = json.loads(row.data)
+                    for field, delta in comment_deltas[row.id].items():
+                        comment[field] = max(0, _post_count(comment, field) + delta)
+                    conn.execute(
+                        comments.update().where(comments.c.id == row.id)
+                        .values(data=json.dumps(comment, ensure_ascii=False))
+                    )
+        return True
+    except Exception as e:
+        print(f"[SQL 저장소] 카운터 반영 실패: {e}")
+        return False
+
+def sql_post_comments_page(post_id, cursor=None, limit=COMMENT_PAGE_DEFAULT_LIMIT):
+    """SQL 저장소에서 게시글 댓글 한 페이지 조회 (작성 순)"""
+    table = sql_tables['comments']
+    conditions = [table.c.post_id == post_id]
+    reset = False
+    with _sql_engine().connect() as conn:
+        if cursor:
+            cursor_position = conn.execute(
+                sa.select(table.c.position).where(table.c.post_id == post_id, table.c.id == cursor)
+            ).scalar()
+            if cursor_position is None:
+                reset = True
+            else:
+                conditions.append(table.c.position > cursor_position)
+        rows = conn.execute(
+            sa.select(table.c.data).where(*conditions).order_by(table.c.position).limit(limit + 1)
+        )
+        page = [json.loads(row.data) for row in rows]
+    
+    has_more = len(page) > limit
+    page = page[:limit]
+    return {
+        'comments': page,
+        'next_cursor': page[-1].get('id') if has_more else None,
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+def sql_find_all(path, **conditions):
+    """SQL 저장소에서 인덱스 컬럼으로 항목 여러 개 조회"""
+    spec = SQL_DATASETS[path]
+    table = sql_tables[spec['table']]
+    query = sa.select(*_sql_data_columns(spec, table)).where(
+        _sql_scope(spec, table), *[table.c[c] == v for c, v in conditions.items()]
+    ).order_by(table.c.position)
+    with _sql_engine().connect() as conn:
+        return [_sql_item_from_row(spec, row._mapping) for row in conn.execute(query)]
+
+def sql_find_many(path, column, values):
+    """SQL 저장소에서 인덱스 컬럼 값 여러 개로 항목 조회 (컬럼 값 -> 항목)"""
+    values = list(dict.fromkeys(values))
+    if not values:
+        return {}
+    spec = SQL_DATASETS[path]
+    table = sql_tables[spec['table']]
+    query = sa.select(table.c[column].label('lookup_key'), *_sql_data_columns(spec, table)).where(
+        _sql_scope(spec, table), table.c[column].in_(values)
+    )
+    with _sql_engine().connect() as conn:
+        return {row.lookup_key: _sql_item_from_row(spec, row._mapping) for row in conn.execute(query)}
+
+def sql_query_board_posts(board_id=None, department_id=None, post_type=None, tag=None,
+                          sort='recent', cursor=None, limit=BOARD_PAGE_DEFAULT_LIMIT):
+    """SQL 저장소에서 게시글 목록 한 페이지 조회 (정렬 컬럼 인덱스를 따라 커서 이후부터 읽음)"""
+    table = sql_tables['posts']
+    order_columns = [table.c.created_at, table.c.id]
+    if sort != 'recent':
+        order_columns.insert(0, table.c[BOARD_POST_SORT_COLUMNS[sort]])
+    
+    conditions = []
+    for column, value in (('board_id', board_id), ('department_id', department_id), ('post_type', post_type)):
+        if value is not None:
+            conditions.append(table.c[column] == value)
+    
+    if tag is not None:
+        tags = sql_tables['post_tags']
+        conditions.append(table.c.id.in_(sa.select(tags.c.post_id).where(tags.c.tag == tag[:POST_TAG_KEY_LENGTH])))
+    
+    reset = False
+    with _sql_engine().connect() as conn:
+        if cursor:
+            cursor_key = conn.execute(sa.select(*order_columns).where(table.c.id == cursor)).first()
+            if cursor_key is None:
+                reset = True
+            else:
+                conditions.append(sa.tuple_(*order_columns) < sa.tuple_(*cursor_key))
+        
+        spec = SQL_DATASETS[BOARD_POSTS_FILE]
+        query = (
+            sa.select(*_sql_data_columns(spec, table)).where(*conditions)
+            .order_by(*[c.desc() for c in order_columns]).limit(limit + 1)
+        )
+        page = [_sql_item_from_row(spec, row._mapping) for row in conn.execute(query)]
+    
+    has_more = len(page) > limit
+    page = page[:limit]
+    return {
+        'posts': page,
+        'next_cursor': page[-1].get('id') if has_more else None,
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+def sql_user_rooms(student_id):
+    """SQL 저장소에서 사용자가 참여한 활성 채팅방 조회 ((방 종류, 방 ID, 방 정보) 목록)"""
+    rooms = sql_tables['rooms']
+    members = sql_tables['room_members']
+    query = (
+        sa.select(rooms.c.room_type, rooms.c.room_id, rooms.c.data)
+        .join(members, members.c.room_id == rooms.c.room_id)
+        .where(members.c.student_id == student_id, rooms.c.active.isnot(False))
+        .order_by(rooms.c.room_type, rooms.c.position)
+    )
+    with _sql_engine().connect() as conn:
+        return [(row.room_type, row.room_id, json.loads(row.data)) for row in conn.execute(query)]
+
+def sql_is_room_member(room_id, student_id):
+    """SQL 저장소에서 사용자가 활성 채팅방의 참여자인지 확인"""
+    rooms = sql_tables['rooms']
+    members = sql_tables['room_members']
+    query = (
+        sa.select(members.c.room_id)
+        .join(rooms, rooms.c.room_id == members.c.room_id)
+        .where(members.c.room_id == room_id, members.c.student_id == student_id, rooms.c.active.isnot(False))
+    )
+    with _sql_engine().connect() as conn:
+        return conn.execute(query).first() is not None
+
+def sql_user_read_markers(student_id):
+    """SQL 저장소에서 사용자의 채팅방별 읽음 상태 조회"""
+    table = sql_tables['read_status']
+    query = sa.select(table.c.room_id, table.c.data).where(table.c.student_id == student_id)
+    with _sql_engine().connect() as conn:
+        return {row.room_id: json.loads(row.data) for row in conn.execute(query)}
+
+def sql_user_likes(student_id):
+    """SQL 저장소에서 사용자의 좋아요 기록 조회"""
+    table = sql_tables['board_likes']
+    query = sa.select(table.c.kind, table.c.data).where(table.c.student_id == student_id)
+    with _sql_engine().connect() as conn:
+        return {row.kind: json.loads(row.data) for row in conn.execute(query)}
+
+def _sql_message_from_row(row):
+    """messages 테이블 행 -> 메시지 (순번은 position + 1)"""
+    message = json.loads(row.data)
+    message['seq'] = row.position + 1
+    return message
+
+def sql_room_messages(room_id):
+    """SQL 저장소에서 채팅방 메시지 목록 조회"""
+    table = sql_tables['messages']
+    with _sql_engine().connect() as conn:
+        rows = conn.execute(
+            sa.select(table.c.position, table.c.data).where(table.c.room_id == room_id).order_by(table.c.position)
+        )
+        return [_sql_message_from_row(row) for row in rows]
+
+def sql_room_message_state(room_id):
+    """SQL 저장소 채팅방의 (마지막 순번, 보관 중인 메시지 수)"""
+    table = sql_tables['messages']
+    with _sql_engine().connect() as conn:
+        last_position, count = conn.execute(
+            sa.select(sa.func.max(table.c.position), sa.func.count()).where(table.c.room_id == room_id)
+        ).one()
+    return (0 if last_position is None else last_position + 1), count
+
+def sql_room_messages_page(room_id, since=None, limit=None):
+    """SQL 저장소에서 커서 이후의 채팅방 메시지 조회"""
+    table = sql_tables['messages']
+    with _sql_engine().connect() as conn:
+        total, last_position = conn.execute(
+            sa.select(sa.func.count(), sa.func.max(table.c.position)).where(table.c.room_id == room_id)
+        ).one()
+        last_id = None
+        if last_position is not None:
+            last_id = conn.execute(
+                sa.select(table.c.message_id).where(table.c.room_id == room_id, table.c.position == last_position)
+            ).scalar()
+        
+        since_position = None
+        if since:
+            since_position = conn.execute(
+                sa.select(sa.func.max(table.c.position)).where(table.c.room_id == room_id, table.c.message_id == since)
+            ).scalar()
+        
+        query = sa.select(table.c.position, table.c.data).where(table.c.room_id == room_id)
+        if since_position is not None:
+            query = query.where(table.c.position > since_position).order_by(table.c.position)
+            if limit is not None:
+                query = query.limit(limit + 1)
+            rows = [_sql_message_from_row(row) for row in conn.execute(query)]
+            has_more = limit is not None and len(rows) > limit
+            page = rows[:limit] if limit is not None else rows
+        else:
+            query = query.order_by(table.c.position.desc())
+            if limit is not None:
+                query = query.limit(limit)
+            page = [_sql_message_from_row(row) for row in conn.execute(query)][::-1]
+            has_more = len(page) < total
+    
+    reset = bool(since) and since_position is None
+    if page:
+        next_cursor = page[-1].get('id')
+    else:
+        next_cursor = None if reset else since
+    return {
+        'messages': page,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'reset': reset,
+        'version': f"{total}:{last_id or ''}",
+    }
+
+def sql_append_room_message(room_id, message):
+    """SQL 저장소 채팅방에 메시지 추가 (오래된 메시지는 백그라운드에서 보관함으로 옮김)"""
+    table = sql_tables['messages']
+    try:
+        with chat_room_lock(room_id), _sql_engine().begin() as conn:
+            last = conn.execute(
+                sa.select(sa.func.max(table.c.position)).where(table.c.room_id == room_id)
+            ).scalar()
+            position = 0 if last is None else last + 1
+            message['seq'] = position + 1
+            conn.execute(table.insert().values(
+                room_id=room_id, position=position, message_id=message.get('id'),
+                data=json.dumps(message, ensure_ascii=False),
+            ))
         return True
     except Exception as e:
-        print(f"[데이터 저장 실패] 오류: {e}")
+        print(f"[SQL 저장소] {room_id} 메시지 저장 실패: {e}")
         return False
 
+def sql_replace_room_message(room_id, message_id, message):
+    """SQL 저장소 채팅방의 기존 메시지 교체 (없으면 추가)"""
+    table = sql_tables['messages']
+    with chat_room_lock(room_id):
+        try:
+            with _sql_engine().begin() as conn:
+                # 교체된 메시지는 원래 메시지의 순번을 이어받음
+                position = conn.execute(
+                    sa.select(sa.func.max(table.c.position))
+                    .where(table.c.room_id == room_id, table.c.message_id == message_id)
+                ).scalar()
+                if position is not None:
+                    message['seq'] = position + 1
+                    conn.execute(
+                        table.update()
+                        .where(table.c.room_id == room_id, table.c.position == position)
+                        .values(message_id=message.get('id'), data=json.dumps(message, ensure_ascii=False))
+                    )
+        except Exception as e:
+            print(f"[SQL 저장소] {room_id} 메시지 교체 실패: {e}")
+            return False
+        if position is not None:
+            return True
+        return sql_append_room_message(room_id, message)
+
+def sql_room_messages_before(room_id, before, limit):
+    """SQL 저장소 채팅방에서 before 순번보다 앞선 메시지를 최근 것부터 limit개 (오래된 순으로 반환)"""
+    table = sql_tables['messages']
+    with _sql_engine().connect() as conn:
+        rows = conn.execute(
+            sa.select(table.c.position, table.c.data)
+            .where(table.c.room_id == room_id, table.c.position < before - 1)
+            .order_by(table.c.position.desc()).limit(limit)
+        )
+        return [_sql_message_from_row(row) for row in rows][::-1]
+
+def sql_write_chat_archive(room_id, messages, data):
+    """SQL 저장소에 압축 보관 묶음 하나 저장"""
+    table = sql_tables['message_archives']
+    with _sql_engine().begin() as conn:
+        conn.execute(table.delete().where(table.c.room_id == room_id, table.c.first_seq == messages[0]['seq']))
+        conn.execute(table.insert().values(
+            room_id=room_id, first_seq=messages[0]['seq'], last_seq=messages[-1]['seq'], data=data,
+        ))
+
+def sql_chat_archive_segments(room_id, before):
+    """SQL 저장소에서 before 순번보다 앞선 보관 묶음을 최근 것부터 하나씩 (압축된 데이터)"""
+    table = sql_tables['message_archives']
+    with _sql_engine().connect() as conn:
+        rows = conn.execute(
+            sa.select(table.c.data)
+            .where(table.c.room_id == room_id, table.c.first_seq < before)
+            .order_by(table.c.first_seq.desc())
+        ).fetchall()
+    for row in rows:
+        yield row.data
+
+def sql_prune_chat_room(room_id, now):
+    """SQL 저장소 채팅방에서 보관 범위를 벗어난 메시지를 보관함으로 옮기기 (옮긴 개수)"""
+    table = sql_tables['messages']
+    with chat_room_lock(room_id):
+        with _sql_engine().connect() as conn:
+            last_position = conn.execute(
+                sa.select(sa.func.max(table.c.position)).where(table.c.room_id == room_id)
+            ).scalar()
+            if last_position is None:
+                return 0
+            archived = []
+            rows = conn.execute(
+                sa.select(table.c.position, table.c.data).where(table.c.room_id == room_id).order_by(table.c.position)
+            )
+            for row in rows:
+                message = _sql_message_from_row(row)
+                if not _chat_message_expired(room_id, message, last_position + 1 - row.position, now):
+                    break
+                archived.append(message)
+            rows.close()
+        if not archived:
+            return 0
+        
+        # 보관함에 먼저 기록한 뒤 삭제 (중간에 실패해도 메시지를 잃지 않음)
+        write_chat_archive(room_id, archived)
+        with _sql_engine().begin() as conn:
+            conn.execute(table.delete().where(
+                table.c.room_id == room_id, table.c.position <= archived[-1]['seq'] - 1
+            ))
+    return len(archived)
+
+def sql_write_room_archive(record, data):
+    """SQL 저장소에 보관한 채팅방 기록 저장"""
+    table = sql_tables['room_archives']
+    with _sql_engine().begin() as conn:
+        conn.execute(table.delete().where(table.c.room_id == record['room_id']))
+        conn.execute(table.insert().values(
+            room_id=record['room_id'], room_type=record['room_type'], archived_at=record['archived_at'], data=data,
+        ))
+
+def sql_find_room_archive(room_id):
+    """SQL 저장소에서 보관한 채팅방 기록 조회 (압축된 데이터, 없으면 None)"""
+    table = sql_tables['room_archives']
+    with _sql_engine().connect() as conn:
+        return conn.execute(sa.select(table.c.data).where(table.c.room_id == room_id)).scalar()
+
+def sql_chat_room_ids():
+    """SQL 저장소에 메시지가 있는 채팅방 ID 목록"""
+    table = sql_tables['messages']
+    with _sql_engine().connect() as conn:
+        return [row.room_id for row in conn.execute(sa.select(table.c.room_id).distinct())]
+
+@app.cli.command('import-json')
+def import_json_command():
+    """현재 JSON 데이터 파일을 SQL 저장소로 가져오기 (STORAGE_BACKEND=sql 에서 한 번 실행)"""
+    if STORAGE_BACKEND != 'sql':
+        print('STORAGE_BACKEND=sql 환경에서 실행해주세요.')
+        return
+    
+    for path, spec in SQL_DATASETS.items():
+        if path == CHAT_MESSAGES_FILE:
+            data = _read_json_chat_messages()
+        elif not os.path.exists(path):
+            print(f"[가져오기] {path} 없음 - 건너뜀")
+            continue
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        if 'normalize' in spec:
+            data = spec['normalize'](data)
+        if sql_save(path, data):
+            print(f"[가져오기] {path} -> {spec['table']} 완료")
+        else:
+            print(f"[가져오기] {path} 실패")
+    
+    # 채팅 보관함 묶음은 압축된 그대로 옮김
+    count = 0
+    for room_id, path in _chat_archive_files():
+        with open(path, 'rb') as f:
+            data = f.read()
+        messages = _decode_chat_archive(data)
+        if messages:
+            sql_write_chat_archive(room_id, messages, data)
+            count += 1
+    print(f"[가져오기] {CHAT_ARCHIVE_DIR} -> message_archives {count}개 완료")
+    
+    count = 0
+    if os.path.isdir(ROOM_ARCHIVE_DIR):
+        for filename in os.listdir(ROOM_ARCHIVE_DIR):
+            if filename.endswith('.json.gz'):
+                with open(os.path.join(ROOM_ARCHIVE_DIR, filename), 'rb') as f:
+                    data = f.read()
+                sql_write_room_archive(json.loads(gzip.decompress(data)), data)
+                count += 1
+    print(f"[가져오기] {ROOM_ARCHIVE_DIR} -> room_archives {count}개 완료")
+
+def load_users():
+    """등록된 사용자 정보 불러오기"""
+    return store_load(DATA_FILE, list)
+
+def save_users(users, changed=None, removed=()):
+    """등록된 사용자 정보 저장하기
+
+    changed(추가되거나 바뀐 사용자 목록)와 removed(삭제된 사용자의 학번 목록)를 넘기면
+    사용자 인덱스도 그 사용자만 갱신한다. changed=None이면 다음 조회 때 인덱스를 새로 만든다.
+    """
+    before = store_version(DATA_FILE)
+    if store_save(DATA_FILE, users):
+        if changed is not None:
+            store_index_update('users', DATA_FILE, before, lambda index: _update_student_index(index, users, changed, removed))
+        print(f"[데이터 저장 성공] {len(users)}명의 사용자 정보 저장됨")
+        return True
+    print("[데이터 저장 실패] 사용자 정보 저장 오류")
+    return False
+
 def is_student_id_duplicate(student_id):
     """학번 중복 체크"""
-    users = load_users()
-    return any(user.get('student_id') == student_id for user in users)
+    return find_user(student_id) is not None
+
+def _build_user_index(users):
+    """사용자 인덱스 (학번 -> 사용자, 학번 -> 목록 위치)"""
+    index = {'by_student': {}, 'position': {}}
+    for position, user in enumerate(users):
+        index['by_student'][user.get('student_id')] = user
+        index['position'][user.get('student_id')] = position
+    return index
+
+def _update_student_index(index, items, changed, removed):
+    """학번 기준 목록 인덱스(by_student, position)에 바뀐 항목만 반영 (store_index_update에서 호출)"""
+    by_student, position = index['by_student'], index['position']
+    shift_from = None
+    for student_id in removed:
+        by_student.pop(student_id, None)
+        old = position.pop(student_id, None)
+        if old is not None and (shift_from is None or old < shift_from):
+            shift_from = old
+    if shift_from is not None:
+        # 삭제된 항목 뒤에 있던 항목만 위치를 다시 매김
+        for i in range(shift_from, len(items)):
+            position[items[i].get('student_id')] = i
+    
+    for item in changed:
+        student_id = item.get('student_id')
+        if student_id not in position:
+            # 새 항목은 목록 끝에 추가되므로 뒤에서부터 찾음
+            found = next((i for i in range(len(items) - 1, -1, -1) if items[i].get('student_id') == student_id), None)
+            if found is None:
+                return False
+            position[student_id] = found
+        by_student[student_id] = items[position[student_id]]
+    return True
+
+def user_index():
+    """사용자 인덱스 (사용자 목록을 저장할 때 바뀐 사용자만 갱신, 파일이 밖에서 바뀌면 새로 만듦)"""
+    return store_index('users', [(DATA_FILE, load_users)], _build_user_index)
+
+def find_user(student_id):
+    """학번으로 사용자 한 명 조회"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_find(DATA_FILE, student_id=student_id)
+    return user_index()['by_student'].get(student_id)
+
+def user_position(users, student_id):
+    """load_users()로 불러온 목록에서 사용자의 위치 (없으면 None)"""
+    if STORAGE_BACKEND == 'sql':
+        return next((i for i, u in enumerate(users) if u.get('student_id') == student_id), None)
+    return user_index()['position'].get(student_id)
+
+# 비밀번호 해시
+# PBKDF2-SHA256으로 저장하고, 반복 횟수(PASSWORD_HASH_ITERATIONS)가 바뀌었거나 예전 평문 비밀번호로 로그인하면
+# 그 자리에서 새 해시로 바꿔 저장한다. 해시 계산은 CPU를 많이 쓰므로 요청 스레드에서 세마포어를 잡고 계산해
+# 로그인이 몰려도 동시에 계산하는 수가 코어 수를 넘지 않게 한다 (나머지 요청은 차례를 기다림).
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '600000'))
+PASSWORD_HASH_METHOD = f'pbkdf2:sha256:{PASSWORD_HASH_ITERATIONS}'
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+PASSWORD_HASH_PREFIXES = ('pbkdf2:', 'scrypt:')  # 해시로 저장된 값의 시작 (그 밖의 값은 예전 평문 비밀번호)
+
+_password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS)  # 동시에 해시를 계산하는 요청 수 제한
+
+def hash_password(password):
+    """비밀번호 해시 만들기"""
+    with _password_hash_slots:
+        return generate_password_hash(password, PASSWORD_HASH_METHOD)
+
+def verify_password(stored, password):
+    """비밀번호 확인 -> (일치 여부, 다시 저장할 새 해시 또는 None)
+
+    평문으로 저장된 예전 비밀번호나 반복 횟수가 다른 해시가 맞으면 현재 설정으로 만든 새 해시를 함께 돌려준다.
+    """
+    if not stored or not password:
+        return False, None
+    if not stored.startswith(PASSWORD_HASH_PREFIXES):
+        if not hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8')):
+            return False, None
+        return True, hash_password(password)
+    with _password_hash_slots:
+        matched = check_password_hash(stored, password)
+    if not matched:
+        return False, None
+    if not stored.startswith(PASSWORD_HASH_METHOD + '$'):
+        return True, hash_password(password)
+    return True, None
+
+def rehash_user_password(student_id, stored, new_hash):
+    """확인한 비밀번호를 새 해시로 바꿔 저장 (그사이 비밀번호가 바뀌었으면 그대로 둠)"""
+    with data_transaction(DATA_FILE):
+        users = load_users()
+        position = user_position(users, student_id)
+        if position is None or users[position].get('password') != stored:
+            return False
+        users[position]['password'] = new_hash
+        return save_users(users, changed=[users[position]])
+
+@app.cli.command('bench-login')
+@click.option('--seconds', default=5.0, help='측정 시간 (초)')
+@click.option('--concurrency', default=None, type=int, help='동시에 로그인하는 요청 수 (기본: 동시 해시 계산 수의 2배)')
+def bench_login_command(seconds, concurrency):
+    """비밀번호 확인 처리량 측정 (초당 로그인 수와 코어당 로그인 수)"""
+    concurrency = concurrency or PASSWORD_HASH_WORKERS * 2
+    stored = hash_password('benchmark-password')
+    counts = []
+    deadline = time.time() + seconds
+    
+    def worker():
+        count = 0
+        while time.time() < deadline:
+            verify_password(stored, 'benchmark-password')
+            count += 1
+        counts.append(count)
+    
+    started = time.time()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    
+    cores = min(PASSWORD_HASH_WORKERS, os.cpu_count() or 1)
+    per_second = sum(counts) / elapsed
+    print(f"[벤치마크] {PASSWORD_HASH_METHOD}, 동시 해시 계산 {PASSWORD_HASH_WORKERS}개, 동시 요청 {concurrency}개")
+    print(f"[벤치마크] 초당 {per_second:.1f}회 로그인, 코어당 {per_second / cores:.1f}회")
+
+def load_anon_profiles():
+    """익명 프로필 불러오기"""
+    return store_load(ANON_PROFILES_FILE, list)
+
+def save_anon_profiles(profiles, changed=None, removed=()):
+    """익명 프로필 저장하기
+
+    changed(바뀐 프로필 목록)와 removed(삭제된 프로필의 학번 목록)를 넘기면
+    관심사 인덱스도 그 프로필만 갱신한다. changed=None이면 다음 조회 때 인덱스를 새로 만든다.
+    """
+    before = store_version(ANON_PROFILES_FILE)
+    if not store_save(ANON_PROFILES_FILE, profiles):
+        return False
+    if changed is not None:
+        store_index_update(
+            'anon_profiles', ANON_PROFILES_FILE, before,
+            lambda index: _update_anon_profile_index(index, profiles, changed, removed)
+        )
+    update_interest_index(before, changed, removed)
+    return True
+
+def _build_anon_profile_index(profiles):
+    """익명 프로필 인덱스 (학번 -> 프로필, 학번 -> 목록 위치, 닉네임 -> 학번 집합, 학번 -> 색인된 닉네임)"""
+    index = {'by_student': {}, 'position': {}, 'by_nickname': {}, 'nickname': {}}
+    for position, profile in enumerate(profiles):
+        student_id = profile.get('student_id')
+        index['by_student'][student_id] = profile
+        index['position'][student_id] = position
+        index['by_nickname'].setdefault(profile.get('nickname'), set()).add(student_id)
+        index['nickname'][student_id] = profile.get('nickname')
+    return index
+
+def _update_anon_profile_index(index, profiles, changed, removed):
+    """익명 프로필 인덱스에 바뀐 프로필만 반영 (store_index_update에서 호출)"""
+    by_nickname = index['by_nickname']
+    for student_id in list(removed) + [p.get('student_id') for p in changed]:
+        if student_id not in index['nickname']:
+            continue
+        # 프로필은 제자리에서 수정될 수 있으므로 색인해 둔 닉네임에서 뺌 (조회 중인 집합 대신 새 집합으로 교체)
+        old_nickname = index['nickname'].pop(student_id)
+        owners = by_nickname.get(old_nickname, set()) - {student_id}
+        if owners:
+            by_nickname[old_nickname] = owners
+        else:
+            by_nickname.pop(old_nickname, None)
+    if not _update_student_index(index, profiles, changed, removed):
+        return False
+    for profile in changed:
+        student_id, nickname = profile.get('student_id'), profile.get('nickname')
+        by_nickname[nickname] = by_nickname.get(nickname, set()) | {student_id}
+        index['nickname'][student_id] = nickname
+    return True
+
+def anon_profile_index():
+    """익명 프로필 인덱스 (프로필을 저장할 때 바뀐 프로필만 갱신, 파일이 밖에서 바뀌면 새로 만듦)"""
+    return store_index('anon_profiles', [(ANON_PROFILES_FILE, load_anon_profiles)], _build_anon_profile_index)
+
+def find_anon_profile(student_id):
+    """학번으로 익명 프로필 조회"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_find(ANON_PROFILES_FILE, student_id=student_id)
+    return anon_profile_index()['by_student'].get(student_id)
+
+def find_anon_profiles(student_ids):
+    """여러 학번의 익명 프로필을 한 번에 조회 (학번 -> 프로필)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_find_many(ANON_PROFILES_FILE, 'student_id', student_ids)
+    by_student = anon_profile_index()['by_student']
+    return {sid: by_student[sid] for sid in student_ids if sid in by_student}
+
+def anon_profile_position(profiles, student_id):
+    """load_anon_profiles()로 불러온 목록에서 프로필의 위치 (없으면 None)"""
+    if STORAGE_BACKEND == 'sql':
+        return next((i for i, p in enumerate(profiles) if p.get('student_id') == student_id), None)
+    return anon_profile_index()['position'].get(student_id)
+
+def is_nickname_taken(nickname, exclude_student_id=None):
+    """다른 사용자가 이미 쓰고 있는 닉네임인지 확인"""
+    if STORAGE_BACKEND == 'sql':
+        owners = {p.get('student_id') for p in sql_find_all(ANON_PROFILES_FILE, nickname=nickname)}
+    else:
+        owners = anon_profile_index()['by_nickname'].get(nickname, set())
+    return bool(owners - {exclude_student_id})
+
+def upsert_anon_profile(profile_data):
+    """익명 프로필 저장 (기존 프로필이 있으면 교체, 없으면 추가)"""
+    profiles = load_anon_profiles()
+    existing_index = anon_profile_position(profiles, profile_data.get('student_id'))
+    
+    if existing_index is not None:
+        profiles[existing_index] = profile_data
+    else:
+        profiles.append(profile_data)
+    
+    return save_anon_profiles(profiles, changed=[profile_data])
+
+# 관심사 -> 프로필 역색인
+# 관심사별 참여자 수/닉네임 조회에 쓰며, 프로필을 저장할 때 바뀐 프로필의 관심사만 갱신한다.
+_interest_lock = threading.Lock()
+_interest_index = {'built': False, 'version': None, 'by_interest': {}, 'interests': {}}  # by_interest: 관심사 -> {학번: 닉네임}, interests: 학번 -> 관심사 목록
+
+def _interest_remove(student_id):
+    """색인에서 프로필 제거 (_interest_lock 안에서 호출)"""
+    for interest in _interest_index['interests'].pop(student_id, ()):
+        members = _interest_index['by_interest'].get(interest)
+        if members is not None:
+            members.pop(student_id, None)
+            if not members:
+                del _interest_index['by_interest'][interest]
+
+def _interest_add(profile):
+    """색인에 프로필 추가 또는 갱신 (_interest_lock 안에서 호출)"""
+    student_id = profile.get('student_id')
+    _interest_remove(student_id)
+    interests = list(dict.fromkeys(profile.get('interests') or []))
+    _interest_index['interests'][student_id] = interests
+    for interest in interests:
+        _interest_index['by_interest'].setdefault(interest, {})[student_id] = profile.get('nickname', '익명의친구')
+
+def _ensure_interest_index():
+    """색인이 없거나 프로필 파일이 색인 밖에서 바뀌었으면 새로 만들기 (_interest_lock 안에서 호출)"""
+    if STORAGE_BACKEND != 'sql':
+        load_anon_profiles()  # 다른 워커나 외부 도구가 파일을 바꿨으면 여기서 다시 읽힘
+    version = store_version(ANON_PROFILES_FILE)
+    if _interest_index['built'] and _interest_index['version'] == version:
+        return
+    
+    _interest_index['by_interest'] = {}
+    _interest_index['interests'] = {}
+    for profile in load_anon_profiles():
+        _interest_add(profile)
+    _interest_index['built'] = True
+    _interest_index['version'] = version
+
+def update_interest_index(before_version, changed=None, removed=()):
+    """프로필 저장 후 색인 갱신 (save_anon_profiles에서 호출)"""
+    with _interest_lock:
+        if not _interest_index['built']:
+            return
+        if changed is None or _interest_index['version'] != before_version:
+            # 무엇이 바뀌었는지 모르면 다음 조회 때 새로 만듦
+            _interest_index['built'] = False
+            return
+        for student_id in removed:
+            _interest_remove(student_id)
+        for profile in changed:
+            _interest_add(profile)
+        _interest_index['version'] = store_version(ANON_PROFILES_FILE)
+
+def interest_summary():
+    """관심사별 참여자 수와 닉네임 목록"""
+    with _interest_lock:
+        _ensure_interest_index()
+        by_interest = _interest_index['by_interest']
+        return (
+            {interest: len(members) for interest, members in by_interest.items()},
+            {interest: list(members.values()) for interest, members in by_interest.items()},
+        )
+
+def load_board_posts():
+    """게시글 불러오기"""
+    return store_load(BOARD_POSTS_FILE, list)
+
+def save_board_posts(posts, changed=None, removed=(), counters=None):
+    """게시글 저장하기
+
+    changed(제목/내용/태그가 바뀐 게시글 목록)와 removed(삭제된 게시글 ID 목록)를 넘기면
+    검색 색인도 그 글만 갱신한다. changed=None이면 다음 검색 때 색인을 새로 만든다.
+    counters(좋아요 수/조회수/댓글 수만 바뀐 게시글 목록)를 넘기면 게시글 인덱스를 새로 만들지 않고
+    정렬해 둔 목록에서 그 글의 순위만 다시 매긴다.
+    """
+    before = store_version(BOARD_POSTS_FILE)
+    if not store_save(BOARD_POSTS_FILE, posts):
+        return False
+    if counters is not None:
+        store_index_update('board_posts', BOARD_POSTS_FILE, before, lambda index: _rerank_board_posts(index, counters))
+    update_search_index(before, changed, removed)
+    return True
+
+def _board_post_sort_key(post, sort):
+    """정렬 기준 값 (같으면 최신 글, 그다음 ID 순)"""
+    key = (post.get('createdAt') or '', str(post.get('id')))
+    if sort == 'recent':
+        return key
+    return (_post_count(post, BOARD_POST_SORT_FIELDS[sort]),) + key
+
+def _build_board_post_index(posts):
+    """게시글 인덱스 (ID -> 게시글, ID -> 목록 위치, 게시판 ID -> 게시글 목록, 작성자 학번 -> 게시글 목록)
+
+    정렬된 목록은 (게시판, 정렬 기준)별로 처음 요청될 때 만들어 'orders'에 보관한다.
+    """
+    index = {'all': posts, 'by_id': {}, 'position': {}, 'by_board': {}, 'by_author': {}, 'orders': {}}
+    for position, post in enumerate(posts):
+        index['by_id'][post.get('id')] = post
+        index['position'][post.get('id')] = position
+        index['by_board'].setdefault(post.get('boardId'), []).append(post)
+        if post.get('authorStudentId'):
+            index['by_author'].setdefault(post['authorStudentId'], []).append(post)
+    return index
+
+def board_post_index():
+    """게시글 인덱스 (게시글 목록이 저장될 때마다 새로 만듦)"""
+    return store_index('board_posts', [(BOARD_POSTS_FILE, load_board_posts)], _build_board_post_index)
+
+def _board_post_order(index, board_id, sort):
+    """게시판의 정렬된 게시글 목록과 ID -> 순위"""
+    key = (board_id, sort)
+    order = index['orders'].get(key)
+    if order is None:
+        ordered = sorted(
+            index['all'] if board_id is None else index['by_board'].get(board_id, ()),
+            key=lambda post: _board_post_sort_key(post, sort),
+            reverse=True
+        )
+        order = (ordered, {post.get('id'): rank for rank, post in enumerate(ordered)})
+        index['orders'][key] = order
+    return order
+
+def _rerank_board_posts(index, posts):
+    """카운터가 바뀐 게시글만 정렬된 목록에서 다시 자리 잡기 (store_index_update에서 호출, 최신순 목록은 그대로)"""
+    for key, (ordered, rank) in list(index['orders'].items()):
+        sort = key[1]
+        moved = [post for post in posts if post.get('id') in rank]
+        if sort == 'recent' or not moved:
+            continue
+        # 조회 중인 목록을 바꾸지 않도록 복사본을 고쳐서 교체
+        ordered = list(ordered)
+        rank = dict(rank)
+        old_positions = sorted((rank[post.get('id')] for post in moved), reverse=True)
+        for position in old_positions:
+            del ordered[position]
+        
+        inserted = []
+        for post in moved:
+            # 내림차순 목록에서 이 글보다 정렬 값이 작은 첫 위치
+            sort_key = _board_post_sort_key(post, sort)
+            low, high = 0, len(ordered)
+            while low < high:
+                middle = (low + high) // 2
+                if _board_post_sort_key(ordered[middle], sort) > sort_key:
+                    low = middle + 1
+                else:
+                    high = middle
+            ordered.insert(low, post)
+            inserted.append(low)
+        
+        # 위치가 바뀔 수 있는 구간만 순위를 다시 매김
+        start = min(old_positions + inserted)
+        end = min(max(old_positions[0], max(inserted) + len(moved)), len(ordered) - 1)
+        for position in range(start, end + 1):
+            rank[ordered[position].get('id')] = position
+        index['orders'][key] = (ordered, rank)
+
+def find_board_post(post_id):
+    """게시글 ID로 게시글 조회"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_find(BOARD_POSTS_FILE, id=post_id)
+    return board_post_index()['by_id'].get(post_id)
+
+def query_board_posts(board_id=None, department_id=None, post_type=None, tag=None,
+                      sort='recent', cursor=None, limit=BOARD_PAGE_DEFAULT_LIMIT):
+    """게시글 목록 한 페이지 조회
+
+    cursor는 이전 페이지 마지막 게시글의 ID이며, 그 게시글이 삭제되었으면 reset=True와 함께 첫 페이지를 돌려준다.
+    """
+    if STORAGE_BACKEND == 'sql':
+        return sql_query_board_posts(board_id, department_id, post_type, tag, sort, cursor, limit)
+    
+    ordered, rank = _board_post_order(board_post_index(), board_id, sort)
+    reset = bool(cursor) and cursor not in rank
+    start = rank[cursor] + 1 if cursor and not reset else 0
+    
+    page = []
+    for post in itertools.islice(ordered, start, None):
+        if department_id is not None and post.get('departmentId') != department_id:
+            continue
+        if post_type is not None and post.get('type') != post_type:
+            continue
+        if tag is not None and tag not in (post.get('tags') or []):
+            continue
+        page.append(post)
+        if len(page) > limit:
+            break
+    
+    has_more = len(page) > limit
+    page = page[:limit]
+    return {
+        'posts': page,
+        'next_cursor': page[-1].get('id') if has_more else None,
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+def load_board_comments():
+    """댓글 불러오기 (게시글 ID -> 댓글 목록)"""
+    comments = store_load(BOARD_COMMENTS_FILE, dict)
+    if isinstance(comments, list):
+        # 예전 형식(전체 댓글 목록) 파일은 잠근 뒤 다시 읽어 게시글별로 묶어서 저장 (다른 요청이 먼저 바꿨으면 그대로 씀)
+        with data_transaction(BOARD_COMMENTS_FILE):
+            comments = store_load(BOARD_COMMENTS_FILE, dict)
+            if isinstance(comments, list):
+                comments = _group_comments_by_post(comments)
+                save_board_comments(comments)
+    return comments
+
+def save_board_comments(comments, counters_only=False):
+    """댓글 저장하기 (counters_only=True면 좋아요 수만 바뀐 것이므로 댓글 인덱스를 그대로 씀)"""
+    before = store_version(BOARD_COMMENTS_FILE)
+    if not store_save(BOARD_COMMENTS_FILE, comments):
+        return False
+    if counters_only:
+        for name in ('board_comments', 'board_comment_authors'):
+            store_index_update(name, BOARD_COMMENTS_FILE, before, lambda index: True)
+    return True
+
+def all_board_comments():
+    """전체 댓글 목록"""
+    return [comment for post_comments in load_board_comments().values() for comment in post_comments]
+
+def board_comment_index():
+    """댓글 ID -> 게시글 ID 인덱스 (댓글이 저장될 때마다 새로 만듦)"""
+    return store_index(
+        'board_comments', [(BOARD_COMMENTS_FILE, load_board_comments)],
+        lambda comments: {c.get('id'): post_key for post_key, items in comments.items() for c in items}
+    )
+
+def board_comment_author_index():
+    """작성자 학번 -> 댓글 목록 인덱스 (작성 순, 댓글이 저장될 때마다 새로 만듦)"""
+    def build(comments):
+        by_author = {}
+        for comment in sorted(
+            (c for items in comments.values() for c in items if c.get('authorStudentId')),
+            key=lambda c: c.get('createdAt') or ''
+        ):
+            by_author.setdefault(comment['authorStudentId'], []).append(comment)
+        return by_author
+    return store_index('board_comment_authors', [(BOARD_COMMENTS_FILE, load_board_comments)], build)
+
+def locate_board_comment(comments, comment_id):
+    """load_board_comments()로 불러온 데이터에서 댓글 찾기 (댓글이 속한 게시글의 댓글만 훑음)
+
+    (게시글 ID, 댓글) - 없으면 (None, None)
+    """
+    if STORAGE_BACKEND == 'sql':
+        found = sql_find(BOARD_COMMENTS_FILE, id=comment_id)
+        post_key = _comment_post_key(found) if found else None
+    else:
+        post_key = board_comment_index().get(comment_id)
+    if post_key is None:
+        return None, None
+    comment = next((c for c in comments.get(post_key, []) if c.get('id') == comment_id), None)
+    return (post_key, comment) if comment is not None else (None, None)
+
+def delete_post_comments(post_id):
+    """게시글의 댓글 모두 삭제 (해당 게시글의 댓글 수만큼만 비용이 듦)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_delete(BOARD_COMMENTS_FILE, post_id=str(post_id or '')) is not None
+    comments = load_board_comments()
+    if comments.pop(str(post_id or ''), None) is None:
+        return True
+    return save_board_comments(comments)
+
+def query_post_comments(post_id, cursor=None, limit=COMMENT_PAGE_DEFAULT_LIMIT):
+    """게시글 댓글 한 페이지 조회 (작성 순)
+
+    cursor는 이전 페이지 마지막 댓글의 ID이며, 그 댓글이 삭제되었으면 reset=True와 함께 첫 페이지를 돌려준다.
+    """
+    if STORAGE_BACKEND == 'sql':
+        return sql_post_comments_page(post_id, cursor, limit)
+    
+    post_comments = load_board_comments().get(post_id, [])
+    start = 0
+    reset = False
+    if cursor:
+        position = next((i for i, c in enumerate(post_comments) if c.get('id') == cursor), None)
+        reset = position is None
+        start = 0 if reset else position + 1
+    
+    page = post_comments[start:start + limit]
+    has_more = start + limit < len(post_comments)
+    return {
+        'comments': page,
+        'next_cursor': page[-1].get('id') if has_more else None,
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+def load_board_likes():
+    """좋아요 기록 불러오기 (학번 -> {'posts': {게시글 ID: 시각}, 'comments': {댓글 ID: 시각}})"""
+    return store_load(BOARD_LIKES_FILE, dict)
+
+def save_board_likes(likes):
+    """좋아요 기록 저장하기"""
+    return store_save(BOARD_LIKES_FILE, likes)
+
+def load_user_likes(student_id):
+    """사용자가 좋아요한 게시글/댓글"""
+    if STORAGE_BACKEND == 'sql':
+        user_likes = sql_user_likes(student_id)
+    else:
+        user_likes = load_board_likes().get(student_id, {})
+    return {'posts': user_likes.get('posts', {}), 'comments': user_likes.get('comments', {})}
+
+@data_transaction(BOARD_LIKES_FILE)
+def toggle_user_like(student_id, kind, target_id):
+    """좋아요 토글 (kind: 'posts' 또는 'comments') - 좋아요 상태가 되었으면 True"""
+    likes = load_board_likes()
+    user_likes = likes.setdefault(student_id, {}).setdefault(kind, {})
+    if target_id in user_likes:
+        del user_likes[target_id]
+        liked = False
+    else:
+        user_likes[target_id] = datetime.now().isoformat()
+        liked = True
+    save_board_likes(likes)
+    return liked
+
+# 내 활동 (작성한 글/댓글, 좋아요한 글/댓글)
+# 게시판 전체를 내려받지 않도록 작성자별 인덱스와 사용자별 좋아요 기록에서 해당 사용자 항목만 꺼낸다.
+def find_board_posts(post_ids):
+    """게시글 ID 여러 개로 조회 (게시글 ID -> 게시글, 없는 게시글은 빠짐)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_find_many(BOARD_POSTS_FILE, 'id', post_ids)
+    by_id = board_post_index()['by_id']
+    return {post_id: by_id[post_id] for post_id in post_ids if post_id in by_id}
+
+def find_board_comments(comment_ids):
+    """댓글 ID 여러 개로 조회 (댓글 ID -> 댓글, 없는 댓글은 빠짐)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_find_many(BOARD_COMMENTS_FILE, 'id', comment_ids)
+    comments = load_board_comments()
+    found = {}
+    for comment_id in comment_ids:
+        _, comment = locate_board_comment(comments, comment_id)
+        if comment is not None:
+            found[comment_id] = comment
+    return found
+
+def _user_activity_entries(student_id, kind):
+    """사용자 활동 (항목 ID, 원본 항목) 목록 - 최근 것부터"""
+    if kind == 'posts':
+        if STORAGE_BACKEND == 'sql':
+            posts = sql_find_all(BOARD_POSTS_FILE, author_student_id=student_id)
+        else:
+            posts = board_post_index()['by_author'].get(student_id, [])
+        return [(p.get('id'), p) for p in reversed(posts)]
+    
+    if kind == 'comments':
+        if STORAGE_BACKEND == 'sql':
+            comments = sorted(sql_find_all(BOARD_COMMENTS_FILE, author_student_id=student_id),
+                              key=lambda c: c.get('createdAt') or '')
+        else:
+            comments = board_comment_author_index().get(student_id, [])
+        return [(c.get('id'), c) for c in reversed(comments)]
+    
+    # 좋아요 기록은 (ID -> 좋아요 시각)이므로 시각순으로 정렬하고, 그사이 삭제된 글/댓글은 뺌
+    likes = load_user_likes(student_id)['posts' if kind == 'likes' else 'comments']
+    targets = (find_board_posts if kind == 'likes' else find_board_comments)(list(likes))
+    ordered = sorted((t for t in likes if t in targets), key=lambda t: likes[t], reverse=True)
+    return [(t, dict(targets[t], likedAt=likes[t])) for t in ordered]
+
+def _activity_item(kind, item, posts):
+    """마이페이지에 표시할 활동 항목"""
+    if kind == 'posts':
+        return {
+            'id': item.get('id'),
+            'title': item.get('title', ''),
+            'content': item.get('content', ''),
+            'category': item.get('category') or item.get('boardId') or '일반',
+            'date': item.get('createdAt'),
+            'likes': counter_value(BOARD_POSTS_FILE, item, 'likes'),
+        }
+    post = posts.get(item.get('postId'), {})
+    if kind == 'comments':
+        return {
+            'id': item.get('id'),
+            'content': item.get('content', ''),
+            'postId': item.get('postId'),
+            'postTitle': post.get('title', ''),
+            'date': item.get('createdAt'),
+        }
+    if kind == 'likes':
+        return {
+            'postId': item.get('id'),
+            'postTitle': item.get('title', ''),
+            'postAuthor': item.get('author', ''),
+            'date': item.get('likedAt'),
+        }
+    return {
+        'commentId': item.get('id'),
+        'commentContent': item.get('content', ''),
+        'commentAuthor': item.get('author', ''),
+        'postId': item.get('postId'),
+        'date': item.get('likedAt'),
+    }
+
+def _activity_items(kind, entries):
+    """원본 항목 목록 -> 활동 항목 목록 (댓글 항목에 필요한 게시글 제목은 한 번에 조회)"""
+    posts = {}
+    if kind == 'comments':
+        posts = find_board_posts([item.get('postId') for _, item in entries])
+    return [_activity_item(kind, item, posts) for _, item in entries]
+
+def query_user_activity(student_id, kind, cursor=None, limit=ACTIVITY_PAGE_DEFAULT_LIMIT):
+    """사용자 활동 한 페이지 조회 (최근 것부터)
+
+    cursor는 이전 페이지 마지막 항목의 ID이며, 그 항목이 사라졌으면 reset=True와 함께 첫 페이지를 돌려준다.
+    """
+    entries = _user_activity_entries(student_id, kind)
+    start = 0
+    reset = False
+    if cursor:
+        position = next((i for i, (item_id, _) in enumerate(entries) if item_id == cursor), None)
+        reset = position is None
+        start = 0 if reset else position + 1
+    
+    page = entries[start:start + limit]
+    has_more = start + limit < len(entries)
+    return {
+        'items': _activity_items(kind, page),
+        'total': len(entries),
+        'next_cursor': page[-1][0] if has_more else None,
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+def user_activity_summary(student_id):
+    """종류별 활동 수와 가장 최근 항목"""
+    summary = {}
+    for kind in ACTIVITY_KINDS:
+        entries = _user_activity_entries(student_id, kind)
+        summary[kind] = {'count': len(entries), 'recent': _activity_items(kind, entries[:1])[:1]}
+    return summary
+
+# 게시글/댓글 카운터 (좋아요 수, 조회수, 댓글 수)
+# 클릭할 때마다 파일 전체를 다시 쓰지 않도록 증감분을 메모리에 모았다가 COUNTER_FLUSH_INTERVAL초마다 한 번에 반영한다.
+# 절댓값이 아니라 증감분을 더하므로 여러 워커가 동시에 반영해도 값이 사라지지 않는다.
+COUNTER_FLUSH_INTERVAL = 2
+
+_counter_lock = threading.Lock()
+_pending_counters = {}  # (데이터 파일 경로, 게시글/댓글 ID) -> {필드: 증감분}
+
+def bump_counter(path, item_id, field, delta=1):
+    """카운터 증감 (BOARD_POSTS_FILE 또는 BOARD_COMMENTS_FILE 항목)"""
+    with _counter_lock:
+        fields = _pending_counters.setdefault((path, item_id), {})
+        fields[field] = fields.get(field, 0) + delta
+    start_background_thread('counter-writer', _counter_writer_loop)
+
+def counter_value(path, item, field):
+    """저장된 값 + 아직 반영하지 않은 증감분"""
+    with _counter_lock:
+        pending = _pending_counters.get((path, item.get('id')), {}).get(field, 0)
+    return max(0, _post_count(item, field) + pending)
+
+def _flush_counters_to_files(pending):
+    """카운터 증감분을 게시글/댓글 데이터 파일에 반영 (JSON 저장소)"""
+    with data_transaction(BOARD_POSTS_FILE, BOARD_COMMENTS_FILE):
+        posts = load_board_posts()
+        comments = load_board_comments()
+        posts_by_id = board_post_index()['by_id']
+        
+        touched = {BOARD_POSTS_FILE: [], BOARD_COMMENTS_FILE: []}
+        for (path, item_id), fields in pending.items():
+            if path == BOARD_POSTS_FILE:
+                item = posts_by_id.get(item_id)
+            else:
+                _, item = locate_board_comment(comments, item_id)
+            if item is None:
+                # 그사이 삭제된 게시글/댓글
+                continue
+            for field, delta in fields.items():
+                item[field] = max(0, _post_count(item, field) + delta)
+            touched[path].append(item)
+        
+        ok = True
+        if touched[BOARD_POSTS_FILE]:
+            ok = save_board_posts(posts, changed=[], counters=touched[BOARD_POSTS_FILE]) and ok
+        if touched[BOARD_COMMENTS_FILE]:
+            ok = save_board_comments(comments, counters_only=True) and ok
+    return ok
+
+def flush_counters():
+    """모아 둔 카운터 증감분을 게시글/댓글 데이터에 반영"""
+    with _counter_lock:
+        pending = dict(_pending_counters)
+        _pending_counters.clear()
+    if not pending:
+        return True
+    
+    if STORAGE_BACKEND == 'sql':
+        # 전체 게시글/댓글을 불러오지 않고 바뀐 행에만 증감분을 더함
+        # (댓글은 행을 읽어 고치므로 댓글을 저장하는 다른 요청과 겹치지 않게 잠금)
+        with data_transaction(BOARD_COMMENTS_FILE):
+            ok = sql_apply_counters(pending)
+    else:
+        ok = _flush_counters_to_files(pending)
+    
+    if not ok:
+        # 저장에 실패하면 다음 주기에 다시 반영
+        with _counter_lock:
+            for key, fields in pending.items():
+                merged = _pending_counters.setdefault(key, {})
+                for field, delta in fields.items():
+                    merged[field] = merged.get(field, 0) + delta
+    return ok
+
+def _counter_writer_loop():
+    """백그라운드 카운터 반영 스레드"""
+    while True:
+        time.sleep(COUNTER_FLUSH_INTERVAL)
+        try:
+            flush_counters()
+        except Exception as e:
+            print(f"[카운터] 반영 실패: {e}")
+
+# 프로세스 종료 시 남은 증감분 반영 (atexit는 나중에 등록한 것부터 실행되므로 store_flush보다 먼저 실행됨)
+atexit.register(flush_counters)
+
+# 게시글 검색
+# 제목/태그/내용을 글자 2-gram으로 쪼갠 역색인을 메모리에 두고 (한글은 띄어쓰기와 조사 때문에 단어 단위로는 잘 안 찾아짐),
+# 한 글자 검색어도 바로 찾을 수 있도록 글자 하나씩도 함께 색인하며,
+# 게시글이 작성/수정/삭제될 때는 그 글만 색인에 반영한다.
+SEARCH_FIELD_WEIGHTS = (('title', 3), ('tags', 2), ('content', 1))  # 필드별 가중치
+SEARCH_PAGE_DEFAULT_LIMIT = 20
+SEARCH_PAGE_MAX_LIMIT = 50
+
+_SEARCH_WORD_RE = re.compile(r'\w+')
+_search_lock = threading.Lock()
+_search_index = {'built': False, 'version': None, 'postings': {}, 'docs': {}}  # postings: gram(2글자 또는 1글자) -> {게시글 ID: 가중치}
+
+def _search_normalize(text):
+    """검색용 정규화 (전각/반각 통일, 소문자)"""
+    return unicodedata.normalize('NFKC', str(text or '')).lower()
+
+def _search_words(text):
+    """텍스트 -> 단어 목록"""
+    return _SEARCH_WORD_RE.findall(_search_normalize(text))
+
+def _word_grams(word):
+    """단어 -> 글자 2-gram 목록 (한 글자 단어는 그대로)"""
+    if len(word) == 1:
+        return [word]
+    return [word[i:i + 2] for i in range(len(word) - 1)]
+
+def _text_grams(words):
+    """단어 목록 -> 색인할 gram 목록 (글자 2-gram과, 한 글자 검색어용 글자 하나씩)"""
+    grams = [word[i:i + 2] for word in words for i in range(len(word) - 1)]
+    grams.extend(char for word in words for char in word)
+    return grams
+
+def _post_search_doc(post):
+    """게시글 -> 색인 항목 (gram별 가중치, 검색어 확인용 본문, 정렬용 작성 시각)"""
+    weights = {}
+    texts = []
+    for field, weight in SEARCH_FIELD_WEIGHTS:
+        value = post.get(field)
+        text = ' '.join(str(v) for v in value) if isinstance(value, list) else str(value or '')
+        texts.append(text)
+        for gram, count in Counter(_text_grams(_search_words(text))).items():
+            weights[gram] = weights.get(gram, 0) + count * weight
+    return {
+        'weights': weights,
+        'text': _search_normalize(' '.join(texts)),
+        'board_id': post.get('boardId'),
+        'created_at': post.get('createdAt') or '',
+    }
+
+def _search_remove(post_id):
+    """색인에서 게시글 제거 (_search_lock 안에서 호출)"""
+    doc = _search_index['docs'].pop(post_id, None)
+    if doc is None:
+        return
+    for gram in doc['weights']:
+        postings = _search_index['postings'].get(gram)
+        if postings is not None:
+            postings.pop(post_id, None)
+            if not postings:
+                del _search_index['postings'][gram]
+
+def _search_add(post):
+    """색인에 게시글 추가/교체 (_search_lock 안에서 호출)"""
+    post_id = post.get('id')
+    _search_remove(post_id)
+    doc = _post_search_doc(post)
+    _search_index['docs'][post_id] = doc
+    for gram, weight in doc['weights'].items():
+        _search_index['postings'].setdefault(gram, {})[post_id] = weight
+
+def _ensure_search_index():
+    """색인이 없거나 게시글 파일이 색인 밖에서 바뀌었으면 새로 만들기 (_search_lock 안에서 호출)"""
+    if STORAGE_BACKEND != 'sql':
+        load_board_posts()  # 다른 워커나 외부 도구가 파일을 바꿨으면 여기서 다시 읽힘
+    version = store_version(BOARD_POSTS_FILE)
+    if _search_index['built'] and _search_index['version'] == version:
+        return
+    
+    posts = load_board_posts()
+    _search_index['postings'] = {}
+    _search_index['docs'] = {}
+    for post in posts:
+        _search_add(post)
+    _search_index['built'] = True
+    _search_index['version'] = version
+    print(f"[검색] 게시글 {len(posts)}개 색인 완료")
+
+def _warm_search_index():
+    """백그라운드에서 색인 미리 만들기"""
+    with _search_lock:
+        _ensure_search_index()
+
+def warm_search_index():
+    """게시판 화면을 열 때 색인을 미리 만들어 첫 검색이 기다리지 않도록 함"""
+    start_background_thread('search-indexer', _warm_search_index)
+
+def update_search_index(before_version, changed=None, removed=()):
+    """게시글 저장 후 색인 갱신 (save_board_posts에서 호출)"""
+    with _search_lock:
+        if not _search_index['built']:
+            return
+        if changed is None or _search_index['version'] != before_version:
+            # 무엇이 바뀌었는지 모르면 다음 검색 때 새로 만듦
+            _search_index['built'] = False
+            return
+        for post_id in removed:
+            _search_remove(post_id)
+        for post in changed:
+            _search_add(post)
+        _search_index['version'] = store_version(BOARD_POSTS_FILE)
+
+def search_board_posts(query, board_id=None, offset=0, limit=SEARCH_PAGE_DEFAULT_LIMIT):
+    """게시글 검색 (검색어의 모든 단어를 포함한 글을 관련도순으로)
+
+    관련도 = 검색어 gram마다 (필드 가중치 합 x 희소도)를 더한 값, 같으면 최신 글 먼저.
+    """
+    words = list(dict.fromkeys(_search_words(query)))
+    if not words:
+        return {'posts': [], 'total': 0, 'next_cursor': None, 'has_more': False}
+    
+    with _search_lock:
+        _ensure_search_index()
+        postings = _search_index['postings']
+        docs = _search_index['docs']
+        
+        # 단어마다 후보 게시글 집합을 구해 교집합 (한 글자 단어는 글자 색인 하나만 봄)
+        term_postings = []
+        candidates = None
+        for word in words:
+            word_postings = [(gram, postings.get(gram, {})) for gram in dict.fromkeys(_word_grams(word))]
+            term_postings.extend(word_postings)
+            
+            matched = None
+            for _, p in sorted(word_postings, key=lambda item: len(item[1])):
+                matched = set(p) if matched is None else matched & p.keys()
+                if not matched:
+                    break
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                break
+        
+        # 2-gram이 모두 있어도 붙어 있지 않을 수 있으므로 본문에 단어가 그대로 있는지 확인
+        candidates = [
+            post_id for post_id in (candidates or ())
+            if all(word in docs[post_id]['text'] for word in words)
+            and (board_id is None or docs[post_id]['board_id'] == board_id)
+        ]
+        
+        total_docs = len(docs)
+        scores = dict.fromkeys(candidates, 0.0)
+        for gram, p in term_postings:
+            if not p:
+                continue
+            idf = math.log(1 + total_docs / len(p))
+            # 후보와 gram 색인 중 작은 쪽을 훑음
+            if len(p) < len(scores):
+                for post_id, weight in p.items():
+                    if post_id in scores:
+                        scores[post_id] += weight * idf
+            else:
+                for post_id in scores:
+                    scores[post_id] += p.get(post_id, 0) * idf
+        
+        ranked = heapq.nlargest(
+            offset + limit + 1, candidates,
+            key=lambda post_id: (scores[post_id], docs[post_id]['created_at'], str(post_id))
+        )
+    
+    page_ids = ranked[offset:offset + limit]
+    has_more = len(ranked) > offset + limit
+    if STORAGE_BACKEND == 'sql':
+        found = sql_find_many(BOARD_POSTS_FILE, 'id', page_ids)
+    else:
+        found = board_post_index()['by_id']
+    return {
+        'posts': [found[post_id] for post_id in page_ids if post_id in found],
+        'total': len(candidates),
+        'next_cursor': str(offset + limit) if has_more else None,
+        'has_more': has_more,
+    }
+
+# 채팅 메시지 로그
+# 채팅방마다 chat_logs/<방 ID>.jsonl 파일에 변경 기록을 한 줄씩 덧붙이고,
+# 최근 메시지(보관 개수만큼)는 메모리에 들고 있다가 해당 방 요청에만 돌려준다.
+# 보관 범위를 벗어난 메시지는 백그라운드에서 chat_archive/<방 ID>/ 아래 압축 묶음으로 옮긴다.
+CHAT_LOG_DIR = 'chat_logs'
+CHAT_ARCHIVE_DIR = 'chat_archive'
+# 채팅방 종류별 보관 정책 - limit: 최근 메시지 수, max_age: 보관 기간(초), 0이면 제한 없음
+CHAT_RETENTION = {
+    'dm': {
+        'limit': int(os.environ.get('CHAT_RETENTION_DM_LIMIT', '100')),
+        'max_age': float(os.environ.get('CHAT_RETENTION_DM_DAYS', '0')) * 86400,
+    },
+    'group': {
+        'limit': int(os.environ.get('CHAT_RETENTION_GROUP_LIMIT', '500')),
+        'max_age': float(os.environ.get('CHAT_RETENTION_GROUP_DAYS', '0')) * 86400,
+    },
+}
+CHAT_PRUNE_INTERVAL = 60  # 보관 범위 정리 주기 (초)
+CHAT_PAGE_MAX_LIMIT = 200  # 메시지 조회 한 번에 돌려주는 최대 개수
+CHAT_HISTORY_DEFAULT_LIMIT = 50  # 이전 메시지 조회 기본 개수
+
+_chat_log_cache = {}  # 방 ID -> {'messages': 최근 메시지, 'offset': 읽은 위치, 'ino': inode, 'records': 로그 줄 수, 'last_seq': 마지막 순번}
+
+def _chat_log_path(room_id):
+    """채팅방 로그 파일 경로"""
+    return os.path.join(CHAT_LOG_DIR, quote(room_id, safe='') + '.jsonl')
+
+def _chat_retention_policy(room_id):
+    """채팅방 종류에 맞는 보관 정책"""
+    return CHAT_RETENTION['group' if room_id.startswith('group_') else 'dm']
+
+def _chat_message_expired(room_id, message, newer_count, now):
+    """보관 범위를 벗어난 메시지인지 (newer_count: 이 메시지를 포함해 이후에 있는 메시지 수)"""
+    policy = _chat_retention_policy(room_id)
+    if policy['limit'] and newer_count > policy['limit']:
+        return True
+    timestamp = message.get('timestamp')
+    return bool(policy['max_age']) and isinstance(timestamp, (int, float)) and timestamp < now - policy['max_age']
+
+def chat_room_lock(room_id):
+    """채팅방 로그 잠금 (확인 후 기록해야 하는 경우 사용)"""
+    os.makedirs(CHAT_LOG_DIR, exist_ok=True)
+    return file_lock(_chat_log_path(room_id))
+
+def _new_chat_log_entry(ino=None):
+    """채팅방 로그 메모리 상태 초기값"""
+    return {'messages': [], 'offset': 0, 'ino': ino, 'records': 0, 'last_seq': 0}
+
+def _apply_chat_record(entry, record):
+    """로그 한 줄을 메모리 메시지 목록에 반영
+
+    메시지마다 방 안에서 1씩 증가하는 순번(seq)이 붙는다. 순번이 없는 예전 메시지는 읽는 순서대로 붙인다.
+    """
+    messages = entry['messages']
+    message = record['message']
+    if 'seq' not in message:
+        message['seq'] = entry['last_seq'] + 1
+    entry['last_seq'] = max(entry['last_seq'], message['seq'])
+    
+    if record.get('op') == 'replace':
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].get('id') == record.get('replaces'):
+                messages[i] = message
+                break
+        else:
+            messages.append(message)
+    else:
+        messages.append(message)
+
+def _seed_chat_log(room_id, path):
+    """예전 chat_messages.json에만 있는 방이면 로그 파일로 옮기기"""
+    legacy_messages = store_load(CHAT_MESSAGES_FILE, dict).get(room_id)
+    if legacy_messages:
+        _write_chat_log(path, legacy_messages)
+
+def _write_chat_log(path, messages):
+    """채팅방 로그를 메시지 목록으로 새로 쓰기 (원자적 교체)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            last_seq = 0
+            for message in messages:
+                if 'seq' not in message:
+                    message = dict(message, seq=last_seq + 1)
+                last_seq = message['seq']
+                f.write(json.dumps({'op': 'add', 'message': message}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _sync_chat_log(room_id):
+    """로그 파일에서 아직 읽지 않은 부분만 읽어 메모리 목록 갱신 (다른 워커가 쓴 내용 포함)"""
+    path = _chat_log_path(room_id)
+    
+    with _store_lock:
+        entry = _chat_log_cache.get(room_id)
+    
+    try:
+        st = os.stat(path)
+    except OSError:
+        if entry is None:
+            # 로그로 옮길 예전 메시지가 없으면 잠금 파일도 만들지 않음 (없는 방 ID로 조회해도 디스크에 남는 것이 없음)
+            if not store_load(CHAT_MESSAGES_FILE, dict).get(room_id):
+                return _new_chat_log_entry()
+            with chat_room_lock(room_id):
+                if not os.path.exists(path):
+                    _seed_chat_log(room_id, path)
+            if not os.path.exists(path):
+                return _new_chat_log_entry()
+            return _sync_chat_log(room_id)
+        return entry
+    
+    with _store_lock:
+        entry = _chat_log_cache.get(room_id)
+        if entry is not None and entry['ino'] == st.st_ino and entry['offset'] == st.st_size:
+            return entry
+        
+        # 정리(compaction)로 파일이 교체됐으면 처음부터 다시 읽기
+        if entry is None or entry['ino'] != st.st_ino or st.st_size < entry['offset']:
+            entry = _new_chat_log_entry(st.st_ino)
+        
+        with open(path, 'rb') as f:
+            f.seek(entry['offset'])
+            chunk = f.read()
+        
+        # 마지막 줄이 아직 다 쓰이지 않았으면 다음에 읽기
+        end = chunk.rfind(b'\n') + 1
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"[채팅 로그] {room_id} 로그의 잘못된 줄 무시")
+                continue
+            _apply_chat_record(entry, record)
+            entry['records'] += 1
+        entry['offset'] += end
+        _chat_log_cache[room_id] = entry
+        return entry
+
+def get_room_messages(room_id):
+    """채팅방 메시지 목록 (보관 중인 최근 메시지)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_room_messages(room_id)
+    entry = _sync_chat_log(room_id)
+    with _store_lock:
+        return list(entry['messages'])
+
+def _slice_messages_page(messages, since=None, limit=None):
+    """메시지 목록에서 커서(since) 이후 부분만 잘라내기
+
+    since를 찾지 못하면(보관 기간이 지나 삭제되었거나 교체된 메시지) reset=True와 함께 최근 메시지를 돌려준다.
+    """
+    total = len(messages)
+    version = f"{total}:{messages[-1].get('id') if messages else ''}"
+    reset = False
+    start = 0
+    
+    if since:
+        # 새 메시지는 항상 뒤에 붙으므로 뒤에서부터 찾기
+        for i in range(total - 1, -1, -1):
+            if messages[i].get('id') == since:
+                start = i + 1
+                break
+        else:
+            reset = True
+    
+    if since and not reset:
+        end = total if limit is None else min(total, start + limit)
+        page = messages[start:end]
+        has_more = end < total
+    else:
+        page = messages if limit is None else messages[max(0, total - limit):]
+        has_more = len(page) < total
+    
+    if page:
+        next_cursor = page[-1].get('id')
+    else:
+        next_cursor = None if reset else since
+    
+    return {
+        'messages': list(page),
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'reset': reset,
+        'version': version,
+    }
+
+def chat_room_exists(room_id):
+    """채팅방이 있는지 (방 정보, 채팅방 로그, 예전 chat_messages.json 메시지 중 하나라도 있으면)"""
+    if STORAGE_BACKEND == 'sql':
+        if sql_find(CHAT_ROOMS_FILE, room_id=room_id) or sql_find(GROUP_ROOMS_FILE, room_id=room_id):
+            return True
+        return sql_room_message_state(room_id)[0] > 0
+    if room_id in load_chat_rooms() or room_id in load_group_rooms():
+        return True
+    return os.path.exists(_chat_log_path(room_id)) or bool(store_load(CHAT_MESSAGES_FILE, dict).get(room_id))
+
+def room_message_state(room_id):
+    """채팅방의 (마지막 메시지 순번, 보관 중인 메시지 수)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_room_message_state(room_id)
+    entry = _sync_chat_log(room_id)
+    with _store_lock:
+        return entry['last_seq'], len(entry['messages'])
+
+def get_room_messages_page(room_id, since=None, limit=None):
+    """채팅방 메시지 중 커서 이후의 새 메시지만 조회 (폴링용)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_room_messages_page(room_id, since, limit)
+    entry = _sync_chat_log(room_id)
+    with _store_lock:
+        return _slice_messages_page(entry['messages'], since, limit)
+
+def _append_chat_record(room_id, record):
+    """채팅방 로그에 한 줄 덧붙이기"""
+    path = _chat_log_path(room_id)
+    with chat_room_lock(room_id):
+        entry = _sync_chat_log(room_id)
+        
+        # 순번은 잠금 안에서 정해야 워커끼리 겹치지 않음 (교체는 원래 메시지의 순번을 이어받음)
+        message = record['message']
+        with _store_lock:
+            message['seq'] = entry['last_seq'] + 1
+            if record.get('op') == 'replace':
+                replaced = next((m for m in reversed(entry['messages']) if m.get('id') == record.get('replaces')), None)
+                if replaced is not None:
+                    message['seq'] = replaced['seq']
+        
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(path, 'ab') as f:
+            f.write(line)
+        with _store_lock:
+            # 방금 쓴 줄은 다시 읽지 않고 바로 반영
+            st = os.stat(path)
+            if entry['ino'] is None:
+                entry['ino'] = st.st_ino
+            if st.st_ino == entry['ino'] and st.st_size == entry['offset'] + len(line):
+                _apply_chat_record(entry, record)
+                entry['records'] += 1
+                entry['offset'] = st.st_size
+                _chat_log_cache[room_id] = entry
+    return True
 
-def load_anon_profiles():
-    """익명 프로필 불러오기"""
-    if os.path.exists(ANON_PROFILES_FILE):
-        try:
-            with open(ANON_PROFILES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_anon_profiles(profiles):
-    """익명 프로필 저장하기"""
+def append_chat_message(room_id, message):
+    """채팅방에 메시지 추가"""
+    start_background_thread('chat-pruner', _chat_pruner_loop)
+    if STORAGE_BACKEND == 'sql':
+        return sql_append_room_message(room_id, message)
     try:
-        with open(ANON_PROFILES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(profiles, f, ensure_ascii=False, indent=2)
-        return True
-    except:
+        return _append_chat_record(room_id, {'op': 'add', 'message': message})
+    except Exception as e:
+        print(f"[채팅 로그] {room_id} 메시지 저장 실패: {e}")
         return False
 
-def load_board_posts():
-    """게시글 불러오기"""
-    if os.path.exists(BOARD_POSTS_FILE):
-        try:
-            with open(BOARD_POSTS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_board_posts(posts):
-    """게시글 저장하기"""
+def replace_chat_message(room_id, message_id, message):
+    """채팅방의 기존 메시지를 새 메시지로 교체 (없으면 추가)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_replace_room_message(room_id, message_id, message)
     try:
-        with open(BOARD_POSTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(posts, f, ensure_ascii=False, indent=2)
-        return True
-    except:
+        return _append_chat_record(room_id, {'op': 'replace', 'replaces': message_id, 'message': message})
+    except Exception as e:
+        print(f"[채팅 로그] {room_id} 메시지 교체 실패: {e}")
         return False
 
-def load_board_comments():
-    """댓글 불러오기"""
-    if os.path.exists(BOARD_COMMENTS_FILE):
+def _chat_archive_room_dir(room_id):
+    """채팅방 보관함 디렉터리"""
+    return os.path.join(CHAT_ARCHIVE_DIR, quote(room_id, safe=''))
+
+def _chat_archive_files():
+    """보관함 묶음 파일 목록 ((방 ID, 파일 경로), 가져오기용)"""
+    if not os.path.isdir(CHAT_ARCHIVE_DIR):
+        return
+    for dirname in os.listdir(CHAT_ARCHIVE_DIR):
+        room_dir = os.path.join(CHAT_ARCHIVE_DIR, dirname)
+        for filename in sorted(os.listdir(room_dir)):
+            if filename.endswith('.jsonl.gz'):
+                yield unquote(dirname), os.path.join(room_dir, filename)
+
+def _decode_chat_archive(data):
+    """압축 묶음 -> 메시지 목록"""
+    return [json.loads(line) for line in gzip.decompress(data).splitlines() if line.strip()]
+
+def _write_compressed_file(path, data):
+    """압축된 보관 데이터를 파일로 쓰기 (원자적 교체)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
         try:
-            with open(BOARD_COMMENTS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_board_comments(comments):
-    """댓글 저장하기"""
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_chat_archive(room_id, messages):
+    """보관 범위를 벗어난 메시지를 압축 묶음 하나로 저장
+
+    묶음 이름(첫 순번-마지막 순번)으로 이전 메시지 조회 시 필요한 묶음만 골라 읽는다.
+    """
+    data = gzip.compress(''.join(json.dumps(m, ensure_ascii=False) + '\n' for m in messages).encode('utf-8'))
+    if STORAGE_BACKEND == 'sql':
+        return sql_write_chat_archive(room_id, messages, data)
+    
+    filename = f"{messages[0]['seq']:010d}-{messages[-1]['seq']:010d}.jsonl.gz"
+    _write_compressed_file(os.path.join(_chat_archive_room_dir(room_id), filename), data)
+
+def _chat_archive_segments(room_id, before):
+    """before 순번보다 앞선 보관 묶음을 최근 것부터 하나씩 (압축된 데이터)"""
+    if STORAGE_BACKEND == 'sql':
+        yield from sql_chat_archive_segments(room_id, before)
+        return
+    
+    room_dir = _chat_archive_room_dir(room_id)
     try:
-        with open(BOARD_COMMENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(comments, f, ensure_ascii=False, indent=2)
-        return True
-    except:
-        return False
+        filenames = [name for name in os.listdir(room_dir) if name.endswith('.jsonl.gz')]
+    except OSError:
+        return
+    # 파일 이름이 0으로 채운 순번이라 문자열 정렬이 곧 순번 정렬
+    for filename in sorted(filenames, reverse=True):
+        if int(filename.split('-', 1)[0]) >= before:
+            continue
+        with open(os.path.join(room_dir, filename), 'rb') as f:
+            yield f.read()
 
-def load_chat_messages():
-    """채팅 메시지 불러오기"""
-    if os.path.exists(CHAT_MESSAGES_FILE):
+def get_room_history(room_id, before, limit):
+    """before 순번보다 앞선 메시지를 최근 것부터 limit개 (보관 중인 메시지 다음 보관함 순)
+
+    다음 페이지는 응답의 next_cursor(가장 오래된 메시지 순번)를 before로 넘겨서 조회한다.
+    """
+    if STORAGE_BACKEND == 'sql':
+        page = sql_room_messages_before(room_id, before, limit + 1)
+    else:
+        page = [m for m in get_room_messages(room_id) if m.get('seq', 0) < before][-(limit + 1):]
+    
+    if len(page) <= limit:
+        # 같은 묶음이 두 번 옮겨졌을 수 있으므로 순번으로 중복 제거
+        seen = {m['seq'] for m in page}
+        oldest = page[0]['seq'] if page else before
+        for data in _chat_archive_segments(room_id, oldest):
+            older = [m for m in _decode_chat_archive(data) if m['seq'] < oldest and m['seq'] not in seen]
+            seen.update(m['seq'] for m in older)
+            page = older + page
+            if len(page) > limit:
+                break
+    
+    has_more = len(page) > limit
+    page = page[-limit:]
+    return {
+        'messages': page,
+        'next_cursor': str(page[0]['seq']) if has_more else None,
+        'has_more': has_more,
+    }
+
+def prune_chat_room(room_id, now=None):
+    """보관 범위를 벗어난 메시지를 보관함으로 옮기고 로그를 새로 쓰기 (옮긴 개수)
+
+    옮길 메시지가 없어도 로그에 교체 기록 등이 많이 쌓였으면 새로 써서 정리한다.
+    """
+    now = time.time() if now is None else now
+    if STORAGE_BACKEND == 'sql':
+        return sql_prune_chat_room(room_id, now)
+    
+    path = _chat_log_path(room_id)
+    with chat_room_lock(room_id):
+        entry = _sync_chat_log(room_id)
+        if not os.path.exists(path):
+            return 0
+        with _store_lock:
+            messages = list(entry['messages'])
+            last_seq = entry['last_seq']
+            records = entry['records']
+        
+        cut = 0
+        while cut < len(messages) and _chat_message_expired(room_id, messages[cut], len(messages) - cut, now):
+            cut += 1
+        if not cut and records <= len(messages) * 2:
+            return 0
+        
+        # 보관함에 먼저 기록한 뒤 로그를 새로 씀 (중간에 실패해도 메시지를 잃지 않음)
+        if cut:
+            write_chat_archive(room_id, messages[:cut])
+        kept = messages[cut:]
+        _write_chat_log(path, kept)
+        st = os.stat(path)
+        with _store_lock:
+            _chat_log_cache[room_id] = {
+                'messages': kept, 'offset': st.st_size, 'ino': st.st_ino,
+                'records': len(kept), 'last_seq': last_seq
+            }
+    return cut
+
+def prune_chat_rooms():
+    """모든 채팅방의 보관 범위 정리 (옮긴 메시지 수)"""
+    if STORAGE_BACKEND == 'sql':
+        room_ids = sql_chat_room_ids()
+    elif os.path.isdir(CHAT_LOG_DIR):
+        room_ids = [unquote(name[:-len('.jsonl')]) for name in os.listdir(CHAT_LOG_DIR) if name.endswith('.jsonl')]
+    else:
+        room_ids = []
+    
+    now = time.time()
+    total = 0
+    for room_id in room_ids:
         try:
-            with open(CHAT_MESSAGES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+            total += prune_chat_room(room_id, now)
+        except Exception as e:
+            print(f"[채팅 보관] {room_id} 정리 실패: {e}")
+    if total:
+        print(f"[채팅 보관] {total}개 메시지를 보관함으로 옮김")
+    return total
+
+def _chat_pruner_loop():
+    """채팅방 보관 범위를 주기적으로 정리 (요청 처리 중에는 메시지를 지우지 않음)"""
+    while True:
+        time.sleep(CHAT_PRUNE_INTERVAL)
+        prune_chat_rooms()
+
+def _read_json_chat_messages():
+    """chat_messages.json과 채팅방 로그 파일에서 모든 메시지 읽기 (SQL 가져오기용)"""
+    messages = {}
+    if os.path.exists(CHAT_MESSAGES_FILE):
+        with open(CHAT_MESSAGES_FILE, 'r', encoding='utf-8') as f:
+            messages = json.load(f)
+    if os.path.isdir(CHAT_LOG_DIR):
+        for filename in os.listdir(CHAT_LOG_DIR):
+            if not filename.endswith('.jsonl'):
+                continue
+            room_id = unquote(filename[:-len('.jsonl')])
+            entry = _new_chat_log_entry()
+            with open(os.path.join(CHAT_LOG_DIR, filename), 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        _apply_chat_record(entry, json.loads(line))
+            messages[room_id] = entry['messages']
+    return messages
+
+def load_chat_messages():
+    """모든 채팅방 메시지 불러오기 (방 ID -> 메시지 목록, 관리 도구용)"""
+    if STORAGE_BACKEND == 'sql':
+        return store_load(CHAT_MESSAGES_FILE, dict)
+    
+    messages = {room_id: list(room_messages) for room_id, room_messages in store_load(CHAT_MESSAGES_FILE, dict).items()}
+    if os.path.isdir(CHAT_LOG_DIR):
+        for filename in os.listdir(CHAT_LOG_DIR):
+            if filename.endswith('.jsonl'):
+                room_id = unquote(filename[:-len('.jsonl')])
+                messages[room_id] = get_room_messages(room_id)
+    return messages
 
 def save_chat_messages(messages):
-    """채팅 메시지 저장하기"""
+    """모든 채팅방 메시지 저장하기 (방마다 로그를 새로 씀)"""
+    if STORAGE_BACKEND == 'sql':
+        return store_save(CHAT_MESSAGES_FILE, messages)
+    
     try:
-        with open(CHAT_MESSAGES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
+        os.makedirs(CHAT_LOG_DIR, exist_ok=True)
+        for room_id, room_messages in messages.items():
+            with chat_room_lock(room_id):
+                _write_chat_log(_chat_log_path(room_id), room_messages)
+                with _store_lock:
+                    _chat_log_cache.pop(room_id, None)
         return True
-    except:
+    except Exception as e:
+        print(f"[채팅 로그] 저장 실패: {e}")
         return False
 
 def load_user_read_status():
     """사용자별 읽음 상태 불러오기"""
-    if os.path.exists(USER_READ_STATUS_FILE):
-        try:
-            with open(USER_READ_STATUS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    return store_load(USER_READ_STATUS_FILE, dict)
 
 def save_user_read_status(read_status):
     """사용자별 읽음 상태 저장하기"""
-    try:
-        with open(USER_READ_STATUS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(read_status, f, ensure_ascii=False, indent=2)
-        return True
-    except:
-        return False
+    return store_save(USER_READ_STATUS_FILE, read_status)
 
-def update_user_read_status(student_id, room_id, last_message_id):
-    """사용자의 특정 채팅방 읽음 상태 업데이트"""
-    read_status = load_user_read_status()
-    
-    if student_id not in read_status:
-        read_status[student_id] = {}
+# 채팅방 읽음 상태
+# 채팅 화면은 방을 보는 동안 읽음 상태를 계속 보내므로, 읽음 위치를 메모리에 모아 두었다가
+# READ_STATUS_FLUSH_INTERVAL초마다 한 번에 저장한다. 순번(seq)이 더 큰 쪽만 남기므로
+# 늦게 도착한 요청이나 다른 워커가 저장한 값이 더 최신 읽음 위치를 되돌리지 않는다.
+READ_STATUS_FLUSH_INTERVAL = 2
+
+_read_status_lock = threading.Lock()
+_read_markers = {}  # 학번 -> {방 ID: 읽음 상태} (이 워커가 받은 최신 읽음 위치, 저장하고 나면 지움)
+_dirty_read_markers = set()  # 아직 저장하지 않은 (학번, 방 ID)
+
+def _newer_read_marker(current, marker):
+    """두 읽음 상태 중 순번이 더 큰 쪽 (순번을 모르는 예전 형식은 새 값으로 대체)"""
+    if isinstance(current, dict) and (current.get('last_seq') or 0) > (marker.get('last_seq') or 0):
+        return current
+    return marker
+
+def _drop_read_marker(student_id, room_id):
+    """메모리의 읽음 상태 하나 지우기 (빈 사용자 항목도 함께, _read_status_lock 안에서 호출)"""
+    rooms = _read_markers.get(student_id)
+    if rooms is None:
+        return
+    rooms.pop(room_id, None)
+    if not rooms:
+        del _read_markers[student_id]
+
+def update_user_read_status(student_id, room_id, last_message_id, last_seq=None):
+    """사용자의 특정 채팅방 읽음 상태 업데이트 (확정된 읽음 상태를 돌려줌, 저장은 나중에 모아서)
+
+    읽음 위치는 메시지 ID와 함께 순번(seq)으로 저장해 읽지 않은 메시지 수를
+    메시지 목록을 훑지 않고 계산할 수 있게 함
+    """
+    marker = {'last_message_id': last_message_id, 'last_seq': last_seq}
+    with _read_status_lock:
+        rooms = _read_markers.setdefault(student_id, {})
+        current = rooms.get(room_id)
+        if current is None:
+            # 메모리에 없으면 (이미 저장했거나 처음이면) 저장된 읽음 위치와 비교해 더 낮은 순번으로 되돌리지 않음
+            # (저장을 마친 값만 메모리에서 지우므로 잠금 안에서 읽으면 방금 저장한 값도 보임)
+            current = _saved_read_markers(student_id).get(room_id)
+        merged = _newer_read_marker(current, marker)
+        if merged is marker:
+            rooms[room_id] = marker
+            _dirty_read_markers.add((student_id, room_id))
+        elif not rooms:
+            del _read_markers[student_id]
+    start_background_thread('read-status-writer', _read_status_writer_loop)
+    return merged
+
+def flush_read_markers():
+    """모아 둔 읽음 상태를 한 번에 저장 (저장된 값보다 순번이 큰 것만 반영)"""
+    with _read_status_lock:
+        pending = {(sid, room_id): _read_markers[sid][room_id] for sid, room_id in _dirty_read_markers}
+        _dirty_read_markers.clear()
+    if not pending:
+        return True
     
-    read_status[student_id][room_id] = last_message_id
-    return save_user_read_status(read_status)
+    with data_transaction(USER_READ_STATUS_FILE):
+        read_status = load_user_read_status()
+        for (student_id, room_id), marker in pending.items():
+            rooms = read_status.setdefault(student_id, {})
+            rooms[room_id] = _newer_read_marker(rooms.get(room_id), marker)
+        ok = save_user_read_status(read_status)
+    
+    with _read_status_lock:
+        if not ok:
+            # 저장에 실패하면 다음 주기에 다시 저장
+            _dirty_read_markers.update(pending)
+            return ok
+        # 저장한 뒤 새로 바뀌지 않은 값은 저장된 값과 같으므로 메모리에서 지움
+        for (student_id, room_id), marker in pending.items():
+            current = _read_markers.get(student_id, {}).get(room_id)
+            if current is marker and (student_id, room_id) not in _dirty_read_markers:
+                _drop_read_marker(student_id, room_id)
+    return ok
+
+def _read_status_writer_loop():
+    """백그라운드 읽음 상태 저장 스레드"""
+    while True:
+        time.sleep(READ_STATUS_FLUSH_INTERVAL)
+        try:
+            flush_read_markers()
+        except Exception as e:
+            print(f"[읽음 상태] 저장 실패: {e}")
+
+# 프로세스 종료 시 남은 읽음 상태 저장 (store_flush보다 먼저 실행됨)
+atexit.register(flush_read_markers)
+
+def _read_marker_seq(marker, room_id):
+    """읽음 상태 값 -> 마지막으로 읽은 메시지 순번
+
+    예전 형식(메시지 ID 문자열)은 보관 중인 메시지에서 순번을 찾고, 찾지 못하면 0
+    """
+    if not marker:
+        return 0
+    if isinstance(marker, dict):
+        if marker.get('last_seq') is not None:
+            return marker['last_seq']
+        marker = marker.get('last_message_id')
+    for message in get_room_messages(room_id):
+        if message.get('id') == marker:
+            return message.get('seq', 0)
+    return 0
+
+def _saved_read_markers(student_id):
+    """저장된 사용자의 채팅방별 읽음 상태 (아직 저장하지 않은 값 제외)"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_user_read_markers(student_id)
+    return dict(load_user_read_status().get(student_id, {}))
+
+def load_user_read_markers(student_id):
+    """사용자의 채팅방별 읽음 상태 (방 ID -> 읽음 상태 값, 아직 저장하지 않은 값 포함)"""
+    markers = _saved_read_markers(student_id)
+    with _read_status_lock:
+        for room_id, marker in _read_markers.get(student_id, {}).items():
+            markers[room_id] = _newer_read_marker(markers.get(room_id), marker)
+    return markers
+
+def _unread_count_from_marker(marker, room_id, state=None):
+    """마지막 메시지 순번 - 마지막으로 읽은 순번 (보관 중인 메시지 수를 넘지 않음)
+
+    state로 이미 조회한 room_message_state 결과를 넘기면 다시 조회하지 않는다.
+    """
+    last_seq, retained = state or room_message_state(room_id)
+    if not retained:
+        return 0
+    return min(max(0, last_seq - _read_marker_seq(marker, room_id)), retained)
 
 def get_unread_message_count(student_id, room_id):
     """사용자의 특정 채팅방 읽지 않은 메시지 수 계산"""
-    # 채팅방의 모든 메시지 로드
-    all_messages = load_chat_messages()
-    room_messages = all_messages.get(room_id, [])
-    
-    print(f"[읽지 않은 메시지 계산] 방 ID: {room_id}, 총 메시지: {len(room_messages)}개")
-    
-    if not room_messages:
-        return 0
-    
-    # 사용자의 읽음 상태 로드
-    read_status = load_user_read_status()
-    user_read_status = read_status.get(student_id, {})
-    last_read_message_id = user_read_status.get(room_id)
-    
-    print(f"[읽지 않은 메시지 계산] 사용자: {student_id}, 마지막 읽은 메시지 ID: {last_read_message_id}")
-    
-    if not last_read_message_id:
-        # 읽은 메시지가 없으면 모든 메시지가 읽지 않은 상태
-        print(f"[읽지 않은 메시지 계산] 읽은 메시지가 없음, 전체 메시지 수 반환: {len(room_messages)}")
-        return len(room_messages)
-    
-    # 마지막 읽은 메시지 이후의 메시지 수 계산
-    unread_count = 0
-    found_last_read = False
-    
-    for message in room_messages:
-        if message.get('id') == last_read_message_id:
-            found_last_read = True
-            continue
-        
-        if found_last_read:
-            unread_count += 1
-    
-    # 마지막 읽은 메시지를 찾지 못한 경우 모든 메시지가 읽지 않은 상태
-    if not found_last_read:
-        print(f"[읽지 않은 메시지 계산] 마지막 읽은 메시지를 찾지 못함, 전체 메시지 수 반환: {len(room_messages)}")
-        return len(room_messages)
-    
-    print(f"[읽지 않은 메시지 계산] 읽지 않은 메시지 수: {unread_count}개")
-    return unread_count
+    return _unread_count_from_marker(load_user_read_markers(student_id).get(room_id), room_id)
 
 def load_matching_queue():
     """매칭 대기열 로드"""
-    try:
-        with open('matching_queue.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {'waiting': [], 'matched': []}
-    except Exception as e:
-        print(f"매칭 대기열 로드 실패: {e}")
-        return {'waiting': [], 'matched': []}
+    return store_load(MATCHING_QUEUE_FILE, lambda: {'waiting': [], 'matched': []})
 
 def save_matching_queue(data):
     """매칭 대기열 저장"""
-    try:
-        with open('matching_queue.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"매칭 대기열 저장 실패: {e}")
-        return False
+    return store_save(MATCHING_QUEUE_FILE, data)
 
 def load_chat_rooms():
     """채팅방 정보 로드"""
-    try:
-        with open('chat_rooms.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except Exception as e:
-        print(f"채팅방 정보 로드 실패: {e}")
-        return {}
+    return store_load(CHAT_ROOMS_FILE, dict)
 
-def save_chat_rooms(rooms):
-    """채팅방 정보 저장"""
-    try:
-        with open('chat_rooms.json', 'w', encoding='utf-8') as f:
-            json.dump(rooms, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"채팅방 정보 저장 실패: {e}")
+def save_chat_rooms(rooms, changed=None, removed=()):
+    """채팅방 정보 저장
+
+    changed(참여자나 활성 여부가 바뀌었을 수 있는 방 ID 목록)와 removed(삭제된 방 ID 목록)를 넘기면
+    참여자 인덱스도 그 방만 갱신한다. changed=None이면 다음 조회 때 인덱스를 새로 만든다.
+    """
+    before = store_version(CHAT_ROOMS_FILE)
+    if not store_save(CHAT_ROOMS_FILE, rooms):
         return False
+    update_membership_index(CHAT_ROOMS_FILE, before, rooms, changed, removed)
+    start_background_thread('room-archiver', _room_archiver_loop)
+    return True
 
 def load_group_matching():
     """그룹 매칭 대기열 불러오기"""
-    if os.path.exists(GROUP_MATCHING_FILE):
-        try:
-            with open(GROUP_MATCHING_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"[그룹 매칭 로드 실패] 오류: {e}")
-            return {'male': [], 'female': [], 'groups': []}
-    return {'male': [], 'female': [], 'groups': []}
+    return store_load(GROUP_MATCHING_FILE, lambda: {'male': [], 'female': [], 'groups': []})
 
 def save_group_matching(data):
     """그룹 매칭 대기열 저장하기"""
-    try:
-        with open(GROUP_MATCHING_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"[그룹 매칭 저장 실패] 오류: {e}")
-        return False
+    return store_save(GROUP_MATCHING_FILE, data)
 
 def load_group_rooms():
     """그룹 채팅방 정보 불러오기"""
-    if os.path.exists(GROUP_ROOMS_FILE):
+    return store_load(GROUP_ROOMS_FILE, dict)
+
+def save_group_rooms(rooms, changed=None, removed=()):
+    """그룹 채팅방 정보 저장하기 (changed/removed는 save_chat_rooms와 같음)"""
+    before = store_version(GROUP_ROOMS_FILE)
+    if not store_save(GROUP_ROOMS_FILE, rooms):
+        return False
+    update_membership_index(GROUP_ROOMS_FILE, before, rooms, changed, removed)
+    start_background_thread('room-archiver', _room_archiver_loop)
+    return True
+
+# 채팅방 참여자 인덱스
+# 학번 -> 참여 중인 방, 방 -> 참여자 집합을 메모리에 두고, 방이 만들어지거나 비활성화될 때
+# (try_matching, try_group_matching, leave_room) 그 방만 반영한다. 비활성화된 방은 색인하지 않는다.
+ROOM_FILE_TYPES = {CHAT_ROOMS_FILE: 'dm', GROUP_ROOMS_FILE: 'group'}
+
+_membership_lock = threading.Lock()
+_membership_index = {'built': False, 'versions': {}, 'rooms_by_member': {}, 'members': {}}  # rooms_by_member: 학번 -> {방 ID: 방 종류}, members: 방 ID -> 참여자 학번 집합
+
+def _membership_remove(room_id):
+    """인덱스에서 방 제거 (_membership_lock 안에서 호출)"""
+    for student_id in _membership_index['members'].pop(room_id, ()):
+        rooms = _membership_index['rooms_by_member'].get(student_id)
+        if rooms is not None:
+            rooms.pop(room_id, None)
+            if not rooms:
+                del _membership_index['rooms_by_member'][student_id]
+
+def _membership_add(room_type, room_id, room):
+    """인덱스에 방 추가 또는 갱신 (_membership_lock 안에서 호출)"""
+    _membership_remove(room_id)
+    if room.get('active', True) == False:
+        return
+    members = set(_room_member_ids(room))
+    _membership_index['members'][room_id] = members
+    for student_id in members:
+        _membership_index['rooms_by_member'].setdefault(student_id, {})[room_id] = room_type
+
+def _room_file_data(path):
+    """방 파일 경로 -> 방 정보 (방 ID -> 방)"""
+    return load_chat_rooms() if path == CHAT_ROOMS_FILE else load_group_rooms()
+
+def _ensure_membership_index():
+    """인덱스가 없거나 방 파일이 인덱스 밖에서 바뀌었으면 새로 만들기 (_membership_lock 안에서 호출)"""
+    for path in ROOM_FILE_TYPES:
+        _room_file_data(path)  # 다른 워커나 외부 도구가 파일을 바꿨으면 여기서 다시 읽힘
+    versions = {path: store_version(path) for path in ROOM_FILE_TYPES}
+    if _membership_index['built'] and _membership_index['versions'] == versions:
+        return
+    
+    _membership_index['rooms_by_member'] = {}
+    _membership_index['members'] = {}
+    for path, room_type in ROOM_FILE_TYPES.items():
+        for room_id, room in _room_file_data(path).items():
+            _membership_add(room_type, room_id, room)
+    _membership_index['built'] = True
+    _membership_index['versions'] = versions
+
+def update_membership_index(path, before_version, rooms, changed=None, removed=()):
+    """방 정보 저장 후 인덱스 갱신 (save_chat_rooms/save_group_rooms에서 호출)"""
+    with _membership_lock:
+        if not _membership_index['built']:
+            return
+        if changed is None or _membership_index['versions'].get(path) != before_version:
+            # 무엇이 바뀌었는지 모르면 다음 조회 때 새로 만듦
+            _membership_index['built'] = False
+            return
+        for room_id in removed:
+            _membership_remove(room_id)
+        for room_id in changed:
+            if room_id in rooms:
+                _membership_add(ROOM_FILE_TYPES[path], room_id, rooms[room_id])
+            else:
+                _membership_remove(room_id)
+        _membership_index['versions'][path] = store_version(path)
+
+def list_user_rooms(student_id):
+    """사용자가 참여 중인 활성 채팅방 목록 ((방 종류, 방 ID, 방 정보) 목록, 1:1 방 먼저)
+
+    전체 방 수가 아니라 사용자가 참여 중인 방 수에 비례하는 비용이 든다.
+    """
+    if STORAGE_BACKEND == 'sql':
+        return sql_user_rooms(student_id)
+    with _membership_lock:
+        _ensure_membership_index()
+        user_rooms = list(_membership_index['rooms_by_member'].get(student_id, {}).items())
+    
+    rooms_by_type = {'dm': load_chat_rooms(), 'group': load_group_rooms()}
+    result = []
+    for room_id, room_type in sorted(user_rooms, key=lambda item: item[1] != 'dm'):
+        room = rooms_by_type[room_type].get(room_id)
+        if room is not None:
+            result.append((room_type, room_id, room))
+    return result
+
+def is_room_member(room_id, student_id):
+    """사용자가 활성 채팅방의 참여자인지 확인"""
+    if STORAGE_BACKEND == 'sql':
+        return sql_is_room_member(room_id, student_id)
+    with _membership_lock:
+        _ensure_membership_index()
+        return student_id in _membership_index['members'].get(room_id, ())
+
+# 비활성 채팅방 보관
+# 나간 지 ROOM_ARCHIVE_GRACE초가 지난 방과 ROOM_IDLE_TTL초 동안 활동이 없는 방을 백그라운드에서
+# 방 파일에서 빼내 room_archive/<방 ID>.json.gz(SQL 저장소는 room_archives 테이블)로 옮긴다.
+# 메시지는 채팅 보관함(chat_archive)으로 옮기므로 보관한 방도 before=<순번>으로 이어서 조회할 수 있다.
+ROOM_ARCHIVE_DIR = 'room_archive'
+ROOM_ARCHIVE_GRACE = float(os.environ.get('ROOM_ARCHIVE_GRACE_HOURS', '1')) * 3600
+ROOM_IDLE_TTL = float(os.environ.get('ROOM_IDLE_DAYS', '30')) * 86400  # 0이면 활동이 없어도 보관하지 않음
+ROOM_ARCHIVE_INTERVAL = 600  # 보관 작업 주기 (초)
+ROOM_ARCHIVE_BATCH = 100  # 한 번에 보관하는 최대 방 수 (방 파일 잠금을 오래 잡지 않도록)
+
+def _room_archive_path(room_id):
+    """보관한 채팅방 기록 파일 경로"""
+    return os.path.join(ROOM_ARCHIVE_DIR, quote(room_id, safe='') + '.json.gz')
+
+def _room_last_activity(room_id, room):
+    """채팅방의 마지막 활동 시각 (생성/입장/마지막 메시지 중 가장 늦은 것)"""
+    times = [room.get(key) for key in ('created_at', 'user1_entered_at', 'user2_entered_at')]
+    latest = get_room_messages_page(room_id, limit=1)['messages']
+    if latest:
+        times.append(latest[-1].get('timestamp'))
+    return max((t for t in times if isinstance(t, (int, float))), default=0)
+
+def _room_archivable(room_id, room, now):
+    """보관함으로 옮길 방인지 (나간 뒤 유예 시간이 지났거나 오래 활동이 없는 방)"""
+    if room.get('active', True) == False:
+        return (room.get('left_at') or 0) < now - ROOM_ARCHIVE_GRACE
+    if not ROOM_IDLE_TTL or (room.get('created_at') or 0) >= now - ROOM_IDLE_TTL:
+        return False
+    return _room_last_activity(room_id, room) < now - ROOM_IDLE_TTL
+
+def _archive_room(room_type, room_id, room, now):
+    """채팅방 하나를 보관함으로 옮기기 (메시지 -> 채팅 보관함, 방 정보 -> 방 보관함)"""
+    with chat_room_lock(room_id):
+        messages = get_room_messages(room_id)
+        last_seq, _ = room_message_state(room_id)
+        if messages:
+            write_chat_archive(room_id, messages)
+        
+        record = {'room_id': room_id, 'room_type': room_type, 'room': room, 'archived_at': now, 'last_seq': last_seq}
+        data = gzip.compress(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+        if STORAGE_BACKEND == 'sql':
+            sql_write_room_archive(record, data)
+            sql_delete(CHAT_MESSAGES_FILE, room_id=room_id)
+        else:
+            _write_compressed_file(_room_archive_path(room_id), data)
+            try:
+                os.remove(_chat_log_path(room_id))
+            except FileNotFoundError:
+                pass
+            with _store_lock:
+                _chat_log_cache.pop(room_id, None)
+
+def _forget_archived_rooms(room_ids):
+    """보관한 방의 읽음 상태와 예전 chat_messages.json 메시지 지우기"""
+    with _read_status_lock:
+        for student_id in list(_read_markers):
+            for room_id in room_ids:
+                _drop_read_marker(student_id, room_id)
+        _dirty_read_markers.difference_update(key for key in list(_dirty_read_markers) if key[1] in room_ids)
+    
+    with data_transaction(USER_READ_STATUS_FILE):
+        read_status = load_user_read_status()
+        touched = False
+        for markers in read_status.values():
+            for room_id in room_ids & markers.keys():
+                del markers[room_id]
+                touched = True
+        if touched:
+            save_user_read_status(read_status)
+    
+    if STORAGE_BACKEND != 'sql':
+        # 로그를 지운 방이 예전 파일에서 다시 옮겨지지 않도록
+        with data_transaction(CHAT_MESSAGES_FILE):
+            legacy_messages = store_load(CHAT_MESSAGES_FILE, dict)
+            if room_ids & legacy_messages.keys():
+                store_save(CHAT_MESSAGES_FILE, {
+                    room_id: messages for room_id, messages in legacy_messages.items() if room_id not in room_ids
+                })
+
+def archive_inactive_rooms(now=None):
+    """보관 대상 채팅방을 방 파일에서 빼내 보관함으로 옮기기 (옮긴 방 수)"""
+    now = time.time() if now is None else now
+    archived = set()
+    with data_transaction(CHAT_ROOMS_FILE, GROUP_ROOMS_FILE):
+        for path, room_type in ROOM_FILE_TYPES.items():
+            rooms = _room_file_data(path)
+            targets = []
+            for room_id, room in rooms.items():
+                if len(archived) + len(targets) >= ROOM_ARCHIVE_BATCH:
+                    break
+                if _room_archivable(room_id, room, now):
+                    targets.append(room_id)
+            if not targets:
+                continue
+            
+            # 보관함에 먼저 기록한 뒤 방 파일에서 제거 (중간에 실패해도 방을 잃지 않음)
+            for room_id in targets:
+                _archive_room(room_type, room_id, rooms[room_id], now)
+            remaining = {room_id: room for room_id, room in rooms.items() if room_id not in set(targets)}
+            save_rooms = save_chat_rooms if path == CHAT_ROOMS_FILE else save_group_rooms
+            if not save_rooms(remaining, changed=[], removed=targets):
+                break
+            archived.update(targets)
+    
+    if archived:
+        _forget_archived_rooms(archived)
+        print(f"[채팅방 보관] 비활성 채팅방 {len(archived)}개를 보관함으로 옮김")
+    return len(archived)
+
+def find_archived_room(room_id):
+    """보관한 채팅방 기록 ({'room_id', 'room_type', 'room', 'archived_at', 'last_seq'}, 없으면 None)"""
+    if STORAGE_BACKEND == 'sql':
+        data = sql_find_room_archive(room_id)
+    else:
+        try:
+            with open(_room_archive_path(room_id), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+    return json.loads(gzip.decompress(data)) if data else None
+
+def _room_archiver_loop():
+    """비활성 채팅방을 주기적으로 보관함으로 옮김"""
+    while True:
+        time.sleep(ROOM_ARCHIVE_INTERVAL)
         try:
-            with open(GROUP_ROOMS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            archive_inactive_rooms()
         except Exception as e:
-            print(f"[그룹 채팅방 로드 실패] 오류: {e}")
-            return {}
-    return {}
+            print(f"[채팅방 보관] 보관 실패: {e}")
 
-def save_group_rooms(rooms):
-    """그룹 채팅방 정보 저장하기"""
-    try:
-        with open(GROUP_ROOMS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(rooms, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"[그룹 채팅방 저장 실패] 오류: {e}")
-        return False
+# 실시간 이벤트 (Server-Sent Events)
+# 사용자별 구독 큐에 이벤트를 넣어 /api/events 스트림으로 보낸다.
+# REDIS_URL을 설정하면 Redis pub/sub으로 다른 워커의 구독자에게도 전달한다.
+REDIS_URL = os.environ.get('REDIS_URL')
+EVENT_CHANNEL = 'khub-events'
+EVENT_HEARTBEAT_INTERVAL = 15  # 연결 유지용 주석 전송 간격 (초)
+EVENT_QUEUE_SIZE = 100  # 구독자별 최대 대기 이벤트 수 (넘으면 오래된 클라이언트로 보고 버림)
 
-def try_matching(matching_data):
-    """매칭 시도 (이성 매칭)"""
-    waiting_list = matching_data.get('waiting', [])
-    
-    if len(waiting_list) < 2:
+_event_subscribers = {}  # 학번 -> 구독 큐 목록
+_event_lock = threading.Lock()
+_redis_state = {'client': None}
+
+def _redis_client():
+    """Redis 클라이언트 (REDIS_URL이 없거나 redis 패키지가 없으면 None)"""
+    if not REDIS_URL or redis is None:
         return None
+    if _redis_state['client'] is None:
+        _redis_state['client'] = redis.Redis.from_url(REDIS_URL)
+    return _redis_state['client']
+
+def subscribe_events(student_id):
+    """사용자 이벤트 구독 (구독 큐 반환)"""
+    q = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+    with _event_lock:
+        _event_subscribers.setdefault(student_id, []).append(q)
+    if _redis_client() is not None:
+        start_background_thread('event-redis-listener', _redis_event_loop)
+    return q
+
+def unsubscribe_events(student_id, q):
+    """사용자 이벤트 구독 해제"""
+    with _event_lock:
+        queues = _event_subscribers.get(student_id, [])
+        if q in queues:
+            queues.remove(q)
+        if not queues:
+            _event_subscribers.pop(student_id, None)
+
+def _deliver_event(student_ids, event, data):
+    """이 프로세스의 구독자에게 이벤트 전달"""
+    with _event_lock:
+        targets = [q for sid in student_ids for q in _event_subscribers.get(sid, [])]
+    for q in targets:
+        try:
+            q.put_nowait((event, data))
+        except queue.Full:
+            pass
+
+def publish_event(student_ids, event, data):
+    """사용자들에게 이벤트 발행"""
+    student_ids = [sid for sid in dict.fromkeys(student_ids) if sid]
+    if not student_ids:
+        return
+    
+    client = _redis_client()
+    if client is not None:
+        try:
+            client.publish(EVENT_CHANNEL, json.dumps(
+                {'student_ids': student_ids, 'event': event, 'data': data}, ensure_ascii=False
+            ))
+            return
+        except Exception as e:
+            print(f"[이벤트] Redis 발행 실패, 현재 워커에만 전달: {e}")
+    _deliver_event(student_ids, event, data)
+
+def _redis_event_loop():
+    """Redis 채널의 이벤트를 이 프로세스 구독자에게 전달"""
+    while True:
+        try:
+            pubsub = _redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(EVENT_CHANNEL)
+            for item in pubsub.listen():
+                payload = json.loads(item['data'])
+                _deliver_event(payload['student_ids'], payload['event'], payload['data'])
+        except Exception as e:
+            print(f"[이벤트] Redis 구독 오류: {e}")
+            time.sleep(1)
+
+def room_member_ids(room_id):
+    """채팅방 참여자 학번 목록 (1:1 방 또는 그룹 방, 그 외 방은 빈 목록)"""
+    room = load_chat_rooms().get(room_id) or load_group_rooms().get(room_id)
+    return _room_member_ids(room) if room else []
+
+def publish_room_message(room_id, message):
+    """채팅방 새 메시지와 참여자별 읽지 않은 메시지 수 발행"""
+    member_ids = room_member_ids(room_id)
+    publish_event(member_ids, 'message', {'room_id': room_id, 'message': message})
+    for student_id in member_ids:
+        publish_event([student_id], 'unread', {
+            'room_id': room_id,
+            'unread_count': get_unread_message_count(student_id, room_id)
+        })
+
+# 1:1 매칭 엔진
+# 대기자 학번 -> 대기 정보와 성별별 FIFO 대기열(deque)을 메모리에 두고, 매칭 대기열 데이터가
+# 엔진 밖에서 바뀌었을 때(다른 워커, 외부 도구)만 새로 만든다.
+# 취소는 대기자 목록에서만 지우고, 대기열 앞쪽에 남은 취소된 항목은 꺼낼 때 건너뛴다.
+# 관심사 매칭(mode='interest') 대기자는 별도 대기열에 두고, 관심사 -> 대기자 역색인으로
+# 관심사가 하나라도 겹치는 이성 중 자카드 유사도가 가장 높은 사람과 짝을 짓는다.
+MATCHING_MODES = ('random', 'interest')
+
+_matching_lock = threading.RLock()
+_matching_engine = {
+    'version': None,
+    'waiting': {},      # 학번 -> 대기 정보
+    'queues': {},       # 대기열 키(성별, 관심사 매칭은 ('interest', 성별)) -> deque[(대기 순번, 학번)]
+    'tickets': {},      # 학번 -> 대기 순번
+    'by_interest': {},  # 관심사 -> 관심사 매칭 대기자 학번 집합
+    'pending': deque(), # 아직 짝을 찾아보지 않은 관심사 매칭 대기자
+}
+_matching_tickets = itertools.count(1)
+
+def _matching_queue_key(waiting_user):
+    """대기 정보가 들어갈 대기열 키"""
+    if waiting_user.get('mode') == 'interest':
+        return ('interest', waiting_user.get('gender'))
+    return waiting_user.get('gender')
+
+def _matching_push(waiting_user):
+    """엔진 대기열 맨 뒤에 추가 (_matching_lock 안에서 호출)"""
+    student_id = waiting_user['student_id']
+    ticket = next(_matching_tickets)
+    _matching_engine['waiting'][student_id] = waiting_user
+    _matching_engine['tickets'][student_id] = ticket
+    _matching_engine['queues'].setdefault(_matching_queue_key(waiting_user), deque()).append((ticket, student_id))
+    if waiting_user.get('mode') == 'interest':
+        for interest in waiting_user.get('interests', []):
+            _matching_engine['by_interest'].setdefault(interest, set()).add(student_id)
+        _matching_engine['pending'].append(student_id)
+
+def _matching_discard(student_id):
+    """엔진 대기열에서 제거 (_matching_lock 안에서 호출) - 대기 중이 아니었으면 None"""
+    _matching_engine['tickets'].pop(student_id, None)
+    waiting_user = _matching_engine['waiting'].pop(student_id, None)
+    if waiting_user is not None and waiting_user.get('mode') == 'interest':
+        for interest in waiting_user.get('interests', []):
+            members = _matching_engine['by_interest'].get(interest)
+            if members is not None:
+                members.discard(student_id)
+                if not members:
+                    del _matching_engine['by_interest'][interest]
+    return waiting_user
+
+def _interest_match_candidate(student_id):
+    """관심사 매칭 대기자와 가장 잘 맞는 이성 대기자 (학번, 자카드 유사도) - 겹치는 관심사가 없으면 None
+
+    역색인으로 관심사가 겹치는 대기자만 모아 세므로 전체 대기자를 훑지 않는다.
+    유사도가 같으면 먼저 기다린 사람.
+    """
+    waiting_user = _matching_engine['waiting'][student_id]
+    interests = set(waiting_user.get('interests', []))
+    overlaps = Counter()
+    for interest in interests:
+        overlaps.update(_matching_engine['by_interest'].get(interest, ()))
+    
+    best = None
+    for other_id, overlap in overlaps.items():
+        other = _matching_engine['waiting'][other_id]
+        if other_id == student_id or other.get('gender') == waiting_user.get('gender'):
+            continue
+        similarity = overlap / len(interests | set(other.get('interests', [])))
+        key = (similarity, -_matching_engine['tickets'][other_id])
+        if best is None or key > best[0]:
+            best = (key, other_id)
+    return (best[1], best[0][0]) if best else None
+
+def _matching_head(gender):
+    """성별 대기열의 가장 오래된 대기자 (ticket, 학번) - 취소된 항목은 버림"""
+    waiting_queue = _matching_engine['queues'].get(gender)
+    while waiting_queue:
+        ticket, student_id = waiting_queue[0]
+        if _matching_engine['tickets'].get(student_id) == ticket:
+            return waiting_queue[0]
+        waiting_queue.popleft()
+    return None
+
+def _ensure_matching_engine(matching_data):
+    """엔진이 없거나 매칭 대기열이 엔진 밖에서 바뀌었으면 새로 만들기 (_matching_lock 안에서 호출)
+
+    SQL 저장소는 불러온 뒤에 다른 워커가 바꿨을 수 있으므로 매번 불러온 데이터로 만든다.
+    """
+    version = store_version(MATCHING_QUEUE_FILE)
+    if STORAGE_BACKEND != 'sql' and version is not None and _matching_engine['version'] == version:
+        return
+    _matching_engine.update({'waiting': {}, 'queues': {}, 'tickets': {}, 'by_interest': {}, 'pending': deque()})
+    for waiting_user in matching_data.get('waiting', []):
+        _matching_push(waiting_user)
+    _matching_engine['version'] = version
+
+def _save_matching_engine(matching_data):
+    """엔진의 대기자 목록을 매칭 대기열 데이터에 반영해 저장 (_matching_lock 안에서 호출)"""
+    matching_data['waiting'] = list(_matching_engine['waiting'].values())
+    if not save_matching_queue(matching_data):
+        _matching_engine['version'] = None
+        return False
+    _matching_engine['version'] = store_version(MATCHING_QUEUE_FILE)
+    return True
+
+def _expire_matching_waiters(cutoff):
+    """대기 시작 시각이 cutoff 이전인 대기자 제거 (_matching_lock 안에서 호출) - 제거된 대기 정보 목록
+
+    성별 대기열은 들어온 순서이므로 맨 앞에서부터 오래된 사람만 꺼내면 된다.
+    """
+    expired = []
+    for gender in list(_matching_engine['queues']):
+        while True:
+            head = _matching_head(gender)
+            if head is None or _matching_engine['waiting'][head[1]].get('joined_at', 0) >= cutoff:
+                break
+            expired.append(_matching_discard(head[1]))
+    return expired
+
+def find_matching_waiter(student_id):
+    """1:1 매칭 대기 중인 사용자의 대기 정보 (없으면 None)"""
+    with _matching_lock:
+        _ensure_matching_engine(load_matching_queue())
+        return _matching_engine['waiting'].get(student_id)
+
+def enqueue_matching(waiting_user):
+    """1:1 매칭 대기열에 추가 (MATCHING_QUEUE_FILE 잠금 안에서 호출) - 이미 대기 중이면 False"""
+    with _matching_lock:
+        matching_data = load_matching_queue()
+        _ensure_matching_engine(matching_data)
+        if waiting_user['student_id'] in _matching_engine['waiting']:
+            return False
+        _matching_push(waiting_user)
+        return _save_matching_engine(matching_data)
+
+def cancel_matching_wait(student_id):
+    """1:1 매칭 대기열에서 제거 (MATCHING_QUEUE_FILE 잠금 안에서 호출) - 대기 중이 아니었으면 False"""
+    with _matching_lock:
+        matching_data = load_matching_queue()
+        _ensure_matching_engine(matching_data)
+        if _matching_discard(student_id) is None:
+            return False
+        return _save_matching_engine(matching_data)
+
+def expire_matching_waiters(cutoff):
+    """오래 기다린 1:1 매칭 대기자 제거 (MATCHING_QUEUE_FILE 잠금 안에서 호출) - 제거된 대기 정보 목록"""
+    with _matching_lock:
+        matching_data = load_matching_queue()
+        _ensure_matching_engine(matching_data)
+        expired = _expire_matching_waiters(cutoff)
+        if expired:
+            _save_matching_engine(matching_data)
+    return expired
+
+def new_room_id(prefix):
+    """새 채팅방 ID (prefix_고유번호) - 방 종류 구분에 prefix를 쓰므로 'dm'/'group'을 그대로 붙임"""
+    return f"{prefix}_{new_id()}"
+
+def _create_dm_room(rooms_data, user1, user2):
+    """매칭된 두 사람의 1:1 채팅방 만들기"""
+    room_id = new_room_id('dm')
     
-    # 이성 매칭 시도
-    for i, user1 in enumerate(waiting_list):
-        for j, user2 in enumerate(waiting_list[i+1:], i+1):
-            if user1.get('gender') != user2.get('gender'):
-                # 매칭 성공
-                room_id = f"dm_{int(time.time() * 1000)}"
-                
-                # 채팅방 생성
-                room_data = {
-                    'room_id': room_id,
-                    'user1_id': user1['student_id'],
-                    'user2_id': user2['student_id'],
-                    'user1_nickname': user1['nickname'],
-                    'user2_nickname': user2['nickname'],
-                    'created_at': time.time(),
-                    'user1_entered': False,
-                    'user2_entered': False,
-                    'user1_entered_at': None,
-                    'user2_entered_at': None,
-                    'active': True
-                }
-                
-                # 방 정보 저장
+    rooms_data[room_id] = {
+        'room_id': room_id,
+        'user1_id': user1['student_id'],
+        'user2_id': user2['student_id'],
+        'user1_nickname': user1['nickname'],
+        'user2_nickname': user2['nickname'],
+        'created_at': time.time(),
+        'user1_entered': False,
+        'user2_entered': False,
+        'user1_entered_at': None,
+        'user2_entered_at': None,
+        'active': True
+    }
+    return room_id
+
+def try_matching(matching_data):
+    """매칭 시도 (이성 매칭) - MATCHING_QUEUE_FILE, CHAT_ROOMS_FILE 잠금 안에서 호출
+
+    랜덤 매칭은 서로 다른 성별 대기열의 맨 앞 사람끼리 가장 오래 기다린 순서대로 짝을 짓고,
+    관심사 매칭은 새로 들어온 대기자마다 관심사가 가장 많이 겹치는 이성과 짝을 지어, 가능한 쌍을 모두 매칭한다.
+    매칭된 사람은 대기열에서 빠지고 채팅방과 대기열은 한 번에 저장하므로 같은 사람이 두 번 매칭되지 않는다.
+    매칭 결과 목록을 돌려준다.
+    """
+    matches = []
+    with _matching_lock:
+        _ensure_matching_engine(matching_data)
+        rooms_data = None
+        pairs = []
+        
+        while True:
+            heads = sorted(
+                h for h in map(_matching_head, [k for k in _matching_engine['queues'] if not isinstance(k, tuple)]) if h
+            )
+            if len(heads) < 2:
+                break
+            # 가장 오래 기다린 사람과, 다른 성별 중 가장 오래 기다린 사람
+            pairs.append((_matching_discard(heads[0][1]), _matching_discard(heads[1][1]), None))
+        
+        # 관심사 매칭 - 짝이 있었다면 둘 중 나중에 들어온 사람을 확인할 때 찾아지므로 새 대기자만 확인
+        pending = _matching_engine['pending']
+        while pending:
+            student_id = pending.popleft()
+            if student_id not in _matching_engine['waiting']:
+                continue
+            candidate = _interest_match_candidate(student_id)
+            if candidate is not None:
+                other_id, similarity = candidate
+                pairs.append((_matching_discard(other_id), _matching_discard(student_id), similarity))
+        
+        for user1, user2, similarity in pairs:
+            if rooms_data is None:
                 rooms_data = load_chat_rooms()
-                rooms_data[room_id] = room_data
-                save_chat_rooms(rooms_data)
-                
-                # 대기열에서 제거 (정확한 필터링)
-                matching_data['waiting'] = [
-                    w for w in waiting_list 
-                    if w.get('student_id') not in [user1['student_id'], user2['student_id']]
-                ]
-                save_matching_queue(matching_data)
-                
+            room_id = _create_dm_room(rooms_data, user1, user2)
+            matches.append({'room_id': room_id, 'user1': user1, 'user2': user2})
+            if similarity is None:
                 print(f"[매칭 성공] {user1['nickname']} ↔ {user2['nickname']} (방 ID: {room_id})")
-                
-                return {
-                    'room_id': room_id,
-                    'user1': user1,
-                    'user2': user2
-                }
+            else:
+                print(f"[관심사 매칭 성공] {user1['nickname']} ↔ {user2['nickname']} (유사도: {similarity:.2f}, 방 ID: {room_id})")
+        
+        if matches:
+            # 방 정보 저장 후 대기열에서 제거
+            save_chat_rooms(rooms_data, changed=[match['room_id'] for match in matches])
+            _save_matching_engine(matching_data)
+    
+    # 상태 확인 요청(롱폴링)과 이벤트 스트림에 매칭 알림
+    for match in matches:
+        publish_event(
+            [match['user1']['student_id'], match['user2']['student_id']],
+            'match', {'type': 'dm', 'room_id': match['room_id']}
+        )
+    return matches
+
+# 로그인 세션
+# 쿠키에는 세션 ID만 넣고 사용자 정보와 익명 프로필은 서버에 둔다.
+# 최근 세션은 메모리(LRU)에 두고, 모든 세션을 SQLite 파일(SESSION_DB)에도 기록해 다른 워커와 재시작 후에도 이어진다.
+SESSION_DB = os.environ.get('SESSION_DB', 'sessions.db')
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '10000'))  # 메모리에 두는 최대 세션 수
+SESSION_CACHE_TTL = 30  # 메모리 세션을 SQLite에서 다시 확인하는 주기 (초) - 다른 워커의 변경이 반영되는 최대 시간
+
+_session_lock = threading.Lock()
+_session_cache = OrderedDict()  # 세션 ID -> {'student_id', 'user', 'profile', 'profile_loaded', 'expires', 'checked_at'}
+_session_db_local = threading.local()
+
+def _session_db():
+    """스레드별 세션 DB 연결 (처음 연결할 때 테이블 생성)"""
+    conn = getattr(_session_db_local, 'conn', None)
+    if conn is None or _session_db_local.pid != os.getpid():
+        conn = sqlite3.connect(SESSION_DB, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'sid TEXT PRIMARY KEY, student_id TEXT NOT NULL, data TEXT NOT NULL, expires REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_student_id ON sessions (student_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires)')
+        _session_db_local.conn = conn
+        _session_db_local.pid = os.getpid()
+    return conn
+
+def _session_cache_put(sid, entry):
+    """메모리 세션 저장 (가장 오래 쓰지 않은 세션부터 밀어냄, _session_lock 안에서 호출)"""
+    _session_cache[sid] = entry
+    _session_cache.move_to_end(sid)
+    while len(_session_cache) > SESSION_CACHE_SIZE:
+        _session_cache.popitem(last=False)
+
+def _session_data(entry):
+    """세션 DB에 기록하는 값"""
+    return json.dumps(
+        {key: entry[key] for key in ('user', 'profile', 'profile_loaded')}, ensure_ascii=False
+    )
+
+def create_login_session(user_info):
+    """로그인 세션 만들기 - 서버에 사용자 정보를 두고 쿠키에는 세션 ID만 넣음"""
+    sid = secrets.token_urlsafe(32)
+    now = time.time()
+    entry = {
+        'student_id': user_info['student_id'], 'user': user_info, 'profile': None, 'profile_loaded': False,
+        'expires': now + app.config['PERMANENT_SESSION_LIFETIME'].total_seconds(), 'checked_at': now
+    }
+    conn = _session_db()
+    with conn:
+        conn.execute('DELETE FROM sessions WHERE expires < ?', (now,))
+        conn.execute(
+            'INSERT INTO sessions (sid, student_id, data, expires) VALUES (?, ?, ?, ?)',
+            (sid, entry['student_id'], _session_data(entry), entry['expires'])
+        )
+    with _session_lock:
+        _session_cache_put(sid, entry)
     
-    return None
+    session.clear()
+    session.permanent = True  # 브라우저를 닫아도 유지
+    session['sid'] = sid
+    return sid
+
+def _load_login_session(sid):
+    """세션 ID -> 세션 (메모리에 없거나 오래됐으면 세션 DB에서 읽음, 없거나 만료됐으면 None)"""
+    now = time.time()
+    with _session_lock:
+        entry = _session_cache.get(sid)
+        if entry is not None and entry['expires'] > now and now - entry['checked_at'] < SESSION_CACHE_TTL:
+            _session_cache.move_to_end(sid)
+            return entry
+    
+    row = _session_db().execute('SELECT student_id, data, expires FROM sessions WHERE sid = ?', (sid,)).fetchone()
+    if row is None or row[2] <= now:
+        with _session_lock:
+            _session_cache.pop(sid, None)
+        return None
+    entry = dict(json.loads(row[1]), student_id=row[0], expires=row[2], checked_at=now)
+    with _session_lock:
+        _session_cache_put(sid, entry)
+    return entry
+
+def _current_login_session():
+    """현재 요청의 세션 (요청마다 한 번만 확인)"""
+    if 'login_session' not in g:
+        sid = session.get('sid')
+        g.login_session = _load_login_session(sid) if sid else None
+    return g.login_session
+
+def get_session_user():
+    """현재 로그인한 사용자 정보 (로그인하지 않았으면 None)"""
+    entry = _current_login_session()
+    return entry['user'] if entry else None
+
+def get_session_profile():
+    """현재 로그인한 사용자의 익명 프로필 (세션에 캐시, 없으면 None)"""
+    entry = _current_login_session()
+    if entry is None:
+        return None
+    if not entry['profile_loaded']:
+        entry = dict(entry, profile=find_anon_profile(entry['student_id']), profile_loaded=True)
+        conn = _session_db()
+        with conn:
+            conn.execute('UPDATE sessions SET data = ? WHERE sid = ?', (_session_data(entry), session['sid']))
+        with _session_lock:
+            if session['sid'] in _session_cache:
+                _session_cache_put(session['sid'], entry)
+        g.login_session = entry
+    return entry['profile']
+
+def refresh_session_profiles(student_id):
+    """사용자의 모든 세션에서 캐시한 익명 프로필 비우기 (프로필을 바꾼 뒤 호출)"""
+    conn = _session_db()
+    with conn:
+        rows = conn.execute('SELECT sid, data FROM sessions WHERE student_id = ?', (student_id,)).fetchall()
+        for sid, data in rows:
+            data = dict(json.loads(data), profile=None, profile_loaded=False)
+            conn.execute('UPDATE sessions SET data = ? WHERE sid = ?', (json.dumps(data, ensure_ascii=False), sid))
+    with _session_lock:
+        for sid, _ in rows:
+            _session_cache.pop(sid, None)
+    g.pop('login_session', None)
+
+def end_user_sessions(student_id, keep=None):
+    """사용자의 세션 모두 끝내기 (keep에 준 세션 ID는 남김) - 비밀번호 변경, 회원 탈퇴 시"""
+    conn = _session_db()
+    with conn:
+        rows = conn.execute('SELECT sid FROM sessions WHERE student_id = ?', (student_id,)).fetchall()
+        conn.execute('DELETE FROM sessions WHERE student_id = ? AND sid != ?', (student_id, keep or ''))
+    with _session_lock:
+        for (sid,) in rows:
+            if sid != keep:
+                _session_cache.pop(sid, None)
+
+def end_login_session():
+    """현재 세션 끝내기 (로그아웃)"""
+    sid = session.get('sid')
+    if sid:
+        conn = _session_db()
+        with conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        with _session_lock:
+            _session_cache.pop(sid, None)
+    g.pop('login_session', None)
+    session.clear()
+
+def login_required(view=None, *, page=False):
+    """로그인한 사용자만 접근 (g.user에 사용자 정보를 넣어 줌)
+
+    로그인하지 않았으면 API는 401 응답, page=True인 화면은 로그인 페이지로 이동한다.
+    """
+    if view is None:
+        return lambda view: login_required(view, page=page)
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user = get_session_user()
+        if not user:
+            if page:
+                flash('로그인이 필요합니다.', 'error')
+                return redirect(url_for('login'))
+            return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
+        g.user = user
+        return view(*args, **kwargs)
+    return wrapper
 
 @app.route('/')
 def index():
@@ -339,7 +3663,7 @@ def index():
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     # 이미 로그인된 경우 홈으로 리다이렉트
-    if 'user' in session and session.get('user'):
+    if get_session_user():
         flash('이미 로그인되어 있습니다.', 'info')
         return redirect(url_for('index'))
     
@@ -373,29 +3697,33 @@ def register():
             print(f"[회원가입 실패] 잘못된 이메일 형식: {email}")
             return redirect(url_for('register'))
         
-        # 학번 중복 체크
-        if is_student_id_duplicate(student_id):
-            flash('이미 존재하는 학번입니다. 다른 학번으로 회원가입해주세요.', 'error')
-            print(f"[회원가입 실패] 중복된 학번: {student_id}")
-            return redirect(url_for('register'))
-        
-        # 사용자 정보 저장
-        users = load_users()
-        new_user = {
-            'name': name,
-            'student_id': student_id,
-            'birthday': birthday,
-            'gender': gender,
-            'status': status,
-            'email': email,
-            'password': password  # 실제로는 해시화해야 함
-        }
-        users.append(new_user)
+        # 비밀번호 해시 (시간이 걸리므로 사용자 파일 잠금 밖에서)
+        password_hash = hash_password(password)
         
-        if not save_users(users):
-            flash('회원가입 중 오류가 발생했습니다. 다시 시도해주세요.', 'error')
-            print("[회원가입 실패] 데이터 저장 오류")
-            return redirect(url_for('register'))
+        with data_transaction(DATA_FILE):
+            # 학번 중복 체크
+            if is_student_id_duplicate(student_id):
+                flash('이미 존재하는 학번입니다. 다른 학번으로 회원가입해주세요.', 'error')
+                print(f"[회원가입 실패] 중복된 학번: {student_id}")
+                return redirect(url_for('register'))
+            
+            # 사용자 정보 저장
+            users = load_users()
+            new_user = {
+                'name': name,
+                'student_id': student_id,
+                'birthday': birthday,
+                'gender': gender,
+                'status': status,
+                'email': email,
+                'password': password_hash
+            }
+            users.append(new_user)
+            
+            if not save_users(users, changed=[new_user]):
+                flash('회원가입 중 오류가 발생했습니다. 다시 시도해주세요.', 'error')
+                print("[회원가입 실패] 데이터 저장 오류")
+                return redirect(url_for('register'))
         
         # 회원가입 성공
         print(f"[회원가입 성공] 학번: {student_id}, 이름: {name}")
@@ -407,7 +3735,7 @@ def register():
 @app.route('/login', methods=['GET'])
 def login():
     # 이미 로그인된 경우 홈으로 리다이렉트
-    if 'user' in session and session.get('user'):
+    if get_session_user():
         flash('이미 로그인되어 있습니다.', 'info')
         return redirect(url_for('index'))
     return render_template('login.html')
@@ -419,12 +3747,15 @@ def login_post():
     
     if student_id and pw:
         # 등록된 사용자 확인
-        users = load_users()
-        user = next((u for u in users if u.get('student_id') == student_id), None)
+        user = find_user(student_id)
         
         if user:
-            # 비밀번호 확인 (실제로는 해시 비교해야 함)
-            if user.get('password') == pw:
+            # 비밀번호 확인 (예전 평문 비밀번호나 반복 횟수가 바뀐 해시는 새 해시로 바꿔 저장)
+            stored = user.get('password')
+            matched, new_hash = verify_password(stored, pw)
+            if matched and new_hash:
+                rehash_user_password(student_id, stored, new_hash)
+            if matched:
                 # 학번에서 학과 코드 추출 (5~6번째 자리)
                 # 학번 형식: YYYY(입학년도 4자리) + 학과코드(2자리) + 번호(3자리) = 9자리
                 if len(student_id) >= 6:
@@ -442,11 +3773,7 @@ def login_post():
                     
                     department = dept_mapping.get(dept_code, 'free')
                     
-                    # 세션을 영구적으로 설정 (브라우저를 닫아도 유지)
-                    session.permanent = True
-                    
-                    # 세션에 사용자 정보 저장
-                    session['user'] = {
+                    user_info = {
                         'name': user.get('name'),
                         'student_id': student_id,
                         'birthday': user.get('birthday'),
@@ -457,10 +3784,7 @@ def login_post():
                         'dept_code': dept_code
                     }
                 else:
-                    # 세션을 영구적으로 설정 (브라우저를 닫아도 유지)
-                    session.permanent = True
-                    
-                    session['user'] = {
+                    user_info = {
                         'name': user.get('name'),
                         'student_id': student_id,
                         'birthday': user.get('birthday'),
@@ -471,6 +3795,9 @@ def login_post():
                         'dept_code': 'unknown'
                     }
                 
+                # 서버 세션에 사용자 정보 저장 (쿠키에는 세션 ID만)
+                create_login_session(user_info)
+                
                 flash('로그인되었습니다!', 'success')
                 return redirect(url_for('mypage'))
             else:
@@ -485,40 +3812,30 @@ def login_post():
     return redirect(url_for('login'))
 
 @app.route('/mypage')
+@login_required(page=True)
 def mypage():
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        flash('로그인이 필요합니다.', 'error')
-        return redirect(url_for('login'))
-    
     # 현재 사용자의 익명 프로필 가져오기
-    current_user = session.get('user', {})
+    current_user = g.user
     student_id = current_user.get('student_id')
     
     anon_profile = {}
     if student_id:
-        all_profiles = load_anon_profiles()
-        user_profile = next((p for p in all_profiles if p.get('student_id') == student_id), None)
+        user_profile = get_session_profile()
         if user_profile:
             anon_profile = user_profile
     
     return render_template('mypage.html', anon_profile=anon_profile)
 
 @app.route('/chat')
+@login_required(page=True)
 def chat():
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        flash('로그인이 필요합니다.', 'error')
-        return redirect(url_for('login'))
-    
     # 현재 사용자의 익명 프로필 가져오기
-    current_user = session.get('user', {})
+    current_user = g.user
     student_id = current_user.get('student_id')
     
     anon_profile = {}
     if student_id:
-        all_profiles = load_anon_profiles()
-        user_profile = next((p for p in all_profiles if p.get('student_id') == student_id), None)
+        user_profile = get_session_profile()
         if user_profile:
             anon_profile = user_profile
         else:
@@ -529,16 +3846,15 @@ def chat():
     return render_template('chat.html', anon_profile=anon_profile)
 
 @app.route('/boards')
+@login_required(page=True)
 def boards():
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        flash('로그인이 필요합니다.', 'error')
-        return redirect(url_for('login'))
-    
     # 세션에서 사용자 정보 가져오기
-    user = session.get('user', {})
+    user = g.user
     user_department = user.get('department', 'free') if isinstance(user, dict) else 'free'
     
+    # 검색 색인 미리 만들기
+    warm_search_index()
+    
     return render_template('boards.html', user_department=user_department)
 
 @app.route('/app')
@@ -563,18 +3879,15 @@ def check_student_id():
 @app.route('/logout')
 def logout():
     """로그아웃"""
-    session.clear()
+    end_login_session()
     flash('로그아웃되었습니다.', 'success')
     return redirect(url_for('index'))
 
 @app.route('/change-password', methods=['POST'])
+@login_required
 def change_password():
     """비밀번호 변경"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     student_id = current_user.get('student_id')
     
     if not student_id:
@@ -588,23 +3901,32 @@ def change_password():
     if not current_password or not new_password:
         return jsonify({'success': False, 'message': '모든 필드를 입력해주세요.'}), 400
     
-    # 사용자 데이터 로드
-    users = load_users()
-    user = next((u for u in users if u.get('student_id') == student_id), None)
-    
+    user = find_user(student_id)
     if not user:
         return jsonify({'success': False, 'message': '사용자를 찾을 수 없습니다.'}), 404
     
-    # 현재 비밀번호 확인
-    if user.get('password') != current_password:
+    # 현재 비밀번호 확인과 새 비밀번호 해시 (시간이 걸리므로 사용자 파일 잠금 밖에서)
+    stored = user.get('password')
+    if not verify_password(stored, current_password)[0]:
         return jsonify({'success': False, 'message': '현재 비밀번호가 올바르지 않습니다.'}), 400
+    new_password_hash = hash_password(new_password)
     
-    # 비밀번호 업데이트
-    user['password'] = new_password
+    with data_transaction(DATA_FILE):
+        users = load_users()
+        position = user_position(users, student_id)
+        if position is None:
+            return jsonify({'success': False, 'message': '사용자를 찾을 수 없습니다.'}), 404
+        if users[position].get('password') != stored:
+            # 확인하는 사이 다른 요청이 비밀번호를 바꿈
+            return jsonify({'success': False, 'message': '비밀번호가 변경되었습니다. 다시 시도해주세요.'}), 409
+        
+        # 비밀번호 업데이트 후 변경된 사용자 목록 저장
+        users[position]['password'] = new_password_hash
+        if not save_users(users, changed=[users[position]]):
+            return jsonify({'success': False, 'message': '비밀번호 변경 중 오류가 발생했습니다.'}), 500
     
-    # 변경된 사용자 목록 저장
-    if not save_users(users):
-        return jsonify({'success': False, 'message': '비밀번호 변경 중 오류가 발생했습니다.'}), 500
+    # 다른 기기의 로그인 세션 종료 (현재 세션은 유지)
+    end_user_sessions(student_id, keep=session.get('sid'))
     
     return jsonify({
         'success': True, 
@@ -612,16 +3934,13 @@ def change_password():
     })
 
 @app.route('/delete-account', methods=['POST'])
+@login_required
+@data_transaction(DATA_FILE, ANON_PROFILES_FILE)
 def delete_account():
     """회원 탈퇴"""
     print(f"[회원 탈퇴 요청] 세션 정보: {session}")
     
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        print("[회원 탈퇴 실패] 로그인되지 않은 사용자")
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     student_id = current_user.get('student_id')
     
     print(f"[회원 탈퇴] 요청한 사용자 학번: {student_id}")
@@ -644,6 +3963,7 @@ def delete_account():
     if len(users) == original_count:
         # 사용자를 찾지 못한 경우 (등록되지 않은 사용자일 수 있음)
         print("[회원 탈퇴] 사용자를 찾지 못함 - 세션만 삭제")
+        end_user_sessions(student_id)
         session.clear()
         return jsonify({
             'success': True, 
@@ -653,7 +3973,7 @@ def delete_account():
     
     # 변경된 사용자 목록 저장
     print(f"[회원 탈퇴] 사용자 목록 저장 시도 - {len(users)}명")
-    if not save_users(users):
+    if not save_users(users, changed=[], removed=[student_id]):
         print("[회원 탈퇴 실패] 사용자 데이터 저장 실패")
         return jsonify({'success': False, 'message': '회원 탈퇴 중 오류가 발생했습니다.'}), 500
     
@@ -663,12 +3983,13 @@ def delete_account():
         original_anon_count = len(anon_profiles)
         anon_profiles = [p for p in anon_profiles if p.get('student_id') != student_id]
         deleted_anon_count = original_anon_count - len(anon_profiles)
-        save_anon_profiles(anon_profiles)
+        save_anon_profiles(anon_profiles, changed=[], removed=[student_id])
         print(f"[회원 탈퇴] 익명 프로필 삭제: {deleted_anon_count}개")
     except Exception as e:
         print(f"[회원 탈퇴] 익명 프로필 삭제 중 오류: {e}")
     
-    # 세션 삭제
+    # 모든 로그인 세션 삭제
+    end_user_sessions(student_id)
     session.clear()
     print(f"[회원 탈퇴 성공] 학번 {student_id} 탈퇴 완료")
     
@@ -679,13 +4000,10 @@ def delete_account():
     })
 
 @app.route('/api/anon-profiles', methods=['GET'])
+@login_required
 def get_anon_profiles():
     """익명 프로필 목록 조회 (자신 제외)"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     # 모든 익명 프로필 로드
@@ -708,34 +4026,12 @@ def get_anon_profiles():
     
     return jsonify({'success': True, 'profiles': safe_profiles})
 
-@app.route('/api/interest-counts', methods=['GET'])
-def get_interest_counts():
-    """관심사별 참여자 수 및 닉네임 목록 조회"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    # 모든 익명 프로필 로드
-    all_profiles = load_anon_profiles()
-    
-    # 관심사별 카운트 및 닉네임 목록 계산
-    interest_counts = {}
-    interest_users = {}
-    
-    for profile in all_profiles:
-        interests = profile.get('interests', [])
-        nickname = profile.get('nickname', '익명의친구')
-        
-        for interest in interests:
-            # 카운트 증가
-            if interest not in interest_counts:
-                interest_counts[interest] = 0
-            interest_counts[interest] += 1
-            
-            # 닉네임 목록에 추가
-            if interest not in interest_users:
-                interest_users[interest] = []
-            interest_users[interest].append(nickname)
+@app.route('/api/interest-counts', methods=['GET'])
+@login_required
+def get_interest_counts():
+    """관심사별 참여자 수 및 닉네임 목록 조회"""
+    # 관심사 역색인에서 관심사별 카운트 및 닉네임 목록 조회
+    interest_counts, interest_users = interest_summary()
     
     return jsonify({
         'success': True, 
@@ -744,137 +4040,193 @@ def get_interest_counts():
     })
 
 @app.route('/api/board-posts', methods=['GET'])
+@login_required
 def get_board_posts():
     """게시글 목록 조회"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    posts = load_board_posts()
-    return jsonify({'success': True, 'posts': posts})
+    # 조건 없이 요청하면 전체 목록 (기존 화면 호환)
+    if not any(name in request.args for name in BOARD_POST_QUERY_PARAMS):
+        posts = load_board_posts()
+        return jsonify({'success': True, 'posts': posts})
+    
+    sort = request.args.get('sort', 'recent')
+    sort = BOARD_POST_SORT_ALIASES.get(sort, sort)
+    if sort not in BOARD_POST_SORT_FIELDS:
+        return jsonify({'success': False, 'message': '지원하지 않는 정렬 기준입니다.'}), 400
+    
+    limit = request.args.get('limit', BOARD_PAGE_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, BOARD_PAGE_MAX_LIMIT))
+    
+    page = query_board_posts(
+        board_id=request.args.get('boardId') or None,
+        department_id=request.args.get('departmentId') or None,
+        post_type=request.args.get('type') or None,
+        tag=request.args.get('tag') or None,
+        sort=sort,
+        cursor=request.args.get('cursor') or None,
+        limit=limit
+    )
+    return jsonify({
+        'success': True,
+        'posts': page['posts'],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more'],
+        'reset': page['reset']
+    })
+
+@app.route('/api/board-posts/search', methods=['GET'])
+@login_required
+def search_board_posts_api():
+    """게시글 검색 (q=검색어, boardId로 게시판 한정, cursor/limit으로 페이지 이동)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': '검색어를 입력해주세요.'}), 400
+    
+    offset = request.args.get('cursor', 0, type=int)
+    limit = request.args.get('limit', SEARCH_PAGE_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, SEARCH_PAGE_MAX_LIMIT))
+    
+    result = search_board_posts(query, request.args.get('boardId') or None, max(0, offset), limit)
+    return jsonify({
+        'success': True,
+        'posts': result['posts'],
+        'total': result['total'],
+        'next_cursor': result['next_cursor'],
+        'has_more': result['has_more']
+    })
 
 @app.route('/api/board-posts', methods=['POST'])
+@login_required
+@data_transaction(BOARD_POSTS_FILE)
 def create_board_post():
     """게시글 작성"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
     data = request.get_json()
-    post_id = data.get('id')
     
     # 게시글 데이터 로드
     posts = load_board_posts()
     
-    # 중복 게시글 확인 (같은 ID가 이미 있으면 추가하지 않음)
-    existing_post = next((p for p in posts if p.get('id') == post_id), None)
-    if existing_post:
-        return jsonify({'success': True, 'message': '게시글이 이미 존재합니다.', 'post': existing_post})
-    
-    # 새 게시글 추가
+    # 새 게시글 추가 (ID, 좋아요/조회/댓글 수와 작성자 학번은 서버에서만 관리)
+    data['id'] = new_id('p')
+    data.update({'likes': 0, 'views': 0, 'comments': 0})
+    data['authorStudentId'] = g.user.get('student_id')
     posts.append(data)
     
     # 저장
-    if not save_board_posts(posts):
+    if not save_board_posts(posts, changed=[data]):
         return jsonify({'success': False, 'message': '게시글 저장 중 오류가 발생했습니다.'}), 500
     
     return jsonify({'success': True, 'message': '게시글이 작성되었습니다.', 'post': data})
 
+@app.route('/api/board-posts/<post_id>', methods=['GET'])
+@login_required
+def get_board_post(post_id):
+    """게시글 하나 조회 (목록 페이지에 없는 게시글을 바로 열 때)"""
+    post = find_board_post(post_id)
+    if not post:
+        return jsonify({'success': False, 'message': '게시글을 찾을 수 없습니다.'}), 404
+    return jsonify({'success': True, 'post': post})
+
 @app.route('/api/board-posts/<post_id>', methods=['DELETE'])
+@login_required
+@data_transaction(BOARD_POSTS_FILE, BOARD_COMMENTS_FILE)
 def delete_board_post(post_id):
     """게시글 삭제"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
     posts = load_board_posts()
     
     # 게시글 삭제
     posts = [p for p in posts if p.get('id') != post_id]
     
     # 저장
-    if not save_board_posts(posts):
+    if not save_board_posts(posts, changed=[], removed=[post_id]):
         return jsonify({'success': False, 'message': '게시글 삭제 중 오류가 발생했습니다.'}), 500
     
     # 해당 게시글의 댓글도 삭제
-    comments = load_board_comments()
-    comments = [c for c in comments if c.get('postId') != post_id]
-    save_board_comments(comments)
+    delete_post_comments(post_id)
     
     return jsonify({'success': True, 'message': '게시글이 삭제되었습니다.'})
 
 @app.route('/api/board-comments', methods=['GET'])
+@login_required
 def get_board_comments():
     """댓글 목록 조회"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
+    # postId 없이 요청하면 전체 목록 (기존 화면 호환)
+    post_id = request.args.get('postId')
+    if post_id is None:
+        return jsonify({'success': True, 'comments': all_board_comments()})
     
-    comments = load_board_comments()
-    return jsonify({'success': True, 'comments': comments})
+    limit = request.args.get('limit', COMMENT_PAGE_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, COMMENT_PAGE_MAX_LIMIT))
+    
+    page = query_post_comments(post_id, request.args.get('cursor') or None, limit)
+    return jsonify({
+        'success': True,
+        'comments': page['comments'],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more'],
+        'reset': page['reset']
+    })
 
 @app.route('/api/board-comments', methods=['POST'])
+@login_required
+@data_transaction(BOARD_COMMENTS_FILE)
 def create_board_comment():
     """댓글 작성"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
     data = request.get_json()
     
     # 댓글 데이터 로드
     comments = load_board_comments()
     
-    # 새 댓글 추가
-    comments.append(data)
+    # 새 댓글 추가 (ID, 좋아요 수와 작성자 학번은 서버에서만 관리)
+    data['id'] = new_id('c')
+    data['likes'] = 0
+    data['authorStudentId'] = g.user.get('student_id')
+    comments.setdefault(_comment_post_key(data), []).append(data)
     
     # 저장
     if not save_board_comments(comments):
         return jsonify({'success': False, 'message': '댓글 저장 중 오류가 발생했습니다.'}), 500
     
+    # 게시글 댓글 수 증가
+    if data.get('postId'):
+        bump_counter(BOARD_POSTS_FILE, data['postId'], 'comments', 1)
+    
     return jsonify({'success': True, 'message': '댓글이 작성되었습니다.', 'comment': data})
 
 @app.route('/api/board-comments/<comment_id>', methods=['DELETE'])
+@login_required
+@data_transaction(BOARD_COMMENTS_FILE)
 def delete_board_comment(comment_id):
     """댓글 삭제"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
     comments = load_board_comments()
     
     # 댓글 찾기
-    comment = next((c for c in comments if c.get('id') == comment_id), None)
+    post_key, comment = locate_board_comment(comments, comment_id)
     
     if not comment:
         return jsonify({'success': False, 'message': '댓글을 찾을 수 없습니다.'}), 404
     
-    # 댓글 삭제
-    comments = [c for c in comments if c.get('id') != comment_id]
+    # 댓글 삭제 (해당 게시글의 댓글 목록만 다시 만듦)
+    remaining = [c for c in comments[post_key] if c.get('id') != comment_id]
+    if remaining:
+        comments[post_key] = remaining
+    else:
+        del comments[post_key]
     
     # 저장
     if not save_board_comments(comments):
         return jsonify({'success': False, 'message': '댓글 삭제 중 오류가 발생했습니다.'}), 500
     
     # 해당 게시글의 댓글 수 감소
-    post_id = comment.get('postId')
-    if post_id:
-        posts = load_board_posts()
-        post = next((p for p in posts if p.get('id') == post_id), None)
-        if post and post.get('comments', 0) > 0:
-            post['comments'] = post['comments'] - 1
-            save_board_posts(posts)
+    if comment.get('postId'):
+        bump_counter(BOARD_POSTS_FILE, comment['postId'], 'comments', -1)
     
     return jsonify({'success': True, 'message': '댓글이 삭제되었습니다.'})
 
 @app.route('/api/board-posts/<post_id>', methods=['PUT'])
+@login_required
+@data_transaction(BOARD_POSTS_FILE)
 def update_board_post(post_id):
     """게시글 정보 업데이트 (좋아요, 댓글 수, 제목, 내용 등)"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     posts = load_board_posts()
@@ -889,7 +4241,8 @@ def update_board_post(post_id):
     data = request.get_json()
     
     # 게시글 내용 수정인 경우 작성자 확인
-    if 'title' in data or 'content' in data:
+    text_changed = 'title' in data or 'content' in data
+    if text_changed:
         if post.get('authorStudentId') != current_student_id:
             return jsonify({'success': False, 'message': '게시글 작성자만 수정할 수 있습니다.'}), 403
         
@@ -904,108 +4257,161 @@ def update_board_post(post_id):
         # 수정 시간 기록
         post['updatedAt'] = datetime.now().isoformat()
     
-    # 통계 정보 업데이트 (작성자 확인 불필요)
-    if 'likes' in data:
-        post['likes'] = data['likes']
-    if 'comments' in data:
-        post['comments'] = data['comments']
-    if 'views' in data:
-        post['views'] = data['views']
+    # 좋아요/조회/댓글 수는 클라이언트 값을 받지 않음 (좋아요, 조회, 댓글 API에서 서버가 증감)
     
     # 저장
-    if not save_board_posts(posts):
+    if not save_board_posts(posts, changed=[post] if text_changed else []):
         return jsonify({'success': False, 'message': '게시글 업데이트 중 오류가 발생했습니다.'}), 500
     
     return jsonify({'success': True, 'post': post, 'message': '게시글이 수정되었습니다.'})
 
 @app.route('/api/board-posts/<post_id>/like', methods=['POST'])
+@login_required
 def toggle_post_like(post_id):
     """게시글 좋아요 토글"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    posts = load_board_posts()
+    current_student_id = g.user.get('student_id')
     
     # 게시글 찾기
-    post = next((p for p in posts if p.get('id') == post_id), None)
+    post = find_board_post(post_id)
     
     if not post:
         return jsonify({'success': False, 'message': '게시글을 찾을 수 없습니다.'}), 404
     
-    # 좋아요 수 업데이트
-    data = request.get_json()
-    post['likes'] = data.get('likes', 0)
+    # 사용자별 좋아요 기록을 기준으로 토글하고 좋아요 수는 증감분만 반영
+    liked = toggle_user_like(current_student_id, 'posts', post_id)
+    bump_counter(BOARD_POSTS_FILE, post_id, 'likes', 1 if liked else -1)
     
-    # 저장
-    if not save_board_posts(posts):
-        return jsonify({'success': False, 'message': '좋아요 저장 중 오류가 발생했습니다.'}), 500
+    return jsonify({'success': True, 'liked': liked, 'likes': counter_value(BOARD_POSTS_FILE, post, 'likes')})
+
+@app.route('/api/board-posts/<post_id>/view', methods=['POST'])
+@login_required
+def record_post_view(post_id):
+    """게시글 조회수 증가"""
+    post = find_board_post(post_id)
+    
+    if not post:
+        return jsonify({'success': False, 'message': '게시글을 찾을 수 없습니다.'}), 404
+    
+    bump_counter(BOARD_POSTS_FILE, post_id, 'views', 1)
     
-    return jsonify({'success': True, 'likes': post['likes']})
+    return jsonify({'success': True, 'views': counter_value(BOARD_POSTS_FILE, post, 'views')})
 
 @app.route('/api/board-comments/<comment_id>/like', methods=['POST'])
+@login_required
 def toggle_comment_like(comment_id):
     """댓글 좋아요 토글"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    comments = load_board_comments()
+    current_student_id = g.user.get('student_id')
     
     # 댓글 찾기
-    comment = next((c for c in comments if c.get('id') == comment_id), None)
+    _, comment = locate_board_comment(load_board_comments(), comment_id)
     
     if not comment:
         return jsonify({'success': False, 'message': '댓글을 찾을 수 없습니다.'}), 404
     
-    # 좋아요 수 업데이트
-    data = request.get_json()
-    comment['likes'] = data.get('likes', 0)
+    liked = toggle_user_like(current_student_id, 'comments', comment_id)
+    bump_counter(BOARD_COMMENTS_FILE, comment_id, 'likes', 1 if liked else -1)
     
-    # 저장
-    if not save_board_comments(comments):
-        return jsonify({'success': False, 'message': '좋아요 저장 중 오류가 발생했습니다.'}), 500
+    return jsonify({'success': True, 'liked': liked, 'likes': counter_value(BOARD_COMMENTS_FILE, comment, 'likes')})
+
+@app.route('/api/me/activity', methods=['GET'])
+@login_required
+def get_my_activity():
+    """내 활동 조회
+
+    type 없이 요청하면 종류별 개수와 최근 항목만, type=posts|comments|likes|commentLikes를 주면
+    해당 종류를 cursor/limit으로 한 페이지씩 돌려준다.
+    """
+    current_student_id = g.user.get('student_id')
+    kind = request.args.get('type')
+    if kind is None:
+        return jsonify({'success': True, 'summary': user_activity_summary(current_student_id)})
+    if kind not in ACTIVITY_KINDS:
+        return jsonify({'success': False, 'message': '지원하지 않는 활동 종류입니다.'}), 400
+    
+    limit = request.args.get('limit', ACTIVITY_PAGE_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, ACTIVITY_PAGE_MAX_LIMIT))
+    
+    result = query_user_activity(current_student_id, kind, request.args.get('cursor') or None, limit)
+    return jsonify({'success': True, **result})
+
+@app.route('/api/board-likes', methods=['GET'])
+@login_required
+def get_board_likes():
+    """현재 사용자가 좋아요한 게시글/댓글 ID 목록"""
+    user_likes = load_user_likes(g.user.get('student_id'))
+    return jsonify({
+        'success': True,
+        'posts': list(user_likes['posts']),
+        'comments': list(user_likes['comments'])
+    })
+
+def chat_messages_response(room_id):
+    """채팅방 메시지 응답
+
+    since=<메시지 ID>를 주면 그 이후의 새 메시지만, limit=<개수>를 주면 최대 그 개수만 돌려준다.
+    다음 요청에는 응답의 next_cursor를 since로 넘기면 되고, 바뀐 것이 없으면 ETag로 304를 돌려준다.
+    before=<메시지 순번>을 주면 그보다 이전 메시지(보관함 포함)를 돌려준다.
+    """
+    since = request.args.get('since') or None
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, CHAT_PAGE_MAX_LIMIT))
+    
+    before = request.args.get('before', type=int)
+    if before is not None:
+        history = get_room_history(room_id, before, limit or CHAT_HISTORY_DEFAULT_LIMIT)
+        return jsonify({
+            'success': True,
+            'messages': history['messages'],
+            'next_cursor': history['next_cursor'],
+            'has_more': history['has_more']
+        })
+    
+    page = get_room_messages_page(room_id, since, limit)
+    etag = hashlib.sha1(f"{room_id}|{page['version']}|{since}|{limit}".encode('utf-8')).hexdigest()
+    
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
     
-    return jsonify({'success': True, 'likes': comment['likes']})
+    if not since:
+        print(f"[채팅] {room_id} 방의 메시지 조회: {len(page['messages'])}개")
+    
+    response = jsonify({
+        'success': True,
+        'messages': page['messages'],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more'],
+        'reset': page['reset']
+    })
+    response.set_etag(etag)
+    return response
 
 @app.route('/api/chat/messages/<room_id>', methods=['GET'])
+@login_required
 def get_chat_messages(room_id):
     """채팅방 메시지 조회"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    all_messages = load_chat_messages()
-    room_messages = all_messages.get(room_id, [])
-    
-    print(f"[채팅] {room_id} 방의 메시지 조회: {len(room_messages)}개")
-    
-    return jsonify({'success': True, 'messages': room_messages})
+    if not chat_room_exists(room_id):
+        return jsonify({'success': False, 'message': '채팅방을 찾을 수 없습니다.'}), 404
+    return chat_messages_response(room_id)
 
 @app.route('/api/chat/messages/<room_id>', methods=['POST'])
+@login_required
 def send_chat_message(room_id):
     """채팅 메시지 전송"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
     data = request.get_json()
     message = data.get('message', '').strip()
     sender_nickname = data.get('sender_nickname', '익명')
     
     if not message:
         return jsonify({'success': False, 'message': '메시지를 입력해주세요.'}), 400
-    
-    # 모든 메시지 로드
-    all_messages = load_chat_messages()
-    
-    # 해당 채팅방의 메시지 가져오기
-    if room_id not in all_messages:
-        all_messages[room_id] = []
+    if not chat_room_exists(room_id):
+        return jsonify({'success': False, 'message': '채팅방을 찾을 수 없습니다.'}), 404
     
     # 새 메시지 추가
     new_message = {
-        'id': 'm' + str(int(time.time() * 1000)),
+        'id': new_id('m'),
         'sender': sender_nickname,
         'content': message,
         'timestamp': time.time(),
@@ -1013,67 +4419,58 @@ def send_chat_message(room_id):
         'type': 'text'
     }
     
-    all_messages[room_id].append(new_message)
-    
     print(f"[채팅] {sender_nickname}님이 {room_id} 방에 메시지 전송: {message[:20]}...")
-    print(f"[채팅] {room_id} 방의 총 메시지 수: {len(all_messages[room_id])}개")
     
-    # 최근 100개 메시지만 유지
-    if len(all_messages[room_id]) > 100:
-        all_messages[room_id] = all_messages[room_id][-100:]
-    
-    # 저장
-    if not save_chat_messages(all_messages):
+    # 저장 (로그에 한 줄 추가, 보관 개수를 넘는 오래된 메시지는 로그 정리 때 삭제)
+    if not append_chat_message(room_id, new_message):
         return jsonify({'success': False, 'message': '메시지 저장 중 오류가 발생했습니다.'}), 500
     
+    publish_room_message(room_id, new_message)
+    
     return jsonify({'success': True, 'message_data': new_message})
 
 @app.route('/api/chat/read-status/<room_id>', methods=['POST'])
+@login_required
 def update_read_status(room_id):
     """채팅방 읽음 상태 업데이트"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     if not current_student_id:
         return jsonify({'success': False, 'message': '사용자 정보를 찾을 수 없습니다.'}), 400
+    if not chat_room_exists(room_id):
+        return jsonify({'success': False, 'message': '채팅방을 찾을 수 없습니다.'}), 404
     
     # 해당 채팅방의 최신 메시지 ID 가져오기
-    all_messages = load_chat_messages()
-    room_messages = all_messages.get(room_id, [])
+    room_messages = get_room_messages_page(room_id, limit=1)['messages']
     
     if not room_messages:
         return jsonify({'success': True, 'message': '메시지가 없습니다.'})
     
-    # 가장 최근 메시지 ID
+    # 가장 최근 메시지 ID와 순번
     latest_message_id = room_messages[-1].get('id')
+    latest_seq = room_messages[-1].get('seq')
     
-    # 읽음 상태 업데이트
-    if update_user_read_status(current_student_id, room_id, latest_message_id):
-        print(f"[읽음 상태 업데이트] 사용자: {current_student_id}, 방: {room_id}, 메시지: {latest_message_id}")
-        return jsonify({
-            'success': True, 
-            'message': '읽음 상태가 업데이트되었습니다.',
-            'last_read_message_id': latest_message_id
-        })
-    else:
-        return jsonify({'success': False, 'message': '읽음 상태 업데이트에 실패했습니다.'}), 500
+    # 읽음 상태 업데이트 (메모리에 반영하고 저장은 백그라운드에서 모아서)
+    marker = update_user_read_status(current_student_id, room_id, latest_message_id, latest_seq)
+    return jsonify({
+        'success': True, 
+        'message': '읽음 상태가 업데이트되었습니다.',
+        'last_read_message_id': marker['last_message_id'],
+        'last_read_seq': marker['last_seq']
+    })
 
 @app.route('/api/chat/unread-count/<room_id>', methods=['GET'])
+@login_required
 def get_unread_count(room_id):
     """채팅방 읽지 않은 메시지 수 조회"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     if not current_student_id:
         return jsonify({'success': False, 'message': '사용자 정보를 찾을 수 없습니다.'}), 400
+    if not chat_room_exists(room_id):
+        return jsonify({'success': False, 'message': '채팅방을 찾을 수 없습니다.'}), 404
     
     unread_count = get_unread_message_count(current_student_id, room_id)
     
@@ -1084,28 +4481,20 @@ def get_unread_count(room_id):
     })
 
 @app.route('/api/chat/leave/<room_id>', methods=['POST'])
+@login_required
 def leave_chat_room(room_id):
     """채팅방 나가기 (나가기 메시지 전송)"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
     data = request.get_json()
     nickname = data.get('nickname', '익명').strip()
     
     if not nickname:
         return jsonify({'success': False, 'message': '닉네임이 필요합니다.'}), 400
-    
-    # 모든 메시지 로드
-    all_messages = load_chat_messages()
-    
-    # 해당 채팅방의 메시지 가져오기
-    if room_id not in all_messages:
-        all_messages[room_id] = []
+    if not chat_room_exists(room_id):
+        return jsonify({'success': False, 'message': '채팅방을 찾을 수 없습니다.'}), 404
     
     # 나가기 메시지 추가
     leave_message = {
-        'id': 'leave_' + str(int(time.time() * 1000)),
+        'id': new_id('leave_'),
         'sender': '시스템',
         'content': f'{nickname}님이 채팅방을 나갔습니다.',
         'timestamp': time.time(),
@@ -1113,37 +4502,28 @@ def leave_chat_room(room_id):
         'type': 'leave'
     }
     
-    all_messages[room_id].append(leave_message)
-    
     print(f"[채팅] {nickname}님이 {room_id} 방을 나감")
     
-    # 최근 100개 메시지만 유지
-    if len(all_messages[room_id]) > 100:
-        all_messages[room_id] = all_messages[room_id][-100:]
-    
     # 저장
-    if not save_chat_messages(all_messages):
+    if not append_chat_message(room_id, leave_message):
         return jsonify({'success': False, 'message': '나가기 메시지 저장 중 오류가 발생했습니다.'}), 500
     
+    publish_room_message(room_id, leave_message)
+    
     return jsonify({'success': True, 'message_data': leave_message})
 
 @app.route('/api/interest/<interest_name>/leave', methods=['POST'])
+@login_required
+@data_transaction(ANON_PROFILES_FILE)
 def leave_interest_room(interest_name):
     """관심분야 방에서 나가기 (참여자 수 감소)"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     # 현재 사용자의 익명 프로필 가져오기
-    user_profile = None
     all_profiles = load_anon_profiles()
-    for profile in all_profiles:
-        if profile.get('student_id') == current_student_id:
-            user_profile = profile
-            break
+    position = anon_profile_position(all_profiles, current_student_id)
+    user_profile = all_profiles[position] if position is not None else None
     
     if not user_profile:
         return jsonify({'success': False, 'message': '익명 프로필을 찾을 수 없습니다.'}), 404
@@ -1153,7 +4533,8 @@ def leave_interest_room(interest_name):
         user_profile['interests'].remove(interest_name)
         
         # 서버에 저장
-        save_anon_profiles(all_profiles)
+        save_anon_profiles(all_profiles, changed=[user_profile])
+        refresh_session_profiles(current_student_id)
         
         print(f"[관심분야] {user_profile.get('nickname', '익명')}님이 {interest_name} 방에서 나감")
         
@@ -1166,46 +4547,29 @@ def leave_interest_room(interest_name):
         return jsonify({'success': False, 'message': '해당 관심분야 방에 참여하지 않았습니다.'}), 400
 
 @app.route('/api/matching/start', methods=['POST'])
+@login_required
+@data_transaction(MATCHING_QUEUE_FILE, CHAT_ROOMS_FILE)
 def start_matching():
     """1:1 매칭 시작"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     # 현재 사용자의 익명 프로필 가져오기
-    user_profile = None
-    all_profiles = load_anon_profiles()
-    for profile in all_profiles:
-        if profile.get('student_id') == current_student_id:
-            user_profile = profile
-            break
+    user_profile = find_anon_profile(current_student_id)
     
     if not user_profile:
         return jsonify({'success': False, 'message': '익명 프로필을 찾을 수 없습니다.'}), 404
     
-    # 매칭 대기열에 추가
-    matching_data = load_matching_queue()
-    
     # 이미 대기 중인지 확인
-    existing_wait = next((w for w in matching_data.get('waiting', []) if w.get('student_id') == current_student_id), None)
-    if existing_wait:
+    if find_matching_waiter(current_student_id):
         return jsonify({'success': False, 'message': '이미 매칭 대기 중입니다.'}), 400
     
-    # 이미 매칭된 방이 있는지 확인 (활성화된 방만)
-    rooms_data = load_chat_rooms()
-    existing_room = None
-    for room_id, room in rooms_data.items():
-        # 비활성화된 방은 제외
-        if room.get('active', True) == False:
-            continue
-            
-        if current_student_id in [room.get('user1_id'), room.get('user2_id')]:
-            # 방이 아직 활성 상태인지 확인 (나가기하지 않은 상태)
-            existing_room = room
-            break
+    # 이미 매칭된 방이 있는지 확인 (활성화된 1:1 방만, 나가기하지 않은 상태)
+    existing_room = next(
+        (room for kind, _, room in list_user_rooms(current_student_id)
+         if kind == 'dm' and room.get('active', True) != False),
+        None
+    )
     
     if existing_room:
         other_student_id = existing_room['user2_id'] if current_student_id == existing_room['user1_id'] else existing_room['user1_id']
@@ -1220,6 +4584,11 @@ def start_matching():
             }
         }), 400
     
+    # 매칭 방식 (random: 랜덤, interest: 관심사가 겹치는 사람)
+    mode = (request.get_json(silent=True) or {}).get('mode', 'random')
+    if mode not in MATCHING_MODES:
+        return jsonify({'success': False, 'message': '지원하지 않는 매칭 방식입니다.'}), 400
+    
     # 대기열에 추가
     waiting_user = {
         'student_id': current_student_id,
@@ -1227,50 +4596,71 @@ def start_matching():
         'gender': user_profile.get('gender'),
         'joined_at': time.time()
     }
+    if mode == 'interest':
+        waiting_user.update({'mode': mode, 'interests': list(dict.fromkeys(user_profile.get('interests') or []))})
     
-    matching_data['waiting'].append(waiting_user)
-    save_matching_queue(matching_data)
+    enqueue_matching(waiting_user)
+    start_matchmaker()
     
     print(f"[매칭] {user_profile.get('nickname')}님이 1:1 매칭 대기열에 추가됨")
     
     # 매칭 시도
-    match_result = try_matching(matching_data)
+    match_result = next(
+        (m for m in try_matching(load_matching_queue())
+         if current_student_id in (m['user1']['student_id'], m['user2']['student_id'])),
+        None
+    )
     
     return jsonify({
         'success': True,
         'message': '매칭 대기열에 추가되었습니다.',
         'matched': match_result is not None,
-        'match_data': match_result
+        'match_data': match_result,
+        'joined_at': waiting_user['joined_at']
     })
 
+@app.route('/api/matching/status', methods=['GET'])
+@login_required
+def get_matching_status():
+    """1:1 매칭 상태 확인
+
+    state: waiting(대기 중) / matched(since 이후 매칭된 방이 있음, room_id 포함) / idle(대기열에 없음 - 취소 또는 만료)
+    wait=<초>를 주면 매칭되거나 대기열에서 빠질 때까지 최대 그 시간만큼 기다렸다가 응답한다.
+    """
+    current_student_id = g.user.get('student_id')
+    since = request.args.get('since', 0, type=float)
+    
+    def check():
+        if find_matching_waiter(current_student_id):
+            return {'state': 'waiting'}
+        room_id = _latest_room_since(current_student_id, 'dm', since)
+        return {'state': 'matched', 'room_id': room_id} if room_id else {'state': 'idle'}
+    
+    start_matchmaker()
+    status = wait_matching_status(current_student_id, check, _status_wait_seconds())
+    return jsonify({'success': True, **status})
+
 @app.route('/api/matching/cancel', methods=['POST'])
+@login_required
+@data_transaction(MATCHING_QUEUE_FILE)
 def cancel_matching():
     """1:1 매칭 취소"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
-    matching_data = load_matching_queue()
-    
     # 대기열에서 제거
-    matching_data['waiting'] = [w for w in matching_data.get('waiting', []) if w.get('student_id') != current_student_id]
-    save_matching_queue(matching_data)
+    cancel_matching_wait(current_student_id)
     
     print(f"[매칭] {current_student_id}님이 매칭 대기열에서 제거됨")
     
     return jsonify({'success': True, 'message': '매칭이 취소되었습니다.'})
 
 @app.route('/api/room/<room_id>/enter', methods=['POST'])
+@login_required
+@data_transaction(CHAT_ROOMS_FILE)
 def enter_room(room_id):
     """채팅방 입장"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     # 방 정보 가져오기
@@ -1305,15 +4695,10 @@ def enter_room(room_id):
             is_first_join = True
     
     rooms_data[room_id] = room
-    save_chat_rooms(rooms_data)
+    save_chat_rooms(rooms_data, changed=[])
     
     # 입장 메시지 생성 (멱등 처리)
-    user_profile = None
-    all_profiles = load_anon_profiles()
-    for profile in all_profiles:
-        if profile.get('student_id') == current_student_id:
-            user_profile = profile
-            break
+    user_profile = find_anon_profile(current_student_id)
     
     nickname = user_profile.get('nickname', '익명') if user_profile else '익명'
     
@@ -1326,12 +4711,10 @@ def enter_room(room_id):
     
     # 첫 입장일 때만 메시지 추가 (중복 방지)
     if is_first_join:
-        messages = load_chat_messages()
-        if room_id not in messages:
-            messages[room_id] = []
+        room_messages = get_room_messages(room_id)
         
         # 직전 시스템 메시지 확인 (중복 방지)
-        last_message = messages[room_id][-1] if messages[room_id] else None
+        last_message = room_messages[-1] if room_messages else None
         should_add_message = True
         
         # 두 번째 사용자 입장 시에는 wait 메시지를 enter로 교체해야 하므로 항상 처리
@@ -1345,7 +4728,7 @@ def enter_room(room_id):
             if other_user_entered:
                 # 두 번째 사용자 입장 시: 기존 wait 메시지를 enter 메시지로 교체
                 enter_message = {
-                    'id': f"enter_{int(time.time() * 1000)}",
+                    'id': new_id('enter_'),
                     'sender': '시스템',
                     'content': f'{nickname}님이 방에 입장했습니다.',
                     'timestamp': time.time(),
@@ -1356,27 +4739,26 @@ def enter_room(room_id):
                 # 기존 wait 메시지가 있으면 교체, 없으면 추가
                 if last_message and last_message.get('type') == 'wait':
                     # 마지막 메시지가 wait 타입이면 교체
-                    messages[room_id][-1] = enter_message
+                    replace_chat_message(room_id, last_message.get('id'), enter_message)
                     print(f"[입장] {nickname}님이 {room_id} 방에 입장 (wait 메시지를 enter로 교체)")
                 else:
                     # wait 메시지가 없으면 새로 추가
-                    messages[room_id].append(enter_message)
+                    append_chat_message(room_id, enter_message)
                     print(f"[입장] {nickname}님이 {room_id} 방에 입장 (상대방 이미 입장함)")
             else:
                 # 첫 번째 입장자에게만 메시지
                 wait_message = {
-                    'id': f"wait_{int(time.time() * 1000)}",
+                    'id': new_id('wait_'),
                     'sender': '시스템',
                     'content': '상대방이 아직 방에 입장하지 않았습니다.',
                     'timestamp': time.time(),
                     'created_at': datetime.now().isoformat(),
                     'type': 'wait'
                 }
-                messages[room_id].append(wait_message)
+                append_chat_message(room_id, wait_message)
                 print(f"[입장] {nickname}님이 {room_id} 방에 입장 (첫 번째 입장자)")
         
-        # 메시지 저장
-        save_chat_messages(messages)
+        publish_event(_room_member_ids(room), 'room_enter', {'room_id': room_id, 'nickname': nickname})
     else:
         print(f"[입장] {nickname}님이 {room_id} 방에 재입장 (이미 입장한 상태)")
     
@@ -1388,13 +4770,11 @@ def enter_room(room_id):
     })
 
 @app.route('/api/room/<room_id>/leave', methods=['POST'])
+@login_required
+@data_transaction(CHAT_ROOMS_FILE)
 def leave_room(room_id):
     """채팅방 나가기 (방 비활성화)"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     # 방 정보 가져오기
@@ -1414,50 +4794,71 @@ def leave_room(room_id):
     room['left_by'] = current_student_id
     
     rooms_data[room_id] = room
-    save_chat_rooms(rooms_data)
+    save_chat_rooms(rooms_data, changed=[room_id])
     
     print(f"[방 나가기] {current_student_id}님이 {room_id} 방을 나감")
     
+    publish_event(_room_member_ids(room), 'room_leave', {'room_id': room_id})
+    
     return jsonify({
         'success': True,
         'message': '방에서 나갔습니다.'
     })
 
-@app.route('/api/rooms', methods=['GET'])
-def get_user_rooms():
-    """사용자의 채팅방 목록 조회"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
+@app.route('/api/archived-rooms/<room_id>', methods=['GET'])
+@login_required
+def get_archived_room(room_id):
+    """보관함으로 옮긴 채팅방 조회 (방 정보와 메시지, before=<순번>으로 이전 메시지)"""
+    current_student_id = g.user.get('student_id')
     
-    current_user = session.get('user', {})
-    current_student_id = current_user.get('student_id')
+    record = find_archived_room(room_id)
+    if not record:
+        return jsonify({'success': False, 'message': '보관된 채팅방을 찾을 수 없습니다.'}), 404
     
-    # 모든 방 정보 가져오기
-    rooms_data = load_chat_rooms()
+    if current_student_id not in _room_member_ids(record['room']):
+        return jsonify({'success': False, 'message': '이 방에 참여할 권한이 없습니다.'}), 403
     
-    # 사용자가 참여한 방들 필터링 (활성화된 방만)
-    user_rooms = []
-    for room_id, room in rooms_data.items():
-        # 비활성화된 방은 제외
-        if room.get('active', True) == False:
-            continue
-            
-        if current_student_id in [room.get('user1_id'), room.get('user2_id')]:
-            # 상대방 정보 가져오기
-            other_student_id = room['user2_id'] if current_student_id == room['user1_id'] else room['user1_id']
-            other_profile = None
-            
-            all_profiles = load_anon_profiles()
-            for profile in all_profiles:
-                if profile.get('student_id') == other_student_id:
-                    other_profile = profile
-                    break
-            
-            # 읽지 않은 메시지 수 계산
-            unread_count = get_unread_message_count(current_student_id, room_id)
-            
-            user_rooms.append({
+    limit = request.args.get('limit', CHAT_HISTORY_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, CHAT_PAGE_MAX_LIMIT))
+    before = request.args.get('before', record['last_seq'] + 1, type=int)
+    history = get_room_history(room_id, before, limit)
+    
+    return jsonify({
+        'success': True,
+        'room': record['room'],
+        'type': record['room_type'],
+        'archived_at': record['archived_at'],
+        'messages': history['messages'],
+        'next_cursor': history['next_cursor'],
+        'has_more': history['has_more']
+    })
+
+def build_room_list(student_id, room_type=None):
+    """사용자의 채팅방 목록 (1:1 방과 그룹 방)
+
+    방 목록, 상대방 프로필, 읽음 상태를 각각 한 번씩만 불러와 학번 기준 인덱스로 조회하므로
+    전체 데이터 크기가 아니라 사용자가 참여한 방 수에 비례하는 비용이 든다.
+    """
+    user_rooms = [
+        (kind, room_id, room) for kind, room_id, room in list_user_rooms(student_id)
+        if room.get('active', True) and (room_type is None or kind == room_type)
+    ]
+    
+    other_ids = {
+        room_id: room.get('user2_id') if student_id == room.get('user1_id') else room.get('user1_id')
+        for kind, room_id, room in user_rooms if kind == 'dm'
+    }
+    profiles = find_anon_profiles(other_ids.values())
+    read_markers = load_user_read_markers(student_id)
+    
+    result = []
+    for kind, room_id, room in user_rooms:
+        # 방마다 로그 상태는 한 번만 조회해 읽지 않은 수와 메시지 수에 함께 씀
+        state = room_message_state(room_id)
+        unread_count = _unread_count_from_marker(read_markers.get(room_id), room_id, state)
+        if kind == 'dm':
+            other_profile = profiles.get(other_ids[room_id])
+            result.append({
                 'room_id': room_id,
                 'room_name': other_profile.get('nickname', '익명') if other_profile else '익명',
                 'type': 'dm',
@@ -1466,20 +4867,69 @@ def get_user_rooms():
                 'user2_entered': room.get('user2_entered', False),
                 'unread_count': unread_count
             })
+        else:
+            # 메시지 수는 채팅방 로그의 마지막 순번 (보관함으로 옮긴 메시지 포함)
+            last_seq, _ = state
+            result.append({
+                'room_id': room_id,
+                'room_name': room.get('room_name', ''),
+                'type': 'group',
+                'member_count': len(room.get('members', [])),
+                'message_count': last_seq,
+                'created_at': room.get('created_at', 0),
+                'unread_count': unread_count
+            })
+    return result
+
+@app.route('/api/rooms', methods=['GET'])
+@login_required
+def get_user_rooms():
+    """사용자의 채팅방 목록 조회 (1:1 방과 그룹 방)"""
+    current_user = g.user
+    current_student_id = current_user.get('student_id')
     
     return jsonify({
         'success': True,
-        'rooms': user_rooms
+        'rooms': build_room_list(current_student_id)
     })
 
+@app.route('/api/events', methods=['GET'])
+@login_required
+def event_stream():
+    """실시간 이벤트 스트림 (새 메시지, 입장/퇴장, 읽지 않은 메시지 수)"""
+    current_user = g.user
+    current_student_id = current_user.get('student_id')
+    
+    if not current_student_id:
+        return jsonify({'success': False, 'message': '사용자 정보를 찾을 수 없습니다.'}), 400
+    
+    subscription = subscribe_events(current_student_id)
+    
+    def generate():
+        try:
+            # 연결이 끊기면 3초 후 다시 연결
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event, data = subscription.get(timeout=EVENT_HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            unsubscribe_events(current_student_id, subscription)
+    
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/check-nickname', methods=['POST'])
+@login_required
 def check_nickname():
     """닉네임 중복 체크 API"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     data = request.get_json()
@@ -1488,14 +4938,8 @@ def check_nickname():
     if not nickname:
         return jsonify({'available': True})
     
-    # 모든 익명 프로필 로드
-    all_profiles = load_anon_profiles()
-    
     # 자신의 현재 닉네임 제외하고 중복 체크
-    is_duplicate = any(
-        p.get('nickname') == nickname and p.get('student_id') != current_student_id
-        for p in all_profiles
-    )
+    is_duplicate = is_nickname_taken(nickname, current_student_id)
     
     return jsonify({
         'available': not is_duplicate,
@@ -1503,13 +4947,11 @@ def check_nickname():
     })
 
 @app.route('/api/save-anon-profile', methods=['POST'])
+@login_required
+@data_transaction(ANON_PROFILES_FILE)
 def save_anon_profile_api():
     """익명 프로필 저장 API (마이페이지에서 사용)"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     student_id = current_user.get('student_id')
     
     if not student_id:
@@ -1525,12 +4967,7 @@ def save_anon_profile_api():
     if not year or not gender or not interests:
         return jsonify({'success': False, 'message': '필수 정보를 입력해주세요.'}), 400
     
-    # 익명 프로필 저장
-    profiles = load_anon_profiles()
-    
-    # 기존 프로필 업데이트 또는 새로 추가
-    existing_index = next((i for i, p in enumerate(profiles) if p.get('student_id') == student_id), None)
-    
+    # 익명 프로필 저장 (기존 프로필 업데이트 또는 새로 추가)
     profile_data = {
         'student_id': student_id,
         'nickname': nickname,
@@ -1541,32 +4978,24 @@ def save_anon_profile_api():
         'avatar': nickname[0] if nickname else '익'
     }
     
-    if existing_index is not None:
-        profiles[existing_index] = profile_data
-    else:
-        profiles.append(profile_data)
-    
-    if not save_anon_profiles(profiles):
+    if not upsert_anon_profile(profile_data):
         return jsonify({'success': False, 'message': '프로필 저장 중 오류가 발생했습니다.'}), 500
+    refresh_session_profiles(student_id)
     
     return jsonify({'success': True, 'message': '익명 프로필이 저장되었습니다.'})
 
 @app.route('/api/anon-profile', methods=['GET'])
+@login_required
 def get_anon_profile_api():
     """현재 로그인한 사용자의 익명 프로필 가져오기"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     student_id = current_user.get('student_id')
     
     if not student_id:
         return jsonify({'success': False, 'message': '사용자 정보를 찾을 수 없습니다.'}), 400
     
     # 익명 프로필 조회
-    profiles = load_anon_profiles()
-    user_profile = next((p for p in profiles if p.get('student_id') == student_id), None)
+    user_profile = get_session_profile()
     
     if user_profile:
         return jsonify({'success': True, 'profile': user_profile})
@@ -1574,13 +5003,10 @@ def get_anon_profile_api():
         return jsonify({'success': False, 'message': '익명 프로필이 없습니다.', 'profile': None})
 
 @app.route('/api/user-info', methods=['GET'])
+@login_required
 def get_user_info():
     """현재 로그인한 사용자 정보 반환"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    user = session.get('user', {})
+    user = g.user
     return jsonify({
         'success': True, 
         'user': {
@@ -1595,12 +5021,9 @@ def get_user_info():
     })
 
 @app.route('/profile-setup', methods=['GET', 'POST'])
+@login_required(page=True)
+@data_transaction(ANON_PROFILES_FILE)
 def profile_setup():
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        flash('로그인이 필요합니다.', 'error')
-        return redirect(url_for('login'))
-    
     if request.method == 'POST':
         # 프로필 데이터 수집
         year = request.form.get('year')
@@ -1614,25 +5037,12 @@ def profile_setup():
             flash('모든 필수 항목을 입력해주세요.', 'error')
             return redirect(url_for('profile_setup'))
         
-        # 세션에 익명 프로필 저장
-        session['anon_profile'] = {
-            'year': year,
-            'gender': gender,
-            'nickname': nickname,
-            'bio': bio,
-            'interests': interests
-        }
-        
-        # 파일에도 저장 (랜덤채팅에서 사용)
-        current_user = session.get('user', {})
+        # 파일에 저장 (랜덤채팅에서 사용)
+        current_user = g.user
         student_id = current_user.get('student_id')
         
         if student_id:
-            profiles = load_anon_profiles()
-            
             # 기존 프로필 업데이트 또는 새로 추가
-            existing_index = next((i for i, p in enumerate(profiles) if p.get('student_id') == student_id), None)
-            
             profile_data = {
                 'student_id': student_id,
                 'nickname': nickname,
@@ -1643,12 +5053,8 @@ def profile_setup():
                 'avatar': nickname[0] if nickname else '익'
             }
             
-            if existing_index is not None:
-                profiles[existing_index] = profile_data
-            else:
-                profiles.append(profile_data)
-            
-            save_anon_profiles(profiles)
+            upsert_anon_profile(profile_data)
+            refresh_session_profiles(student_id)
         
         flash('익명 프로필이 저장되었습니다!', 'success')
         # 채팅 페이지로 리디렉트
@@ -1656,103 +5062,217 @@ def profile_setup():
     
     return render_template('profile-setup.html')
 
+# 그룹 매칭 구성 (3-6명, 남녀 비율 2:1 이내)
+GROUP_MIN_SIZE = 3
+GROUP_MAX_SIZE = 6
+GROUP_MAX_RATIO = 2  # 많은 쪽 인원 / 적은 쪽 인원의 상한
+
+def _group_fits(male_count, female_count):
+    """그룹 인원 구성이 정원과 비율 조건에 맞는지"""
+    return (
+        male_count >= 1 and female_count >= 1
+        and male_count + female_count <= GROUP_MAX_SIZE
+        and max(male_count, female_count) <= GROUP_MAX_RATIO * min(male_count, female_count)
+    )
+
+def plan_group_sizes(male_total, female_total):
+    """대기 인원으로 만들 그룹 구성 목록 [(남, 여), ...]
+
+    먼저 3명 그룹(남2여1 / 남1여2)을 가능한 만큼 만들고(그룹 수 = min(남, 여, 전체 // 3)),
+    남은 사람은 정원과 비율을 지키는 범위에서 앞 그룹부터 채운다.
+    """
+    count = min(male_total, female_total, (male_total + female_total) // GROUP_MIN_SIZE)
+    # 남2여1 그룹 수 - 여자가 부족한 만큼만 남2여1로 만듦
+    male_heavy = max(0, 2 * count - female_total)
+    groups = [[2, 1] for _ in range(male_heavy)] + [[1, 2] for _ in range(count - male_heavy)]
+    
+    males_left = male_total - (count + male_heavy)
+    females_left = female_total - (2 * count - male_heavy)
+    for group in groups:
+        if not males_left and not females_left:
+            break
+        while True:
+            # 그룹 안에서 적은 쪽 성별부터 넣어 비율을 맞춤 (0: 남, 1: 여)
+            for side in ((0, 1) if group[0] <= group[1] else (1, 0)):
+                left = males_left if side == 0 else females_left
+                trial = list(group)
+                trial[side] += 1
+                if left and _group_fits(*trial):
+                    group[side] += 1
+                    if side == 0:
+                        males_left -= 1
+                    else:
+                        females_left -= 1
+                    break
+            else:
+                break
+    return [tuple(group) for group in groups]
+
 def try_group_matching(matching_data):
-    """그룹 매칭 시도 (3-6명, 남녀 비율 유지)"""
-    male_queue = matching_data.get('male', [])
-    female_queue = matching_data.get('female', [])
+    """그룹 매칭 시도 (3-6명, 남녀 비율 유지) - GROUP_MATCHING_FILE, GROUP_ROOMS_FILE 잠금 안에서 호출
+
+    대기열 전체로 만들 수 있는 그룹을 한 번에 모두 만들고, 먼저 기다린 사람부터 앞 그룹에 배정한다.
+    만든 그룹 목록을 돌려준다.
+    """
+    male_queue = deque(matching_data.get('male', []))
+    female_queue = deque(matching_data.get('female', []))
     
-    total_count = len(male_queue) + len(female_queue)
+    plan = plan_group_sizes(len(male_queue), len(female_queue))
+    if not plan:
+        return []
     
-    # 최소 3명 이상이어야 그룹 매칭 가능
-    if total_count < 3:
-        return None
+    group_rooms = load_group_rooms()
+    groups = matching_data.setdefault('groups', [])
+    results = []
+    for male_count, female_count in plan:
+        # 그룹 멤버 선택 (대기열 앞에서부터)
+        group_members = [male_queue.popleft() for _ in range(male_count)]
+        group_members += [female_queue.popleft() for _ in range(female_count)]
+        
+        # 그룹 채팅방 생성
+        room_id = new_room_id('group')
+        group_room_name = f"그룹 {len(groups) + 1}"
+        created_at = time.time()
+        group_rooms[room_id] = {
+            'room_id': room_id,
+            'room_name': group_room_name,
+            'type': 'group',
+            'members': group_members,
+            'created_at': created_at,
+            'active': True
+        }
+        
+        # 완성된 그룹을 대기열에 저장
+        groups.append({
+            'room_id': room_id,
+            'room_name': group_room_name,
+            'members': group_members,
+            'created_at': created_at
+        })
+        
+        print(f"[그룹 매칭 성공] {group_room_name} 생성 - {male_count}남 {female_count}여")
+        results.append({
+            'room_id': room_id,
+            'room_name': group_room_name,
+            'members': group_members,
+            'male_count': male_count,
+            'female_count': female_count
+        })
     
-    # 가능한 그룹 조합 찾기 (3-6명)
-    for group_size in range(3, 7):
-        for male_count in range(1, group_size):
-            female_count = group_size - male_count
-            
-            # 비율 체크: 5:5 ~ 2:1 범위
-            ratio = max(male_count, female_count) / min(male_count, female_count)
-            if ratio <= 2 and male_count <= len(male_queue) and female_count <= len(female_queue):
-                # 그룹 멤버 선택
-                group_members = []
-                
-                # 남자 멤버 선택
-                for i in range(male_count):
-                    if male_queue:
-                        group_members.append(male_queue.pop(0))
-                
-                # 여자 멤버 선택
-                for i in range(female_count):
-                    if female_queue:
-                        group_members.append(female_queue.pop(0))
-                
-                if len(group_members) == group_size:
-                    # 그룹 채팅방 생성
-                    room_id = f"group_{int(time.time())}_{group_size}"
-                    group_room_name = f"그룹 {len(matching_data.get('groups', [])) + 1}"
-                    
-                    # 그룹 채팅방 데이터 생성
-                    group_room = {
-                        'room_id': room_id,
-                        'room_name': group_room_name,
-                        'type': 'group',
-                        'members': group_members,
-                        'created_at': time.time(),
-                        'active': True,
-                        'message_count': 0
-                    }
-                    
-                    # 그룹 채팅방 저장
-                    group_rooms = load_group_rooms()
-                    group_rooms[room_id] = group_room
-                    save_group_rooms(group_rooms)
-                    
-                    # 완성된 그룹을 대기열에 저장
-                    if 'groups' not in matching_data:
-                        matching_data['groups'] = []
-                    
-                    matching_data['groups'].append({
-                        'room_id': room_id,
-                        'room_name': group_room_name,
-                        'members': group_members,
-                        'created_at': time.time()
-                    })
-                    
-                    # 대기열 업데이트
-                    matching_data['male'] = male_queue
-                    matching_data['female'] = female_queue
-                    save_group_matching(matching_data)
-                    
-                    print(f"[그룹 매칭 성공] {group_room_name} 생성 - {male_count}남 {female_count}여")
-                    
-                    return {
-                        'room_id': room_id,
-                        'room_name': group_room_name,
-                        'members': group_members,
-                        'male_count': male_count,
-                        'female_count': female_count
-                    }
+    # 그룹 채팅방 저장 후 대기열 업데이트
+    save_group_rooms(group_rooms, changed=[result['room_id'] for result in results])
+    matching_data['male'] = list(male_queue)
+    matching_data['female'] = list(female_queue)
+    save_group_matching(matching_data)
     
-    return None
+    for result in results:
+        publish_event(
+            [m.get('student_id') for m in result['members']],
+            'match', {'type': 'group', 'room_id': result['room_id']}
+        )
+    return results
+
+# 백그라운드 매칭 스케줄러
+# 매칭 요청이 들어올 때만 매칭하지 않고, 대기열을 계속 확인해 매칭하고 오래 기다린 사람은 대기열에서 뺀다.
+# 워커마다 하나씩 돌지만 파일 잠금 안에서 매칭하므로 같은 사람이 두 번 매칭되지 않는다.
+MATCHMAKER_INTERVAL = 1  # 매칭 주기 (초)
+MATCHING_WAIT_TIMEOUT = int(os.environ.get('MATCHING_WAIT_TIMEOUT', '600'))  # 대기 만료 시간 (초)
+MATCHING_STATUS_MAX_WAIT = 25  # 상태 확인 요청을 붙잡아 두는 최대 시간 (초)
+MATCHING_STATUS_RECHECK = 2  # 롱폴링 중 상태를 다시 확인하는 간격 (초, 다른 워커에서 매칭된 경우 대비)
+
+def expire_group_waiters(cutoff):
+    """오래 기다린 그룹 매칭 대기자 제거 (GROUP_MATCHING_FILE 잠금 안에서 호출) - 제거된 대기 정보 목록"""
+    matching_data = load_group_matching()
+    expired = [u for gender in ('male', 'female') for u in matching_data[gender] if u.get('join_time', 0) < cutoff]
+    if expired:
+        for gender in ('male', 'female'):
+            matching_data[gender] = [u for u in matching_data[gender] if u.get('join_time', 0) >= cutoff]
+        save_group_matching(matching_data)
+    return expired
+
+def run_matchmaker():
+    """대기열 한 번 정리 및 매칭 (1:1, 그룹)"""
+    cutoff = time.time() - MATCHING_WAIT_TIMEOUT
+    
+    # 대기자가 없으면 잠그지 않고 넘어감
+    if load_matching_queue().get('waiting'):
+        with data_transaction(MATCHING_QUEUE_FILE, CHAT_ROOMS_FILE):
+            expired = expire_matching_waiters(cutoff)
+            try_matching(load_matching_queue())
+        for waiting_user in expired:
+            print(f"[매칭] {waiting_user.get('nickname')}님 대기 시간 만료")
+        publish_event([u.get('student_id') for u in expired], 'match_expired', {'type': 'dm'})
+    
+    group_data = load_group_matching()
+    if group_data.get('male') or group_data.get('female'):
+        with data_transaction(GROUP_MATCHING_FILE, GROUP_ROOMS_FILE):
+            expired = expire_group_waiters(cutoff)
+            try_group_matching(load_group_matching())
+        for waiting_user in expired:
+            print(f"[그룹 매칭] {waiting_user.get('nickname')}님 대기 시간 만료")
+        publish_event([u.get('student_id') for u in expired], 'match_expired', {'type': 'group'})
+
+def _matchmaker_loop():
+    """백그라운드 매칭 스레드"""
+    while True:
+        time.sleep(MATCHMAKER_INTERVAL)
+        try:
+            run_matchmaker()
+        except Exception as e:
+            print(f"[매칭] 백그라운드 매칭 실패: {e}")
+
+def start_matchmaker():
+    """백그라운드 매칭 스레드 시작 (매칭 요청이 처음 들어올 때)"""
+    start_background_thread('matchmaker', _matchmaker_loop)
+
+def _latest_room_since(student_id, room_type, since):
+    """since 이후에 만들어진 사용자의 활성 채팅방 중 가장 최근 것의 ID (없으면 None)"""
+    rooms = [
+        room for kind, _, room in list_user_rooms(student_id)
+        if kind == room_type and room.get('active', True) != False and room.get('created_at', 0) >= since
+    ]
+    return max(rooms, key=lambda room: room.get('created_at', 0))['room_id'] if rooms else None
+
+def wait_matching_status(student_id, check, wait):
+    """매칭 상태 롱폴링 - check()가 대기 중이 아닌 상태를 돌려주거나 wait초가 지날 때까지 기다림
+
+    매칭/만료 이벤트가 오면 바로 다시 확인하고, 이벤트가 다른 워커에만 전달된 경우를 대비해
+    MATCHING_STATUS_RECHECK초마다도 다시 확인한다.
+    """
+    # 확인과 대기 사이에 온 이벤트를 놓치지 않도록 먼저 구독
+    subscription = subscribe_events(student_id) if wait > 0 else None
+    try:
+        deadline = time.time() + wait
+        while True:
+            status = check()
+            remaining = deadline - time.time()
+            if status['state'] != 'waiting' or remaining <= 0:
+                return status
+            try:
+                subscription.get(timeout=min(remaining, MATCHING_STATUS_RECHECK))
+            except queue.Empty:
+                pass
+    finally:
+        if subscription is not None:
+            unsubscribe_events(student_id, subscription)
+
+def _status_wait_seconds():
+    """요청의 wait 파라미터 (롱폴링 시간, 0이면 바로 응답)"""
+    return max(0, min(request.args.get('wait', 0, type=float), MATCHING_STATUS_MAX_WAIT))
 
 @app.route('/api/group-matching/start', methods=['POST'])
+@login_required
+@data_transaction(GROUP_MATCHING_FILE, GROUP_ROOMS_FILE)
 def start_group_matching():
     """그룹 매칭 시작"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     if not current_student_id:
         return jsonify({'success': False, 'message': '사용자 정보를 찾을 수 없습니다.'}), 400
     
     # 익명 프로필 확인
-    anon_profiles = load_anon_profiles()
-    user_profile = next((p for p in anon_profiles if p.get('student_id') == current_student_id), None)
+    user_profile = find_anon_profile(current_student_id)
     
     if not user_profile:
         return jsonify({'success': False, 'message': '익명 프로필을 먼저 설정해주세요.'}), 400
@@ -1783,11 +5303,16 @@ def start_group_matching():
     
     # 대기열 저장
     save_group_matching(matching_data)
+    start_matchmaker()
     
     print(f"[그룹 매칭] {user_info['nickname']} ({user_info['gender']}) 대기열 추가")
     
     # 그룹 매칭 시도
-    group_result = try_group_matching(matching_data)
+    group_result = next(
+        (grp for grp in try_group_matching(matching_data)
+         if any(m.get('student_id') == current_student_id for m in grp['members'])),
+        None
+    )
     
     if group_result:
         return jsonify({
@@ -1800,6 +5325,7 @@ def start_group_matching():
             'success': True,
             'matched': False,
             'message': '그룹 매칭 대기 중입니다.',
+            'joined_at': user_info['join_time'],
             'waiting_count': {
                 'male': len(matching_data['male']),
                 'female': len(matching_data['female'])
@@ -1807,13 +5333,11 @@ def start_group_matching():
         })
 
 @app.route('/api/group-matching/cancel', methods=['POST'])
+@login_required
+@data_transaction(GROUP_MATCHING_FILE)
 def cancel_group_matching():
     """그룹 매칭 취소"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     if not current_student_id:
@@ -1837,81 +5361,66 @@ def cancel_group_matching():
     })
 
 @app.route('/api/group-matching/status', methods=['GET'])
+@login_required
 def get_group_matching_status():
-    """그룹 매칭 상태 확인"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    """그룹 매칭 상태 확인
+
+    state는 1:1 매칭 상태 확인과 같고(since 이후 만들어진 그룹 방이 있으면 matched), wait=<초>로 롱폴링할 수 있다.
+    """
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     if not current_student_id:
         return jsonify({'success': False, 'message': '사용자 정보를 찾을 수 없습니다.'}), 400
     
-    # 그룹 매칭 대기열 로드
-    matching_data = load_group_matching()
-    
-    # 사용자가 대기열에 있는지 확인
-    in_male_queue = any(u.get('student_id') == current_student_id for u in matching_data['male'])
-    in_female_queue = any(u.get('student_id') == current_student_id for u in matching_data['female'])
+    since = request.args.get('since', 0, type=float)
     
-    return jsonify({
-        'success': True,
-        'in_queue': in_male_queue or in_female_queue,
-        'waiting_count': {
-            'male': len(matching_data['male']),
-            'female': len(matching_data['female'])
+    def check():
+        # 그룹 매칭 대기열 로드
+        matching_data = load_group_matching()
+        
+        # 사용자가 대기열에 있는지 확인
+        in_male_queue = any(u.get('student_id') == current_student_id for u in matching_data['male'])
+        in_female_queue = any(u.get('student_id') == current_student_id for u in matching_data['female'])
+        
+        status = {
+            'in_queue': in_male_queue or in_female_queue,
+            'waiting_count': {
+                'male': len(matching_data['male']),
+                'female': len(matching_data['female'])
+            }
         }
-    })
+        if status['in_queue']:
+            status['state'] = 'waiting'
+        else:
+            room_id = _latest_room_since(current_student_id, 'group', since)
+            status.update({'state': 'matched', 'room_id': room_id} if room_id else {'state': 'idle'})
+        return status
+    
+    start_matchmaker()
+    status = wait_matching_status(current_student_id, check, _status_wait_seconds())
+    return jsonify({'success': True, **status})
 
 @app.route('/api/group-rooms', methods=['GET'])
+@login_required
 def get_group_rooms():
     """사용자의 그룹 채팅방 목록 조회"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     if not current_student_id:
         return jsonify({'success': False, 'message': '사용자 정보를 찾을 수 없습니다.'}), 400
     
-    # 그룹 채팅방 로드
-    group_rooms = load_group_rooms()
-    
-    # 사용자가 참여한 그룹 채팅방만 필터링
-    user_rooms = []
-    for room_id, room_data in group_rooms.items():
-        if room_data.get('active', True):
-            members = room_data.get('members', [])
-            if any(member.get('student_id') == current_student_id for member in members):
-                # 읽지 않은 메시지 수 계산
-                unread_count = get_unread_message_count(current_student_id, room_id)
-                
-                user_rooms.append({
-                    'room_id': room_id,
-                    'room_name': room_data.get('room_name', ''),
-                    'type': 'group',
-                    'member_count': len(members),
-                    'created_at': room_data.get('created_at', 0),
-                    'unread_count': unread_count
-                })
-    
     return jsonify({
         'success': True,
-        'rooms': user_rooms
+        'rooms': build_room_list(current_student_id, 'group')
     })
 
 @app.route('/api/group-messages/<room_id>', methods=['GET'])
+@login_required
 def get_group_messages(room_id):
     """그룹 채팅방 메시지 조회"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     if not current_student_id:
@@ -1925,27 +5434,17 @@ def get_group_messages(room_id):
         return jsonify({'success': False, 'message': '채팅방을 찾을 수 없습니다.'}), 404
     
     # 사용자가 이 그룹에 참여할 수 있는지 확인
-    members = room_data.get('members', [])
-    if not any(member.get('student_id') == current_student_id for member in members):
+    if not is_room_member(room_id, current_student_id):
         return jsonify({'success': False, 'message': '이 그룹에 참여할 권한이 없습니다.'}), 403
     
     # 메시지 로드
-    messages = load_chat_messages()
-    room_messages = messages.get(room_id, [])
-    
-    return jsonify({
-        'success': True,
-        'messages': room_messages
-    })
+    return chat_messages_response(room_id)
 
 @app.route('/api/group-messages/<room_id>', methods=['POST'])
+@login_required
 def send_group_message(room_id):
-    """그룹 채팅방 메시지 전송"""
-    # 로그인 체크
-    if 'user' not in session or not session.get('user'):
-        return jsonify({'success': False, 'message': '로그인이 필요합니다.'}), 401
-    
-    current_user = session.get('user', {})
+    """그룹 채팅방 메시지 전송 (채팅방 로그에만 덧붙이고 그룹 채팅방 파일은 바꾸지 않음)"""
+    current_user = g.user
     current_student_id = current_user.get('student_id')
     
     if not current_student_id:
@@ -1959,11 +5458,9 @@ def send_group_message(room_id):
         return jsonify({'success': False, 'message': '채팅방을 찾을 수 없습니다.'}), 404
     
     # 사용자가 이 그룹에 참여할 수 있는지 확인
-    members = room_data.get('members', [])
-    user_member = next((member for member in members if member.get('student_id') == current_student_id), None)
-    
-    if not user_member:
+    if not is_room_member(room_id, current_student_id):
         return jsonify({'success': False, 'message': '이 그룹에 참여할 권한이 없습니다.'}), 403
+    user_member = next(member for member in room_data.get('members', []) if member.get('student_id') == current_student_id)
     
     # 메시지 데이터 수집
     data = request.get_json()
@@ -1974,7 +5471,7 @@ def send_group_message(room_id):
     
     # 메시지 생성
     message = {
-        'id': f"group_{room_id}_{int(time.time() * 1000)}",
+        'id': new_id(f"group_{room_id}_"),
         'room_id': room_id,
         'sender_id': current_student_id,
         'sender_nickname': user_member.get('nickname', '익명'),
@@ -1984,20 +5481,13 @@ def send_group_message(room_id):
     }
     
     # 메시지 저장
-    messages = load_chat_messages()
-    if room_id not in messages:
-        messages[room_id] = []
-    
-    messages[room_id].append(message)
-    save_chat_messages(messages)
-    
-    # 그룹 채팅방 메시지 수 증가
-    room_data['message_count'] = room_data.get('message_count', 0) + 1
-    group_rooms[room_id] = room_data
-    save_group_rooms(group_rooms)
+    if not append_chat_message(room_id, message):
+        return jsonify({'success': False, 'message': '메시지 저장 중 오류가 발생했습니다.'}), 500
     
     print(f"[그룹 메시지] {room_id}: {user_member.get('nickname')} - {message_text}")
     
+    publish_room_message(room_id, message)
+    
     return jsonify({
         'success': True,
         'message': '메시지가 전송되었습니다.',
@@ -3,7 +3,7 @@
 // ===== 전역 변수 =====
 let currentBoard = 'free_board'; // 기본값을 자유게시판으로 설정
 let currentDepartment = 'free';
-let posts = [];
+let posts = []; // 지금까지 불러온 게시글 (목록, 검색, 상세 보기에서 ID로 찾음)
 let comments = [];
 let expandedDepartments = { 'free': true }; // 자유게시판은 기본으로 열린 상태
 
@@ -124,15 +124,20 @@ async function toggleLike(postId) {
     }
   }
   
-  // 서버에 좋아요 수 저장
+  // 서버에 좋아요 토글 요청 (좋아요 수는 서버가 계산한 값으로 맞춤)
   try {
-    await fetch(`/api/board-posts/${postId}/like`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      },
-      body: JSON.stringify({ likes: post.likes })
+    const response = await fetch(`/api/board-posts/${postId}/like`, {
+      method: 'POST'
     });
+    const result = await response.json();
+    if (result.success) {
+      post.likes = result.likes;
+      if (result.liked) {
+        likedPosts.add(postId);
+      } else {
+        likedPosts.delete(postId);
+      }
+    }
   } catch (error) {
     console.error('좋아요 서버 저장 오류:', error);
   }
@@ -237,15 +242,20 @@ async function toggleCommentLike(commentId) {
     }
   }
   
-  // 서버에 댓글 좋아요 수 저장
+  // 서버에 댓글 좋아요 토글 요청 (좋아요 수는 서버가 계산한 값으로 맞춤)
   try {
-    await fetch(`/api/board-comments/${commentId}/like`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      },
-      body: JSON.stringify({ likes: comment.likes })
+    const response = await fetch(`/api/board-comments/${commentId}/like`, {
+      method: 'POST'
     });
+    const result = await response.json();
+    if (result.success) {
+      comment.likes = result.likes;
+      if (result.liked) {
+        likedComments.add(commentId);
+      } else {
+        likedComments.delete(commentId);
+      }
+    }
   } catch (error) {
     console.error('댓글 좋아요 서버 저장 오류:', error);
   }
@@ -501,38 +511,119 @@ function renderDepartmentTree() {
 }
 
 // ===== 게시글 필터링 및 표시 =====
+// 게시판 필터링과 정렬은 서버에서 처리하고, 한 페이지씩 next_cursor를 따라 이어서 불러옴
+// 검색은 서버 색인으로 처리 (입력이 멈춘 뒤 한 번만 요청)
+const POSTS_PAGE_SIZE = 20;
+let listedPosts = []; // 목록에 표시 중인 게시글 (서버 정렬 순서)
+let postsCursor = null;
+let postsHasMore = false;
+let postsLoading = false;
+let postsRequestId = 0;
+let searchTimer = null;
+let searchRequestId = 0;
+
 function filterAndDisplayPosts() {
-  const searchTerm = document.getElementById('searchInput').value.toLowerCase();
-  const sortBy = document.getElementById('sortSelect').value;
+  const searchTerm = document.getElementById('searchInput').value.trim();
+  
+  clearTimeout(searchTimer);
+  if (searchTerm) {
+    // 검색 중에는 목록 이어 불러오기를 멈춤
+    postsRequestId++;
+    postsLoading = false;
+    updateLoadMoreButton();
+    searchTimer = setTimeout(() => searchPostsOnServer(searchTerm), 250);
+    return;
+  }
+  // 검색어를 지웠으면 진행 중인 검색 결과는 버림
+  searchRequestId++;
   
-  let filteredPosts = posts.filter(post => {
-    // 게시판 필터 (새로운 boardId 구조에 맞게)
-    if (post.boardId !== currentBoard) return false;
-    
-    // 검색 필터
-    if (searchTerm) {
-      const matchesTitle = post.title.toLowerCase().includes(searchTerm);
-      const matchesTags = post.tags && post.tags.some(tag => tag.toLowerCase().includes(searchTerm));
-      if (!matchesTitle && !matchesTags) return false;
-    }
-    
-    return true;
+  loadPostsPage(true);
+}
+
+// 서버에서 받은 게시글을 posts에 반영 (이미 있으면 내용만 갱신해 목록의 같은 객체를 유지)
+function rememberPosts(serverPosts) {
+  return serverPosts.map(serverPost => {
+    const existing = posts.find(p => p.id === serverPost.id);
+    if (existing) return Object.assign(existing, serverPost);
+    posts.push(serverPost);
+    return serverPost;
   });
+}
+
+// 현재 게시판/정렬의 게시글 한 페이지 로드 (reset이면 첫 페이지부터)
+async function loadPostsPage(reset) {
+  if (!reset && (postsLoading || !postsHasMore)) return;
+  
+  const requestId = ++postsRequestId;
+  postsLoading = true;
   
-  // 정렬
-  filteredPosts.sort((a, b) => {
-    switch (sortBy) {
-      case 'popular':
-        return b.likes - a.likes;
-      case 'views':
-        return b.views - a.views;
-      case 'latest':
-      default:
-        return new Date(b.createdAt) - new Date(a.createdAt);
+  try {
+    const params = new URLSearchParams({
+      boardId: currentBoard,
+      sort: document.getElementById('sortSelect').value,
+      limit: POSTS_PAGE_SIZE
+    });
+    if (!reset && postsCursor) params.set('cursor', postsCursor);
+    
+    const response = await fetch(`/api/board-posts?${params}`);
+    const result = await response.json();
+    
+    // 그사이 게시판이나 정렬이 바뀌었으면 무시
+    if (requestId !== postsRequestId) return;
+    
+    if (result.success && result.posts) {
+      const pagePosts = rememberPosts(result.posts);
+      rebuildAnonymousMap(pagePosts, []);
+      
+      // 이어 불러올 기준 게시글이 삭제되었으면 서버가 첫 페이지를 돌려줌 (reset)
+      if (reset || result.reset) {
+        listedPosts = pagePosts;
+      } else {
+        // 페이지 사이에 순위가 바뀐 게시글은 한 번만 표시
+        listedPosts = [...listedPosts, ...pagePosts.filter(p => !listedPosts.includes(p))];
+      }
+      postsCursor = result.next_cursor;
+      postsHasMore = result.has_more;
+      displayPosts(listedPosts);
     }
-  });
+  } catch (error) {
+    console.error('게시글 목록 로드 실패:', error);
+  } finally {
+    if (requestId === postsRequestId) {
+      postsLoading = false;
+      updateLoadMoreButton();
+    }
+  }
+}
+
+// 더 보기 버튼 (검색 중이거나 상세 화면에서는 숨김)
+function updateLoadMoreButton() {
+  const button = document.getElementById('loadMoreBtn');
+  if (!button) return;
+  const searching = document.getElementById('searchInput').value.trim() !== '';
+  const listVisible = document.getElementById('postsList').style.display !== 'none';
+  button.style.display = postsHasMore && !searching && listVisible ? 'block' : 'none';
+  button.disabled = postsLoading;
+}
+
+async function searchPostsOnServer(searchTerm) {
+  const requestId = ++searchRequestId;
   
-  displayPosts(filteredPosts);
+  try {
+    const params = new URLSearchParams({ q: searchTerm, boardId: currentBoard, limit: 50 });
+    const response = await fetch(`/api/board-posts/search?${params}`);
+    const result = await response.json();
+    
+    // 그사이 검색어가 바뀌었으면 무시
+    if (requestId !== searchRequestId) return;
+    
+    if (result.success && result.posts) {
+      // 상세 보기와 좋아요에서 찾을 수 있도록 posts에도 반영 (관련도순 유지)
+      displayPosts(rememberPosts(result.posts));
+    }
+  } catch (error) {
+    console.error('게시글 검색 실패:', error);
+  }
 }
 
 // ===== 게시글 표시 =====
@@ -602,18 +693,17 @@ async function viewPost(postId) {
   // 현재 게시글 ID 저장 (좋아요 업데이트용)
   window.currentPostId = postId;
   
-  // 조회수 증가
+  // 조회수 증가 (서버에서 증가시킨 값으로 맞춤)
   post.views += 1;
   
-  // 조회수를 서버에 저장
   try {
-    await fetch(`/api/board-posts/${postId}/view`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      },
-      body: JSON.stringify({ views: post.views })
+    const response = await fetch(`/api/board-posts/${postId}/view`, {
+      method: 'POST'
     });
+    const result = await response.json();
+    if (result.success) {
+      post.views = result.views;
+    }
   } catch (error) {
     console.error('조회수 서버 저장 오류:', error);
   }
@@ -625,12 +715,13 @@ async function viewPost(postId) {
   document.getElementById('postsList').style.display = 'none';
   document.getElementById('emptyState').style.display = 'none';
   document.getElementById('loadingState').style.display = 'none';
+  updateLoadMoreButton();
   
   // 상세 화면 표시
   document.getElementById('postDetailView').style.display = 'block';
   
   // 해당 게시글의 댓글들 가져오기
-  const postComments = comments.filter(c => c.postId === postId);
+  const postComments = await loadPostCommentsFromServer(postId);
   
   // 상세 화면 렌더링
   renderPostDetail(post, postComments);
@@ -725,12 +816,9 @@ async function submitEdit(event) {
     const result = await response.json();
     
     if (result.success) {
-      // 서버에서 게시글 다시 로드
-      posts = await loadPostsFromServer();
-      comments = await loadCommentsFromServer();
-      
-      // 익명 번호 매핑 재구성
-      rebuildAnonymousMap(posts, comments);
+      // 수정된 게시글 반영
+      rememberPosts([result.post]);
+      await loadPostCommentsFromServer(postId);
       
       // localStorage 활동 기록 업데이트
       const currentUser = localStorage.getItem('currentUser');
@@ -794,9 +882,10 @@ async function deletePost(postId) {
     const result = await response.json();
     
     if (result.success) {
-      // 서버에서 게시글과 댓글 다시 로드
-      posts = await loadPostsFromServer();
-      comments = await loadCommentsFromServer();
+      // 삭제된 게시글과 댓글을 목록에서 제거
+      posts = posts.filter(p => p.id !== postId);
+      listedPosts = listedPosts.filter(p => p.id !== postId);
+      comments = comments.filter(c => c.postId !== postId);
       
       // localStorage에서 삭제 (마이페이지 활동 기록)
       const currentUser = localStorage.getItem('currentUser');
@@ -847,12 +936,9 @@ async function deleteComment(commentId, postId) {
     const result = await response.json();
     
     if (result.success) {
-      // 서버에서 게시글과 댓글 다시 로드
-      posts = await loadPostsFromServer();
-      comments = await loadCommentsFromServer();
-      
-      // 익명 번호 매핑 재구성
-      rebuildAnonymousMap(posts, comments);
+      // 서버에서 게시글(댓글 수)과 해당 게시글의 댓글 다시 로드
+      await loadPostFromServer(postId);
+      await loadPostCommentsFromServer(postId);
       
       // localStorage에서 삭제 (마이페이지 활동 기록)
       const currentUser = localStorage.getItem('currentUser');
@@ -1018,7 +1104,14 @@ function renderPostDetail(post, postComments) {
 function backToList() {
   document.getElementById('postDetailView').style.display = 'none';
   document.getElementById('postsList').style.display = 'block';
-  filterAndDisplayPosts();
+  
+  // 검색 중이면 다시 검색하고, 아니면 불러온 목록을 그대로 표시 (조회수/좋아요는 같은 객체라 반영되어 있음)
+  if (document.getElementById('searchInput').value.trim()) {
+    filterAndDisplayPosts();
+  } else {
+    displayPosts(listedPosts);
+    updateLoadMoreButton();
+  }
 }
 
 // ===== 상세 화면 댓글 작성 =====
@@ -1076,26 +1169,13 @@ async function submitDetailComment(event, postId) {
     const result = await response.json();
     
     if (result.success) {
-      // 서버에서 게시글과 댓글 다시 로드
-      comments = await loadCommentsFromServer();
+      // 서버에서 해당 게시글의 댓글 다시 로드
+      await loadPostCommentsFromServer(postId);
       
-      // 해당 게시글의 댓글 수 증가
+      // 해당 게시글의 댓글 수 증가 (서버에서는 댓글 작성 시 자동으로 증가)
       const post = posts.find(p => p.id === postId);
       if (post) {
         post.comments++;
-        
-        // 서버에 게시글 댓글 수 업데이트
-        try {
-          await fetch(`/api/board-posts/${postId}`, {
-            method: 'PUT',
-            headers: {
-              'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ comments: post.comments })
-          });
-        } catch (error) {
-          console.error('게시글 댓글 수 업데이트 오류:', error);
-        }
       }
       
       // 마이페이지 활동 기록에 추가
@@ -1105,7 +1185,7 @@ async function submitDetailComment(event, postId) {
           const activity = JSON.parse(localStorage.getItem(`activity_${currentUser}`) || '{"posts":[],"comments":[],"likes":[],"commentLikes":[]}');
           
           activity.comments.unshift({
-            id: newComment.id,
+            id: result.comment.id,
             content: newComment.content,
             postTitle: post ? post.title : '삭제된 게시글',
             postId: postId,
@@ -1142,20 +1222,39 @@ function saveCommentsToLocalStorage() {
   console.log('댓글은 서버에 저장됩니다.');
 }
 
-async function loadCommentsFromServer() {
+// 게시글 하나의 댓글만 서버에서 로드해 comments에 반영
+async function loadPostCommentsFromServer(postId) {
   try {
-    const response = await fetch('/api/board-comments');
-    const result = await response.json();
+    const postComments = [];
+    let cursor = null;
     
-    if (result.success && result.comments) {
-      console.log('서버에서 댓글 로드됨:', result.comments.length + '개');
-      // 서버 댓글과 mockComments 병합
-      return [...result.comments, ...mockComments];
-    }
+    do {
+      const params = new URLSearchParams({ postId: postId, limit: 200 });
+      if (cursor) params.set('cursor', cursor);
+      
+      const response = await fetch(`/api/board-comments?${params}`);
+      const result = await response.json();
+      if (!result.success || !result.comments) break;
+      
+      postComments.push(...result.comments);
+      cursor = result.has_more ? result.next_cursor : null;
+    } while (cursor);
+    
+    console.log(`서버에서 댓글 로드됨 (${postId}):`, postComments.length + '개');
+    
+    // 다른 게시글의 댓글은 그대로 두고 이 게시글의 댓글만 교체 (mockComments 유지)
+    comments = [
+      ...comments.filter(c => c.postId !== postId),
+      ...postComments,
+      ...mockComments.filter(c => c.postId === postId)
+    ];
+    
+    // 익명 번호 매핑 재구성
+    rebuildAnonymousMap(posts.filter(p => p.id === postId), postComments);
   } catch (e) {
     console.error('서버에서 댓글 로드 실패:', e);
   }
-  return [...mockComments];
+  return comments.filter(c => c.postId === postId);
 }
 
 function loadCommentsFromLocalStorage() {
@@ -1311,7 +1410,7 @@ async function submitPost(event) {
   // 현재 사용자의 학번 (작성자 확인용)
   const currentUserStudentId = userProfile ? userProfile.studentId : null;
   
-  const postId = 'p' + Date.now();
+  const postId = 'p' + Date.now(); // 임시 ID - 실제 ID는 서버가 정해서 응답으로 돌려줌
   
   // 작성자명 설정 (항상 익명)
   const anonymousId = currentUserStudentId ? getAnonymousIdForPost(postId, currentUserStudentId) : 1;
@@ -1350,8 +1449,7 @@ async function submitPost(event) {
     const result = await response.json();
     
     if (result.success) {
-      // 서버에서 게시글 다시 로드
-      posts = await loadPostsFromServer();
+      // 목록은 아래 filterAndDisplayPosts에서 첫 페이지부터 다시 불러옴
       
       // 마이페이지 활동 기록에 추가
       const currentUser = localStorage.getItem('currentUser');
@@ -1360,7 +1458,7 @@ async function submitPost(event) {
           const activity = JSON.parse(localStorage.getItem(`activity_${currentUser}`) || '{"posts":[],"comments":[],"likes":[],"commentLikes":[]}');
           
           activity.posts.unshift({
-            id: newPost.id,
+            id: result.post.id,
             title: newPost.title,
             content: newPost.content,
             category: newPost.category,
@@ -1398,20 +1496,21 @@ function savePostsToLocalStorage() {
   console.log('게시글은 서버에 저장됩니다.');
 }
 
-async function loadPostsFromServer() {
+// 게시글 하나를 서버에서 로드해 posts에 반영 (목록에 아직 없는 게시글 열기, 댓글 수 갱신)
+async function loadPostFromServer(postId) {
   try {
-    const response = await fetch('/api/board-posts');
+    const response = await fetch(`/api/board-posts/${encodeURIComponent(postId)}`);
     const result = await response.json();
     
-    if (result.success && result.posts) {
-      console.log('서버에서 게시글 로드됨:', result.posts.length + '개');
-      // 서버 게시글과 mockPosts 병합
-      return [...result.posts, ...mockPosts];
+    if (result.success && result.post) {
+      const [post] = rememberPosts([result.post]);
+      rebuildAnonymousMap([post], []);
+      return post;
     }
   } catch (e) {
     console.error('서버에서 게시글 로드 실패:', e);
   }
-  return [...mockPosts];
+  return posts.find(p => p.id === postId) || null;
 }
 
 function loadPostsFromLocalStorage() {
@@ -1429,11 +1528,26 @@ function loadPostsFromLocalStorage() {
   return [...mockPosts];
 }
 
+async function loadLikesFromServer() {
+  try {
+    const response = await fetch('/api/board-likes');
+    const result = await response.json();
+    
+    if (result.success) {
+      likedPosts = new Set(result.posts);
+      likedComments = new Set(result.comments);
+    }
+  } catch (e) {
+    console.error('서버에서 좋아요 기록 로드 실패:', e);
+  }
+}
+
 // ===== 이벤트 리스너 =====
 document.addEventListener('DOMContentLoaded', async function() {
-  // 서버에서 게시글과 댓글 로드
-  posts = await loadPostsFromServer();
-  comments = await loadCommentsFromServer();
+  // 좋아요 기록 로드 (게시글은 아래에서 현재 게시판의 첫 페이지만, 댓글은 게시글을 열 때 해당 게시글 것만 로드)
+  posts = [...mockPosts];
+  comments = [...mockComments];
+  await loadLikesFromServer();
   
   // 익명 번호 매핑 재구성
   rebuildAnonymousMap(posts, comments);
@@ -1446,8 +1560,8 @@ document.addEventListener('DOMContentLoaded', async function() {
   const commentId = urlParams.get('commentId');
   
   if (postId && source === 'mypage') {
-    // 해당 게시글 찾기
-    const post = posts.find(p => p.id === postId);
+    // 해당 게시글 찾기 (목록 페이지에 없을 수 있으므로 서버에서 직접)
+    const post = await loadPostFromServer(postId);
     if (post) {
       viewPost(postId);
       
@@ -1474,6 +1588,14 @@ document.addEventListener('DOMContentLoaded', async function() {
   document.getElementById('searchInput').addEventListener('input', filterAndDisplayPosts);
   document.getElementById('sortSelect').addEventListener('change', filterAndDisplayPosts);
   
+  // 더 보기 버튼이 화면에 보이면 다음 페이지 자동 로드 (무한 스크롤)
+  const loadMoreBtn = document.getElementById('loadMoreBtn');
+  if (loadMoreBtn && 'IntersectionObserver' in window) {
+    new IntersectionObserver(entries => {
+      if (entries.some(entry => entry.isIntersecting)) loadPostsPage(false);
+    }, { rootMargin: '200px' }).observe(loadMoreBtn);
+  }
+  
   // 태그 입력 이벤트
   addTag('tagInput');
   
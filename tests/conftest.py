@@ -0,0 +1,52 @@
+"""테스트 공통 설정
+
+app은 가져올 때 저장소 종류(STORAGE_BACKEND)를 정하므로 저장소마다 app.py를 따로 불러온다.
+환경 변수는 불러오는 동안에만 바꾸고 되돌리므로 다른 테스트에 영향을 주지 않는다.
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(backend, **env):
+    """저장소 종류를 정해 app.py를 새 모듈(app_<저장소>)로 불러오기"""
+    name = f'app_{backend}'
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # Flask가 모듈 위치를 찾을 수 있도록
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('STORAGE_BACKEND', backend)
+        for key, value in env.items():
+            mp.setenv(key, value)
+        spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def json_app():
+    """JSON 파일 저장소를 쓰는 app"""
+    return load_app('json')
+
+
+@pytest.fixture(scope='session')
+def sql_app():
+    """메모리 SQLite 저장소를 쓰는 app (Flask-SQLAlchemy가 없으면 건너뜀)"""
+    pytest.importorskip('flask_sqlalchemy')
+    return load_app('sql', DATABASE_URL='sqlite://')
+
+
+@pytest.fixture
+def login_client():
+    """app과 사용자 정보를 받아 그 사용자로 로그인한 테스트 클라이언트를 만드는 함수"""
+    def make(khub, user):
+        client = khub.app.test_client()
+        with khub.app.test_request_context():
+            sid = khub.create_login_session(user)
+        with client.session_transaction() as s:
+            s['sid'] = sid
+        return client
+    return make
@@ -0,0 +1,42 @@
+"""게시판 댓글 저장 형식 테스트 (JSON 파일 저장소)"""
+import json
+
+import pytest
+
+
+@pytest.fixture
+def khub(json_app, tmp_path, monkeypatch):
+    """JSON 저장소 app (빈 작업 디렉터리에서 시작)"""
+    monkeypatch.chdir(tmp_path)
+    yield json_app
+    json_app.store_flush()
+
+
+def test_old_comment_list_is_grouped_once_under_lock(khub, tmp_path, monkeypatch):
+    old = [
+        {'id': 'c1', 'postId': 'p1', 'content': '하나'},
+        {'id': 'c2', 'postId': 'p2', 'content': '둘'},
+        {'id': 'c3', 'postId': 'p1', 'content': '셋'},
+    ]
+    (tmp_path / khub.BOARD_COMMENTS_FILE).write_text(json.dumps(old), encoding='utf-8')
+
+    locked = []
+    data_transaction = khub.data_transaction
+
+    def recording_transaction(*paths):
+        locked.append(paths)
+        return data_transaction(*paths)
+
+    monkeypatch.setattr(khub, 'data_transaction', recording_transaction)
+    grouped = khub.load_board_comments()
+    assert [c['id'] for c in grouped['p1']] == ['c1', 'c3']
+    assert locked == [(khub.BOARD_COMMENTS_FILE,)]
+
+    # 이미 바뀐 뒤에는 잠그지 않고 그대로 읽음
+    assert khub.load_board_comments() is grouped
+    assert locked == [(khub.BOARD_COMMENTS_FILE,)]
+
+    khub.store_flush()
+    saved = json.loads((tmp_path / khub.BOARD_COMMENTS_FILE).read_text(encoding='utf-8'))
+    assert set(saved) == {'p1', 'p2'}
+    assert khub._file_locks == {}
@@ -0,0 +1,45 @@
+"""채팅방 메시지 API 테스트 (JSON 저장소)
+
+    python -m pytest tests
+"""
+import os
+
+import pytest
+
+USER = {'name': '김철수', 'student_id': '202004001', 'email': 'a@bible.ac.kr'}
+
+
+@pytest.fixture
+def khub(json_app, tmp_path, monkeypatch):
+    """JSON 저장소 app (테스트마다 빈 작업 디렉터리에서 시작)"""
+    monkeypatch.chdir(tmp_path)
+    yield json_app
+    json_app.store_flush()  # 작업 디렉터리를 되돌리기 전에 기록
+
+
+@pytest.mark.parametrize('room_id', ['dm_unknown', 'x' * 400])
+def test_unknown_room_is_404_and_leaves_nothing_behind(khub, login_client, room_id):
+    client = login_client(khub, USER)
+    assert client.get(f'/api/chat/messages/{room_id}').status_code == 404
+    assert client.get(f'/api/chat/unread-count/{room_id}').status_code == 404
+    assert client.post(f'/api/chat/read-status/{room_id}').status_code == 404
+    assert client.post(f'/api/chat/messages/{room_id}', json={'message': '안녕'}).status_code == 404
+
+    # 로그 파일도, 잠금 파일도, 메모리 잠금 항목도 남지 않음
+    assert not os.path.exists(khub.CHAT_LOG_DIR) or os.listdir(khub.CHAT_LOG_DIR) == []
+    assert not any(room_id in path for path in khub._file_locks)
+    assert khub.get_room_messages(room_id) == []
+
+
+def test_existing_room_messages(khub, login_client):
+    rooms = {'dm_1': {'room_id': 'dm_1', 'user1_id': USER['student_id'], 'user2_id': '202105002', 'active': True}}
+    with khub.data_transaction(khub.CHAT_ROOMS_FILE):
+        khub.save_chat_rooms(rooms, changed=['dm_1'])
+    client = login_client(khub, USER)
+
+    response = client.post('/api/chat/messages/dm_1', json={'message': '안녕', 'sender_nickname': '익명1'})
+    assert response.status_code == 200
+    body = client.get('/api/chat/messages/dm_1').get_json()
+    assert [m['content'] for m in body['messages']] == ['안녕']
+    # 잠금을 다 쓰고 나면 메모리 잠금 항목도 지워짐
+    assert khub._file_locks == {}
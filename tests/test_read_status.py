@@ -0,0 +1,59 @@
+"""채팅방 읽음 상태 테스트 (JSON 저장소)
+
+    python -m pytest tests
+"""
+import pytest
+
+USER = {'name': '김철수', 'student_id': '202004001', 'email': 'a@bible.ac.kr'}
+ROOM_ID = 'dm_read_test'
+
+
+@pytest.fixture
+def khub(json_app, tmp_path, monkeypatch):
+    """JSON 저장소 app (테스트마다 빈 작업 디렉터리에서 시작)"""
+    monkeypatch.chdir(tmp_path)
+    yield json_app
+    json_app.flush_read_markers()
+    json_app.store_flush()  # 작업 디렉터리를 되돌리기 전에 기록
+
+
+@pytest.fixture
+def client(khub, login_client):
+    """로그인한 테스트 클라이언트"""
+    return login_client(khub, USER)
+
+
+def saved_marker(khub):
+    """파일에 저장된 읽음 상태"""
+    khub.store_flush(khub.USER_READ_STATUS_FILE)
+    return khub.load_user_read_status().get(USER['student_id'], {}).get(ROOM_ID)
+
+
+def test_stale_read_status_after_flush_keeps_higher_seq(khub, client):
+    for i in range(3):
+        khub.append_chat_message(ROOM_ID, {'id': f'm{i + 1}', 'message': f'메시지 {i + 1}'})
+
+    # 다른 요청이 더 뒤의 메시지까지 읽었고 그 값이 이미 저장되어 메모리에서 지워진 상태
+    khub.update_user_read_status(USER['student_id'], ROOM_ID, 'm5', 5)
+    assert khub.flush_read_markers()
+    assert USER['student_id'] not in khub._read_markers
+
+    # 늦게 도착한 요청(최신 메시지 순번 3)은 확정된 순번 5를 돌려받음
+    response = client.post(f'/api/chat/read-status/{ROOM_ID}')
+    body = response.get_json()
+    assert body['success']
+    assert (body['last_read_message_id'], body['last_read_seq']) == ('m5', 5)
+
+    assert khub.flush_read_markers()
+    assert saved_marker(khub)['last_seq'] == 5
+
+
+def test_newer_read_status_replaces_saved(khub):
+    khub.update_user_read_status(USER['student_id'], ROOM_ID, 'm1', 1)
+    assert khub.flush_read_markers()
+
+    marker = khub.update_user_read_status(USER['student_id'], ROOM_ID, 'm2', 2)
+    assert marker['last_seq'] == 2
+    assert khub.flush_read_markers()
+    assert saved_marker(khub)['last_seq'] == 2
+    assert USER['student_id'] not in khub._read_markers
@@ -0,0 +1,355 @@
+"""SQL 저장소 테스트 (메모리 SQLite, 네트워크 없이 실행)
+
+    python -m pytest tests
+"""
+import gzip
+import json
+import os
+
+import pytest
+
+# 데이터셋별 예시 데이터 (앱이 실제로 저장하는 모양)
+SAMPLE_DATA = {
+    'registered_users.json': [
+        {'name': '김철수', 'student_id': '202004001', 'email': 'a@bible.ac.kr',
+         'password': 'pbkdf2:sha256:600000$salt$hash', 'created_at': '2024-03-01T09:00:00'},
+        {'name': '이영희', 'student_id': '202105002', 'email': 'b@bible.ac.kr',
+         'password': 'pbkdf2:sha256:600000$salt$hash', 'created_at': '2024-03-02T09:00:00'},
+    ],
+    'anon_profiles.json': [
+        {'student_id': '202004001', 'nickname': '익명1', 'gender': '남자', 'interests': ['운동']},
+        {'student_id': '202105002', 'nickname': '익명2', 'gender': '여자', 'interests': []},
+    ],
+    'board_posts.json': [
+        {'id': 'p2', 'boardId': 'free', 'type': 'general', 'title': '둘째', 'content': '내용', 'tags': ['질문'],
+         'authorStudentId': '202004001', 'createdAt': '2024-03-02T00:00:00', 'likes': 3, 'views': 10, 'comments': 1},
+        {'id': 'p1', 'boardId': 'department', 'departmentId': 'cs', 'type': 'general', 'title': '첫째',
+         'content': '내용', 'tags': [], 'authorStudentId': '202105002', 'createdAt': '2024-03-01T00:00:00',
+         'likes': 0, 'views': 5, 'comments': 2},
+    ],
+    'board_comments.json': {
+        'p1': [
+            {'id': 'c1', 'postId': 'p1', 'content': '하나', 'authorStudentId': '202004001', 'likes': 0},
+            {'id': 'c2', 'postId': 'p1', 'content': '둘', 'authorStudentId': '202105002', 'likes': 1},
+        ],
+        'p2': [{'id': 'c3', 'postId': 'p2', 'content': '셋', 'authorStudentId': '202004001', 'likes': 0}],
+    },
+    'chat_messages.json': {
+        'dm_1': [
+            {'id': 'm1', 'seq': 1, 'sender': '익명1', 'content': '안녕', 'timestamp': 1709251200.0,
+             'created_at': '2024-03-01T09:00:00', 'type': 'text'},
+            {'id': 'm2', 'seq': 2, 'sender': '익명2', 'content': '반가워', 'timestamp': 1709251260.0,
+             'created_at': '2024-03-01T09:01:00', 'type': 'text'},
+        ],
+        'group_2': [
+            {'id': 'm3', 'seq': 1, 'sender': '익명1', 'content': '모임', 'timestamp': 1709251300.0,
+             'created_at': '2024-03-01T09:01:40', 'type': 'text'},
+        ],
+    },
+    'chat_rooms.json': {
+        'dm_1': {
+            'room_id': 'dm_1', 'user1_id': '202004001', 'user2_id': '202105002',
+            'user1_nickname': '익명1', 'user2_nickname': '익명2', 'created_at': 1709251100.0,
+            'user1_entered': True, 'user2_entered': False, 'user1_entered_at': 1709251150.0,
+            'user2_entered_at': None, 'active': True,
+        },
+    },
+    'group_rooms.json': {
+        'group_2': {
+            'room_id': 'group_2', 'room_name': '그룹 1', 'type': 'group', 'created_at': 1709251100.0,
+            'members': [{'student_id': '202004001', 'nickname': '익명1', 'gender': '남자', 'join_time': 1709251000.0},
+                        {'student_id': '202105002', 'nickname': '익명2', 'gender': '여자', 'join_time': 1709251010.0}],
+            'active': True,
+        },
+    },
+    # 좋아요는 사용자별로 {글/댓글 ID: 좋아요 시각}
+    'board_likes.json': {
+        '202004001': {'posts': {'p1': '2024-03-01T10:00:00'}, 'comments': {'c3': '2024-03-01T10:01:00'}},
+        '202105002': {'posts': {'p1': '2024-03-01T11:00:00', 'p2': '2024-03-02T11:00:00'}},
+    },
+    'user_read_status.json': {
+        '202004001': {'dm_1': {'last_message_id': 'm2', 'last_seq': 2}, 'group_2': {'last_message_id': 'm3', 'last_seq': 1}},
+    },
+    'matching_queue.json': {
+        'waiting': [
+            {'student_id': 's4', 'nickname': '대기1', 'gender': '남자', 'joined_at': 1709251000.0},
+            {'student_id': 's5', 'nickname': '대기2', 'gender': '여자', 'joined_at': 1709251001.0,
+             'mode': 'interest', 'interests': ['운동']},
+        ],
+        'matched': [],
+    },
+    'group_matching.json': {
+        'male': [{'student_id': 's6', 'nickname': '대기3', 'gender': '남자', 'join_time': 1709251000.0}],
+        'female': [],
+        'groups': [{'room_id': 'group_2', 'room_name': '그룹 1', 'members': [{'student_id': 's7'}],
+                    'created_at': 1709251100.0}],
+    },
+}
+
+# 앱의 load_* 함수가 쓰는 기본값
+DEFAULTS = {path: type(data) for path, data in SAMPLE_DATA.items()}
+DEFAULTS['matching_queue.json'] = lambda: {'waiting': [], 'matched': []}
+DEFAULTS['group_matching.json'] = lambda: {'male': [], 'female': [], 'groups': []}
+
+
+def table_rows(khub, name, **conditions):
+    """테이블 행 목록 (조건 컬럼 = 값)"""
+    table = khub.sql_tables[name]
+    query = khub.sa.select(table).where(*[table.c[c] == v for c, v in conditions.items()])
+    with khub._sql_engine().connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(query)]
+
+
+@pytest.fixture
+def khub(sql_app, tmp_path, monkeypatch):
+    """SQL 저장소 app (테스트마다 빈 데이터베이스와 빈 작업 디렉터리에서 시작)"""
+    monkeypatch.chdir(tmp_path)
+    yield sql_app
+    with sql_app._sql_engine().begin() as conn:
+        for name, table in sql_app.sql_tables.items():
+            if name != 'dataset_versions':  # 변경 번호는 계속 늘어나야 메모리 색인이 새로 만들어짐
+                conn.execute(table.delete())
+
+
+def test_every_dataset_has_sample(khub):
+    assert set(SAMPLE_DATA) == set(khub.SQL_DATASETS)
+
+
+def test_defaults_match_app_loaders(khub):
+    assert DEFAULTS[khub.MATCHING_QUEUE_FILE]() == khub.load_matching_queue()
+    assert DEFAULTS[khub.GROUP_MATCHING_FILE]() == khub.load_group_matching()
+
+
+@pytest.mark.parametrize('path', list(SAMPLE_DATA))
+def test_round_trip(khub, path):
+    data = SAMPLE_DATA[path]
+    assert khub.sql_save(path, data)
+    assert khub.sql_load(path, DEFAULTS[path]) == data
+    # 바뀐 것이 없으면 다시 저장해도 같은 결과
+    assert khub.sql_save(path, data)
+    assert khub.sql_load(path, DEFAULTS[path]) == data
+
+
+def test_shared_table_scopes_do_not_mix(khub):
+    khub.sql_save(khub.CHAT_ROOMS_FILE, SAMPLE_DATA[khub.CHAT_ROOMS_FILE])
+    khub.sql_save(khub.GROUP_ROOMS_FILE, SAMPLE_DATA[khub.GROUP_ROOMS_FILE])
+    khub.sql_save(khub.MATCHING_QUEUE_FILE, SAMPLE_DATA[khub.MATCHING_QUEUE_FILE])
+    khub.sql_save(khub.GROUP_MATCHING_FILE, SAMPLE_DATA[khub.GROUP_MATCHING_FILE])
+
+    # 한쪽을 비워도 같은 테이블의 다른 데이터셋은 그대로
+    khub.sql_save(khub.GROUP_ROOMS_FILE, {})
+    khub.sql_save(khub.GROUP_MATCHING_FILE, {})
+    dm_queue, group_queue = khub.MATCHING_QUEUE_FILE, khub.GROUP_MATCHING_FILE
+    assert khub.sql_load(khub.CHAT_ROOMS_FILE, dict) == SAMPLE_DATA[khub.CHAT_ROOMS_FILE]
+    assert khub.sql_load(dm_queue, DEFAULTS[dm_queue]) == SAMPLE_DATA[dm_queue]
+    assert khub.sql_load(khub.GROUP_ROOMS_FILE, dict) == {}
+    assert khub.sql_load(group_queue, DEFAULTS[group_queue]) == DEFAULTS[group_queue]()
+
+
+def test_list_delete_rewrites_positions(khub):
+    users = [{'student_id': f'2020040{i:02d}', 'name': f'u{i}'} for i in range(5)]
+    khub.sql_save(khub.DATA_FILE, users)
+
+    del users[1]
+    assert khub.sql_save(khub.DATA_FILE, users)
+    assert khub.sql_load(khub.DATA_FILE, list) == users
+    positions = {row['student_id']: row['position'] for row in table_rows(khub, 'users')}
+    assert positions == {user['student_id']: index for index, user in enumerate(users)}
+
+    # 삭제 뒤 끝에 추가한 항목도 순서대로
+    users.append({'student_id': '202004099', 'name': 'new'})
+    khub.sql_save(khub.DATA_FILE, users)
+    assert [u['student_id'] for u in khub.sql_load(khub.DATA_FILE, list)] == [u['student_id'] for u in users]
+
+
+def test_keyed_upsert_and_delete(khub):
+    rooms = {
+        'dm_1': {'room_id': 'dm_1', 'user1_id': 's1', 'user2_id': 's2', 'active': True},
+        'dm_2': {'room_id': 'dm_2', 'user1_id': 's1', 'user2_id': 's3', 'active': True},
+    }
+    khub.sql_save(khub.CHAT_ROOMS_FILE, rooms)
+
+    # 수정, 추가, 삭제를 한 번에
+    rooms['dm_1']['active'] = False
+    rooms['dm_3'] = {'room_id': 'dm_3', 'user1_id': 's4', 'user2_id': 's5', 'active': True}
+    del rooms['dm_2']
+    assert khub.sql_save(khub.CHAT_ROOMS_FILE, rooms)
+
+    assert khub.sql_load(khub.CHAT_ROOMS_FILE, dict) == rooms
+    assert khub.sql_find(khub.CHAT_ROOMS_FILE, room_id='dm_2') is None
+    assert khub.sql_find(khub.CHAT_ROOMS_FILE, room_id='dm_1')['active'] is False
+    assert {row['room_id']: row['active'] for row in table_rows(khub, 'rooms')} == {'dm_1': False, 'dm_3': True}
+
+    # 참여자 인덱스도 함께 갱신
+    members = {(row['room_id'], row['student_id']) for row in table_rows(khub, 'room_members')}
+    assert members == {('dm_1', 's1'), ('dm_1', 's2'), ('dm_3', 's4'), ('dm_3', 's5')}
+
+
+def test_nested_upsert_and_delete(khub):
+    likes = {'s1': {'posts': {'p1': '2024-03-01T10:00:00'}},
+             's2': {'posts': {'p2': '2024-03-01T10:00:00'}, 'comments': {'c1': '2024-03-01T10:00:00'}}}
+    khub.sql_save(khub.BOARD_LIKES_FILE, likes)
+
+    likes['s1']['posts']['p2'] = '2024-03-02T10:00:00'
+    del likes['s2']['comments']
+    likes['s3'] = {'posts': {'p1': '2024-03-02T11:00:00'}}
+    assert khub.sql_save(khub.BOARD_LIKES_FILE, likes)
+    assert khub.sql_load(khub.BOARD_LIKES_FILE, dict) == likes
+    assert table_rows(khub, 'board_likes', student_id='s2', kind='comments') == []
+
+
+def test_grouped_uses_message_seq_for_position(khub):
+    messages = {'dm_1': [{'id': 'm5', 'seq': 5, 'content': '다섯', 'type': 'text'},
+                         {'id': 'm6', 'seq': 6, 'content': '여섯', 'type': 'text'}]}
+    khub.sql_save(khub.CHAT_MESSAGES_FILE, messages)
+    assert sorted(row['position'] for row in table_rows(khub, 'messages', room_id='dm_1')) == [4, 5]
+    assert khub.sql_load(khub.CHAT_MESSAGES_FILE, dict) == messages
+
+
+def test_sql_delete_by_index_column(khub):
+    khub.sql_save(khub.BOARD_POSTS_FILE, SAMPLE_DATA[khub.BOARD_POSTS_FILE])
+    assert khub.sql_delete(khub.BOARD_POSTS_FILE, id='p2') == 1
+    assert [p['id'] for p in khub.sql_load(khub.BOARD_POSTS_FILE, list)] == ['p1']
+
+
+def test_import_json(khub):
+    for path, data in SAMPLE_DATA.items():
+        if path != khub.CHAT_MESSAGES_FILE:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+    # 예전 형식 댓글 파일(목록)은 게시글별로 묶어서 가져옴
+    comments = [c for items in SAMPLE_DATA[khub.BOARD_COMMENTS_FILE].values() for c in items]
+    with open(khub.BOARD_COMMENTS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(comments, f, ensure_ascii=False)
+
+    # 채팅 메시지는 방별 로그 파일에서
+    os.makedirs(khub.CHAT_LOG_DIR)
+    for room_id, room_messages in SAMPLE_DATA[khub.CHAT_MESSAGES_FILE].items():
+        with open(os.path.join(khub.CHAT_LOG_DIR, f'{room_id}.jsonl'), 'w', encoding='utf-8') as f:
+            for message in room_messages:
+                f.write(json.dumps({'op': 'append', 'message': message}, ensure_ascii=False) + '\n')
+
+    # 채팅 보관함 묶음과 보관된 채팅방
+    old_messages = [{'id': 'm0', 'seq': 1, 'sender': '익명1', 'content': '예전', 'type': 'text'}]
+    archive_dir = khub._chat_archive_room_dir('dm_1')
+    os.makedirs(archive_dir)
+    with open(os.path.join(archive_dir, '0000000001-0000000001.jsonl.gz'), 'wb') as f:
+        f.write(gzip.compress((json.dumps(old_messages[0]) + '\n').encode('utf-8')))
+    os.makedirs(khub.ROOM_ARCHIVE_DIR)
+    archived = {'room_id': 'dm_old', 'room_type': 'dm', 'room': {'user1_id': 's1'}, 'archived_at': 1.0, 'last_seq': 0}
+    with open(os.path.join(khub.ROOM_ARCHIVE_DIR, 'dm_old.json.gz'), 'wb') as f:
+        f.write(gzip.compress(json.dumps(archived).encode('utf-8')))
+
+    result = khub.app.test_cli_runner().invoke(khub.import_json_command)
+    assert result.exit_code == 0, result.output
+
+    for path, data in SAMPLE_DATA.items():
+        assert khub.sql_load(path, DEFAULTS[path]) == data, path
+    segments = list(khub.sql_chat_archive_segments('dm_1', before=2))
+    assert [khub._decode_chat_archive(data) for data in segments] == [old_messages]
+    assert json.loads(gzip.decompress(khub.sql_find_room_archive('dm_old'))) == archived
+
+    # 다시 가져와도 중복되지 않음
+    khub.app.test_cli_runner().invoke(khub.import_json_command)
+    assert len(table_rows(khub, 'users')) == len(SAMPLE_DATA[khub.DATA_FILE])
+    assert khub.sql_load(khub.CHAT_MESSAGES_FILE, dict) == SAMPLE_DATA[khub.CHAT_MESSAGES_FILE]
+
+
+def test_version_changes_only_when_data_changes(khub):
+    posts = SAMPLE_DATA[khub.BOARD_POSTS_FILE]
+    start = khub.store_version(khub.BOARD_POSTS_FILE)
+    khub.sql_save(khub.BOARD_POSTS_FILE, posts)
+    saved = khub.store_version(khub.BOARD_POSTS_FILE)
+    assert saved != start
+
+    khub.sql_save(khub.BOARD_POSTS_FILE, posts)
+    assert khub.store_version(khub.BOARD_POSTS_FILE) == saved
+    khub.sql_delete(khub.BOARD_POSTS_FILE, id='p2')
+    assert khub.store_version(khub.BOARD_POSTS_FILE) != saved
+
+
+def test_search_index_sees_other_workers_writes(khub):
+    khub.sql_save(khub.BOARD_POSTS_FILE, SAMPLE_DATA[khub.BOARD_POSTS_FILE])
+    assert khub.search_board_posts('셋째')['total'] == 0
+
+    # 다른 워커의 저장 (이 워커의 색인 갱신을 거치지 않음)
+    posts = SAMPLE_DATA[khub.BOARD_POSTS_FILE] + [{'id': 'p3', 'boardId': 'free', 'title': '셋째'}]
+    khub.sql_save(khub.BOARD_POSTS_FILE, posts)
+    assert [p['id'] for p in khub.search_board_posts('셋째')['posts']] == ['p3']
+
+
+def test_interest_index_sees_other_workers_writes(khub):
+    khub.sql_save(khub.ANON_PROFILES_FILE, SAMPLE_DATA[khub.ANON_PROFILES_FILE])
+    assert '독서' not in khub.interest_summary()[0]
+
+    # 다른 워커의 저장 (이 워커의 색인 갱신을 거치지 않음)
+    profiles = SAMPLE_DATA[khub.ANON_PROFILES_FILE] + [
+        {'student_id': '202206003', 'nickname': '익명3', 'gender': '여자', 'interests': ['독서']}
+    ]
+    khub.sql_save(khub.ANON_PROFILES_FILE, profiles)
+    assert khub.interest_summary()[0]['독서'] == 1
+
+
+def test_counters_are_added_to_changed_rows_only(khub):
+    khub.sql_save(khub.BOARD_POSTS_FILE, SAMPLE_DATA[khub.BOARD_POSTS_FILE])
+    khub.sql_save(khub.BOARD_COMMENTS_FILE, SAMPLE_DATA[khub.BOARD_COMMENTS_FILE])
+    before = {row['id']: row['data'] for row in table_rows(khub, 'posts')}
+
+    pending = {
+        (khub.BOARD_POSTS_FILE, 'p1'): {'views': 2, 'likes': -5},  # 0 아래로는 내려가지 않음
+        (khub.BOARD_COMMENTS_FILE, 'c2'): {'likes': 1},
+        (khub.BOARD_POSTS_FILE, 'gone'): {'views': 1},  # 그사이 삭제된 글
+    }
+    assert khub.sql_apply_counters(pending)
+
+    p1 = khub.sql_find(khub.BOARD_POSTS_FILE, id='p1')
+    assert (p1['views'], p1['likes'], p1['comments']) == (7, 0, 2)
+    assert khub.sql_find(khub.BOARD_POSTS_FILE, id='p2')['views'] == 10
+    assert khub.sql_find(khub.BOARD_COMMENTS_FILE, id='c2')['likes'] == 2
+    # 게시글 본문(data)은 그대로 두고 카운터 컬럼만 바뀜
+    assert {row['id']: row['data'] for row in table_rows(khub, 'posts')} == before
+
+
+def test_saving_stale_posts_keeps_added_counters(khub):
+    khub.sql_save(khub.BOARD_POSTS_FILE, SAMPLE_DATA[khub.BOARD_POSTS_FILE])
+    posts = khub.sql_load(khub.BOARD_POSTS_FILE, list)
+    khub.sql_apply_counters({(khub.BOARD_POSTS_FILE, 'p2'): {'views': 3}})
+
+    # 증감분이 더해지기 전에 불러온 목록으로 제목을 고쳐 저장해도 조회수는 그대로
+    posts[0]['title'] = '고친 제목'
+    assert khub.sql_save(khub.BOARD_POSTS_FILE, posts)
+    p2 = khub.sql_find(khub.BOARD_POSTS_FILE, id='p2')
+    assert (p2['title'], p2['views']) == ('고친 제목', 13)
+    assert khub.sql_find_many(khub.BOARD_POSTS_FILE, 'id', ['p2'])['p2']['views'] == 13
+    assert khub.sql_query_board_posts(board_id='free')['posts'][0]['views'] == 13
+
+
+def test_tag_filter_pages_in_sql(khub):
+    posts = [
+        {'id': f'p{i}', 'boardId': 'free', 'title': f'{i}', 'tags': ['밥'] if i % 3 == 0 else ['질문'],
+         'createdAt': f'2024-03-{i + 1:02d}T00:00:00'}
+        for i in range(10)
+    ]
+    khub.sql_save(khub.BOARD_POSTS_FILE, posts)
+
+    first = khub.sql_query_board_posts(board_id='free', tag='밥', limit=2)
+    assert [p['id'] for p in first['posts']] == ['p9', 'p6']
+    assert first['has_more'] and first['next_cursor'] == 'p6'
+    rest = khub.sql_query_board_posts(board_id='free', tag='밥', cursor='p6', limit=2)
+    assert [p['id'] for p in rest['posts']] == ['p3', 'p0'] and not rest['has_more']
+
+    # 태그를 고친 글만 태그 테이블에서 바뀜
+    posts[0]['tags'] = ['질문']
+    khub.sql_save(khub.BOARD_POSTS_FILE, posts)
+    assert [p['id'] for p in khub.sql_query_board_posts(tag='밥')['posts']] == ['p9', 'p6', 'p3']
+    assert {row['post_id'] for row in table_rows(khub, 'post_tags', tag='밥')} == {'p3', 'p6', 'p9'}
+
+
+def test_missing_links_are_filled_from_saved_rows(khub):
+    khub.sql_save(khub.BOARD_POSTS_FILE, SAMPLE_DATA[khub.BOARD_POSTS_FILE])
+    with khub._sql_engine().begin() as conn:
+        conn.execute(khub.sql_tables['post_tags'].delete())
+
+    khub._sql_fill_links(khub._sql_engine())
+    assert [(row['post_id'], row['tag']) for row in table_rows(khub, 'post_tags')] == [('p2', '질문')]
+    assert [p['id'] for p in khub.sql_query_board_posts(tag='질문')['posts']] == ['p2']